@@ -5,6 +5,11 @@
 class FridgeRecipeApp {
     constructor() {
         this.apiBaseUrl = 'https://lednice.onrender.com/api';
+        this.useJobs = true;
+        this.useStreaming = true;
+        this.usePipeline = true;
+        this.jobPollInterval = 1000;
+        this.jobTimeout = 120000;
         this.selectedFile = null;
         this.ingredients = [];
         this.recipes = [];
@@ -132,22 +137,34 @@ class FridgeRecipeApp {
             const formData = new FormData();
             formData.append('image', this.selectedFile);
             
-            const response = await fetch(`${this.apiBaseUrl}/image/upload`, {
+            if (this.usePipeline) {
+                // Ingredients and recipes come back from a single request
+                formData.append('max_time', 20);
+                const data = await this.postRequest('/pipeline/photo-to-recipes', {
+                    method: 'POST',
+                    body: formData
+                });
+                this.ingredients = data.ingredients;
+                this.recipes = data.recipes;
+                this.showResults();
+                return;
+            }
+            
+            const data = await this.postRequest('/image/upload', {
                 method: 'POST',
                 body: formData
             });
-            
-            if (!response.ok) {
-                throw new Error(`HTTP error! status: ${response.status}`);
-            }
-            
-            const data = await response.json();
             this.ingredients = data.ingredients;
             
             // Generate recipes
-            await this.generateRecipes();
-            
-            this.showResults();
+            if (this.useStreaming) {
+                this.recipes = [];
+                this.showResults();
+                await this.streamRecipes();
+            } else {
+                await this.generateRecipes();
+                this.showResults();
+            }
             
         } catch (error) {
             console.error('Upload error:', error);
@@ -158,7 +175,7 @@ class FridgeRecipeApp {
     
     async generateRecipes() {
         try {
-            const response = await fetch(`${this.apiBaseUrl}/recipes/generate`, {
+            const data = await this.postRequest('/recipes/generate', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
@@ -169,20 +186,120 @@ class FridgeRecipeApp {
                     dietary_restrictions: []
                 })
             });
+            this.recipes = data.recipes;
             
-            if (!response.ok) {
+        } catch (error) {
+            console.error('Recipe generation error:', error);
+            this.showError('Chyba při generování receptů.');
+        }
+    }
+    
+    async streamRecipes() {
+        try {
+            const response = await fetch(`${this.apiBaseUrl}/recipes/generate/stream`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({
+                    ingredients: this.ingredients,
+                    max_time: 20,
+                    dietary_restrictions: []
+                })
+            });
+            
+            if (!response.ok || !response.body) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
             
-            const data = await response.json();
-            this.recipes = data.recipes;
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) {
+                    break;
+                }
+                
+                buffer += decoder.decode(value, { stream: true });
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    this.handleStreamEvent(buffer.slice(0, boundary));
+                    buffer = buffer.slice(boundary + 2);
+                }
+            }
             
         } catch (error) {
-            console.error('Recipe generation error:', error);
-            this.showError('Chyba při generování receptů.');
+            console.error('Recipe streaming error:', error);
+            if (this.recipes.length === 0) {
+                await this.generateRecipes();
+                this.renderRecipes();
+            }
         }
     }
     
+    handleStreamEvent(rawEvent) {
+        let eventName = 'message';
+        let payload = '';
+        
+        rawEvent.split('\n').forEach(line => {
+            if (line.startsWith('event:')) {
+                eventName = line.slice(6).trim();
+            } else if (line.startsWith('data:')) {
+                payload += line.slice(5).trim();
+            }
+        });
+        
+        if (eventName === 'recipe') {
+            const recipe = JSON.parse(payload);
+            this.recipes.push(recipe);
+            this.appendRecipe(recipe);
+        } else if (eventName === 'error') {
+            throw new Error(JSON.parse(payload).error);
+        }
+    }
+    
+    async postRequest(path, options) {
+        // In job mode the backend answers 202 with a job id and the result is polled
+        const url = `${this.apiBaseUrl}${path}${this.useJobs ? '?async=1' : ''}`;
+        const response = await fetch(url, options);
+        
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        
+        const data = await response.json();
+        if (response.status !== 202 || !data.job_id) {
+            return data;
+        }
+        
+        return this.waitForJob(data.job_id);
+    }
+    
+    async waitForJob(jobId) {
+        const deadline = Date.now() + this.jobTimeout;
+        
+        while (Date.now() < deadline) {
+            await new Promise(resolve => setTimeout(resolve, this.jobPollInterval));
+            
+            const response = await fetch(`${this.apiBaseUrl}/jobs/${jobId}`);
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            
+            const job = await response.json();
+            if (job.status === 'done') {
+                return job.result;
+            }
+            if (job.status === 'failed') {
+                throw new Error(job.error || 'Job failed');
+            }
+        }
+        
+        throw new Error('Job timed out');
+    }
+    
     showLoading() {
         this.uploadSection.style.display = 'none';
         this.loadingSection.style.display = 'flex';
@@ -229,34 +346,36 @@ class FridgeRecipeApp {
     renderRecipes() {
         this.recipesGrid.innerHTML = '';
         
-        this.recipes.forEach(recipe => {
-            const recipeCard = document.createElement('div');
-            recipeCard.className = 'recipe-card fade-in';
-            recipeCard.addEventListener('click', () => this.showRecipeDetail(recipe));
-            recipeCard.addEventListener('touchstart', () => this.showRecipeDetail(recipe));
-            recipeCard.style.cursor = 'pointer';
-            
-            const availability = recipe.ingredient_availability;
-            let availabilityText = '';
-            if (availability && typeof availability.available_count !== 'undefined' && typeof availability.total_count !== 'undefined') {
-                availabilityText = `${availability.available_count}/${availability.total_count} ingrediencí dostupných`;
-            } else {
-                availabilityText = 'Dostupnost ingrediencí: N/A';
-            }
-            
-            recipeCard.innerHTML = `
-                <div class="recipe-header">
-                    <div class="recipe-name">${recipe.name}</div>
-                    <div class="recipe-time">${recipe.prep_time} min</div>
-                </div>
-                <div class="recipe-tags">
-                    ${recipe.tags.map(tag => `<span class="recipe-tag">${tag}</span>`).join('')}
-                </div>
-                <div class="recipe-availability">${availabilityText}</div>
-            `;
-            
-            this.recipesGrid.appendChild(recipeCard);
-        });
+        this.recipes.forEach(recipe => this.appendRecipe(recipe));
+    }
+    
+    appendRecipe(recipe) {
+        const recipeCard = document.createElement('div');
+        recipeCard.className = 'recipe-card fade-in';
+        recipeCard.addEventListener('click', () => this.showRecipeDetail(recipe));
+        recipeCard.addEventListener('touchstart', () => this.showRecipeDetail(recipe));
+        recipeCard.style.cursor = 'pointer';
+        
+        const availability = recipe.ingredient_availability;
+        let availabilityText = '';
+        if (availability && typeof availability.available_count !== 'undefined' && typeof availability.total_count !== 'undefined') {
+            availabilityText = `${availability.available_count}/${availability.total_count} ingrediencí dostupných`;
+        } else {
+            availabilityText = 'Dostupnost ingrediencí: N/A';
+        }
+        
+        recipeCard.innerHTML = `
+            <div class="recipe-header">
+                <div class="recipe-name">${recipe.name}</div>
+                <div class="recipe-time">${recipe.prep_time} min</div>
+            </div>
+            <div class="recipe-tags">
+                ${recipe.tags.map(tag => `<span class="recipe-tag">${tag}</span>`).join('')}
+            </div>
+            <div class="recipe-availability">${availabilityText}</div>
+        `;
+        
+        this.recipesGrid.appendChild(recipeCard);
     }
     
     showRecipeDetail(recipe) {
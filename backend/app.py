@@ -1,4 +1,5 @@
-from flask import Flask
+import time
+from flask import Flask, Response, g, request
 from flask_cors import CORS
 from dotenv import load_dotenv
 import os
@@ -10,20 +11,70 @@ def create_app():
     CORS(app, resources={r"/api/*": {"origins": "*"}})
     
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
-    app.config['UPLOAD_FOLDER'] = 'uploads'
+    app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', 'uploads')
     
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
+    from services.registry import ServiceRegistry
+    from services.upstream_guard import get_upstream_guard
+    from utils.metrics import get_metrics, begin_request_usage, current_request_usage, render_prometheus, TOKEN_BUCKETS
+    services = ServiceRegistry(app.config)
+    app.extensions['services'] = services
+    
+    @app.before_request
+    def start_background_tasks():
+        # Janitor se spustí jednou na proces (po forku workeru znovu)
+        services.get('upload_janitor')
+    
+    @app.before_request
+    def start_request_metrics():
+        g.request_started = time.perf_counter()
+        begin_request_usage()
+    
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.get('request_started')
+        if started is None or request.path == '/api/metrics':
+            return response
+        
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics = get_metrics()
+        metrics.observe('fridge_http_request_duration_seconds', time.perf_counter() - started,
+                        method=request.method, endpoint=endpoint)
+        metrics.inc('fridge_http_requests_total', method=request.method, endpoint=endpoint,
+                    status=response.status_code)
+        
+        # Spotřeba tokenů na požadavek (u úloh a SSE se tokeny počítají jen v celkových čítačích)
+        usage = current_request_usage()
+        if usage and any(usage.values()):
+            total = usage['prompt_tokens'] + usage['completion_tokens']
+            metrics.observe('fridge_request_openai_tokens', total, TOKEN_BUCKETS, endpoint=endpoint)
+            response.headers['X-OpenAI-Tokens'] = str(total)
+        return response
+    
     from routes.image_upload import image_bp
     from routes.recipe_generator import recipe_bp
+    from routes.jobs import jobs_bp
+    from routes.pipeline import pipeline_bp
     
     app.register_blueprint(image_bp, url_prefix='/api/image')
     app.register_blueprint(recipe_bp, url_prefix='/api/recipes')
+    app.register_blueprint(jobs_bp, url_prefix='/api/jobs')
+    app.register_blueprint(pipeline_bp, url_prefix='/api/pipeline')
     
     @app.route('/api/health')
     def health_check():
         return {'status': 'healthy', 'message': 'Fridge Recipe App API is running'}
     
+    @app.route('/api/upstream/stats')
+    def upstream_stats():
+        return get_upstream_guard().stats()
+    
+    @app.route('/api/metrics')
+    def metrics_endpoint():
+        return Response(render_prometheus(get_metrics().collect()),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
+    
     return app
 
 if __name__ == '__main__':
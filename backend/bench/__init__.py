@@ -0,0 +1,3 @@
+"""
+Benchmarky a zátěžové testy API se stub OpenAI serverem
+"""
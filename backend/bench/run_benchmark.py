@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Reprodukovatelný benchmark Flask API: spustí create_app() pod gunicornem s gunicorn.conf.py,
+nasměruje OpenAIService na lokální stub a změří latence, propustnost a paměť workerů.
+
+Použití (ze složky backend):
+    python bench/run_benchmark.py --requests 200 --concurrency 16 --stub-latency 1.5
+    python bench/run_benchmark.py --endpoints search --requests 2000 --concurrency 32 --json vysledky.json
+"""
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+from bench.stub_openai import StubConfig, start_stub_server
+
+SEARCH_QUERIES = ['mrkev,cibule', 'losos,citron', 'vajíčka,sýr,špenát', 'brokolice', 'kuřecí prsa,paprika']
+GENERATE_PAYLOAD = {
+    'ingredients': [{'name': 'mrkev'}, {'name': 'vajíčka'}, {'name': 'sýr'}],
+    'max_time': 20,
+    'dietary_restrictions': []
+}
+
+
+def load_sample_images(directory):
+    images = []
+    for pattern in ('*.jpg', '*.jpeg', '*.png', '*.bmp'):
+        for path in sorted(glob.glob(os.path.join(directory, pattern))):
+            with open(path, 'rb') as image_file:
+                images.append((os.path.basename(path), image_file.read()))
+    if images:
+        return images
+
+    # V uploads/ nejsou žádné fotky - vygenerujeme syntetické snímky ve velikosti z mobilu
+    import cv2
+    import numpy as np
+    rng = np.random.default_rng(42)
+    for index in range(3):
+        image = rng.integers(0, 255, (3024, 4032, 3), dtype=np.uint8)
+        image = cv2.GaussianBlur(image, (51, 51), 0)
+        success, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        images.append((f'synthetic_{index}.jpg', encoded.tobytes()))
+    return images
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def worker_rss_mb(master_pid):
+    """
+    Součet a maximum RSS worker procesů gunicornu (Linux /proc).
+    """
+    children_path = f'/proc/{master_pid}/task/{master_pid}/children'
+    try:
+        with open(children_path) as children_file:
+            pids = [int(pid) for pid in children_file.read().split()]
+    except OSError:
+        return None
+
+    values = []
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/status') as status_file:
+                for line in status_file:
+                    if line.startswith('VmRSS:'):
+                        values.append(int(line.split()[1]) / 1024)
+        except OSError:
+            continue
+    if not values:
+        return None
+    return {'workers': len(values), 'total': round(sum(values), 1), 'max': round(max(values), 1)}
+
+
+def run_load(name, send, total, concurrency):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=concurrency)
+    session.mount('http://', adapter)
+
+    def timed(index):
+        started = time.perf_counter()
+        try:
+            response = send(session, index)
+            ok = response.status_code < 400
+            response.close()
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(timed, range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, ok in results if ok)
+    errors = sum(1 for _, ok in results if not ok)
+    return {
+        'endpoint': name,
+        'requests': total,
+        'concurrency': concurrency,
+        'errors': errors,
+        'elapsed_s': round(elapsed, 3),
+        'rps': round(total / elapsed, 2) if elapsed else None,
+        'p50_ms': _ms(percentile(latencies, 0.50)),
+        'p95_ms': _ms(percentile(latencies, 0.95)),
+        'p99_ms': _ms(percentile(latencies, 0.99)),
+        'max_ms': _ms(latencies[-1] if latencies else None)
+    }
+
+
+def _ms(value):
+    return round(value * 1000, 1) if value is not None else None
+
+
+def wait_for_health(base_url, process, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn skončil při startu')
+        try:
+            if requests.get(f'{base_url}/api/health', timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError('gunicorn nenaběhl včas')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Fridge Recipe API se stub OpenAI serverem')
+    parser.add_argument('--endpoints', default='upload,generate,search', help='čárkou oddělené: upload, pipeline, generate, search')
+    parser.add_argument('--requests', type=int, default=100, help='počet požadavků na endpoint')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--port', type=int, default=10100)
+    parser.add_argument('--stub-latency', type=float, default=1.0)
+    parser.add_argument('--stub-jitter', type=float, default=0.2)
+    parser.add_argument('--stub-error-rate', type=float, default=0.0)
+    parser.add_argument('--stub-rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--with-cache', action='store_true', help='nechat zapnuté cache (výchozí je vypnout)')
+    parser.add_argument('--images', default=os.path.join(REPO_DIR, 'uploads'), help='složka se vzorovými fotkami')
+    parser.add_argument('--gunicorn-arg', action='append', default=[], help='další argument pro gunicorn (opakovatelné)')
+    parser.add_argument('--json', help='uložit výsledky do JSON souboru')
+    args = parser.parse_args()
+
+    stub_config = StubConfig(args.stub_latency, args.stub_jitter, args.stub_error_rate, args.stub_rate_limit_rate)
+    stub_server, _ = start_stub_server(config=stub_config)
+    state_dir = tempfile.mkdtemp(prefix='fridge-bench-')
+
+    env = dict(os.environ)
+    # Veškerý stav serveru (SQLite, metriky, nahrané fotky) patří do dočasné složky,
+    # ne do backend/cache a backend/uploads
+    env.update({
+        'OPENAI_API_KEY': 'bench',
+        'OPENAI_BASE_URL': f'http://127.0.0.1:{stub_server.server_port}',
+        'UPLOAD_FOLDER': os.path.join(state_dir, 'uploads'),
+        'ANALYSIS_CACHE_PATH': os.path.join(state_dir, 'analysis_cache.sqlite3'),
+        'NEAR_DUPLICATE_CACHE_PATH': os.path.join(state_dir, 'near_duplicates.sqlite3'),
+        'SINGLE_FLIGHT_PATH': os.path.join(state_dir, 'single_flight.sqlite3'),
+        'UPLOAD_INDEX_PATH': os.path.join(state_dir, 'uploads.sqlite3'),
+        'JOB_DB_PATH': os.path.join(state_dir, 'jobs.sqlite3'),
+        'METRICS_DIR': os.path.join(state_dir, 'metrics'),
+        'JANITOR_LOCK_PATH': os.path.join(state_dir, 'janitor.lock'),
+        'JANITOR_STATS_PATH': os.path.join(state_dir, 'janitor_stats.json')
+    })
+    if not args.with_cache:
+        # Studený běh: každý požadavek musí dojít až na stub, i když jsou payloady shodné
+        for name in ('ANALYSIS_CACHE_ENABLED', 'RECIPE_CACHE_ENABLED', 'SIMILAR_RECIPE_CACHE_ENABLED',
+                     'NEAR_DUPLICATE_CACHE_ENABLED', 'SINGLE_FLIGHT_ENABLED', 'JANITOR_ENABLED'):
+            env[name] = 'false'
+
+    command = [sys.executable, '-m', 'gunicorn', 'app:app', '--config', 'gunicorn.conf.py',
+               '--bind', f'127.0.0.1:{args.port}'] + args.gunicorn_arg
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{args.port}'
+
+    images = load_sample_images(args.images)
+    senders = {
+        'upload': lambda session, index: session.post(
+            f'{base_url}/api/image/upload',
+            files={'image': images[index % len(images)]}, timeout=120),
+        'pipeline': lambda session, index: session.post(
+            f'{base_url}/api/pipeline/photo-to-recipes',
+            files={'image': images[index % len(images)]}, timeout=120),
+        'generate': lambda session, index: session.post(
+            f'{base_url}/api/recipes/generate', json=GENERATE_PAYLOAD, timeout=120),
+        'search': lambda session, index: session.get(
+            f'{base_url}/api/recipes/search',
+            params={'ingredients': SEARCH_QUERIES[index % len(SEARCH_QUERIES)], 'max_time': 20}, timeout=30)
+    }
+
+    results = []
+    try:
+        wait_for_health(base_url, process)
+        print(f"🚀 gunicorn běží (pid {process.pid}), stub latence {args.stub_latency}s, "
+              f"{len(images)} vzorových obrázků")
+        for name in [endpoint.strip() for endpoint in args.endpoints.split(',') if endpoint.strip()]:
+            if name not in senders:
+                print(f"⚠️  Neznámý endpoint: {name}")
+                continue
+            result = run_load(name, senders[name], args.requests, args.concurrency)
+            result['worker_rss_mb'] = worker_rss_mb(process.pid)
+            results.append(result)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        stub_server.shutdown()
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+    header = f"{'endpoint':<10}{'req':>6}{'err':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'RSS MB':>10}"
+    print(header)
+    print('-' * len(header))
+    for result in results:
+        rss = result['worker_rss_mb']
+        print(f"{result['endpoint']:<10}{result['requests']:>6}{result['errors']:>6}{result['rps']:>9}"
+              f"{result['p50_ms']!s:>10}{result['p95_ms']!s:>10}{result['p99_ms']!s:>10}"
+              f"{(rss['max'] if rss else '-')!s:>10}")
+    print(f"Stub obsloužil {stub_config.requests} požadavků")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as output:
+            json.dump({'args': vars(args), 'results': results}, output, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Lokální náhrada OpenAI chat completions API pro benchmarky a zátěžové testy.
+
+Použití (ze složky backend):
+    python bench/stub_openai.py --port 8090 --latency 1.5 --jitter 0.5 --error-rate 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8090 OPENAI_API_KEY=bench gunicorn app:app --config gunicorn.conf.py
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+INGREDIENTS_RESPONSE = {
+    'ingredients': [
+        {'name': 'mrkev', 'category': 'zelenina', 'quantity': '3 ks', 'freshness': 'čerstvé'},
+        {'name': 'vajíčka', 'category': 'vejce', 'quantity': '6 ks', 'freshness': 'dobré'},
+        {'name': 'sýr', 'category': 'mléčné', 'quantity': '200 g', 'freshness': 'čerstvé'},
+        {'name': 'kuřecí prsa', 'category': 'maso', 'quantity': '400 g', 'freshness': 'spotřebuj brzy'}
+    ]
+}
+
+RECIPES_RESPONSE = {
+    'recipes': [
+        {
+            'name': f'Testovací recept {index}',
+            'prep_time': 10 + index * 3,
+            'servings': 2,
+            'ingredients': ['mrkev', 'vajíčka', 'sýr'],
+            'instructions': ['Nakrájejte zeleninu.', 'Pečeme v troubě 10 minut.', 'Podávejte.'],
+            'nutrition_info': {'calories': 300, 'protein': '20g', 'carbs': '15g', 'fat': '12g'},
+            'cooking_tips': ['Přidejte bylinky.']
+        }
+        for index in range(4)
+    ]
+}
+
+
+class StubConfig:
+    def __init__(self, latency: float = 1.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, stream_chunk_size: int = 24):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.stream_chunk_size = stream_chunk_size
+        self.requests = 0
+        self.lock = threading.Lock()
+
+
+def make_handler(config: StubConfig):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            with config.lock:
+                config.requests += 1
+
+            if not self.path.endswith('/chat/completions'):
+                return self._send_json(404, {'error': {'message': 'not found'}})
+
+            time.sleep(max(0.0, config.latency + random.uniform(-config.jitter, config.jitter)))
+
+            roll = random.random()
+            if roll < config.rate_limit_rate:
+                return self._send_json(429, {'error': {'message': 'rate limited'}}, {'Retry-After': '1'})
+            if roll < config.rate_limit_rate + config.error_rate:
+                return self._send_json(500, {'error': {'message': 'stub failure'}})
+
+            try:
+                request_data = json.loads(body or b'{}')
+            except json.JSONDecodeError:
+                return self._send_json(400, {'error': {'message': 'invalid json'}})
+
+            text = body.decode('utf-8', errors='ignore')
+            if 'image_url' not in text:
+                response = RECIPES_RESPONSE
+            elif '\\"recipes\\"' in text:
+                # Sloučený požadavek /pipeline/photo-to-recipes chce ingredience i recepty
+                response = dict(INGREDIENTS_RESPONSE, **RECIPES_RESPONSE)
+            else:
+                response = INGREDIENTS_RESPONSE
+            content = json.dumps(response, ensure_ascii=False)
+            usage = {'prompt_tokens': len(body) // 4, 'completion_tokens': len(content) // 4}
+            usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+
+            if request_data.get('stream'):
+                return self._send_stream(content)
+            return self._send_json(200, {
+                'id': 'chatcmpl-stub',
+                'object': 'chat.completion',
+                'model': request_data.get('model', 'gpt-4o'),
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+                'usage': usage
+            })
+
+        def _send_json(self, status, payload, headers=None):
+            data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _send_stream(self, content):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            size = config.stream_chunk_size
+            for start in range(0, len(content), size):
+                chunk = {'choices': [{'index': 0, 'delta': {'content': content[start:start + size]}}]}
+                self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def start_stub_server(host: str = '127.0.0.1', port: int = 0, config: StubConfig = None):
+    """
+    Spustí stub server ve vlákně na pozadí. Vrací (server, config); port je v server.server_port.
+    """
+    config = config or StubConfig()
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, config
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stub OpenAI API pro benchmarky')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency', type=float, default=1.0, help='průměrná latence odpovědi v sekundách')
+    parser.add_argument('--jitter', type=float, default=0.0, help='náhodný rozptyl latence v sekundách')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='podíl odpovědí 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='podíl odpovědí 429')
+    args = parser.parse_args()
+
+    config = StubConfig(args.latency, args.jitter, args.error_rate, args.rate_limit_rate)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(config))
+    server.daemon_threads = True
+    print(f"🧪 Stub OpenAI API běží na http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n🛑 Stub zastaven, obslouženo {config.requests} požadavků")
+
+
+if __name__ == '__main__':
+    main()
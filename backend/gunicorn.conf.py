@@ -1,10 +1,29 @@
 # Gunicorn konfigurace pro Render
+import os
+
+# GUNICORN_WORKER_CLASS=gevent zapne kooperativní režim: worker obslouží až
+# worker_connections souběžných požadavků čekajících na OpenAI
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'sync')
+
+if worker_class == 'gevent':
+    # Patch musí proběhnout před načtením aplikace (preload_app), jinak by
+    # requests/ssl a zámky zůstaly blokující
+    from gevent import monkey
+    monkey.patch_all()
+    # Pool spojení na OpenAI musí pokrýt souběžné greenlety, jinak se spojení zahazují
+    os.environ.setdefault('OPENAI_POOL_SIZE', '100')
+    # Strop adaptivního limitu souběžných volání OpenAI na worker
+    os.environ.setdefault('OPENAI_MAX_CONCURRENCY', '100')
+    # Start na stropu - greenlety jsou levné a od výchozích 8 by limit rostl stovky volání
+    os.environ.setdefault('OPENAI_INITIAL_CONCURRENCY', os.environ['OPENAI_MAX_CONCURRENCY'])
+
 bind = "0.0.0.0:10000"
-workers = 2
-worker_class = "sync"
-worker_connections = 1000
-timeout = 30
+workers = int(os.getenv('GUNICORN_WORKERS', 2))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+# Čekání na sloučená volání OpenAI (services/single_flight.py) se drží pod timeoutem workeru
+os.environ.setdefault('GUNICORN_TIMEOUT', str(timeout))
 keepalive = 2
 max_requests = 1000
 max_requests_jitter = 50
-preload_app = True 
\ No newline at end of file
+preload_app = True
@@ -1,14 +1,18 @@
 from flask import Blueprint, request, jsonify, current_app
 from werkzeug.utils import secure_filename
 import os
-import uuid
 from datetime import datetime
-from services.image_analyzer import ImageAnalyzer
-from utils.file_utils import allowed_file, save_image
+from services.registry import get_services
+from services.analysis_cache import get_analysis_cache
+from services.near_duplicate_cache import get_near_duplicate_cache
+from services.image_preprocessor import probe_image
+from utils.file_utils import read_upload
+from routes.jobs import is_async_request, submit_job
 
 image_bp = Blueprint('image', __name__)
 
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp'}
+ALLOWED_MIME_TYPES = {'image/png', 'image/jpeg', 'image/gif', 'image/bmp'}
+BATCH_MAX_IMAGES = int(os.getenv('UPLOAD_BATCH_MAX_IMAGES', 6))
 
 @image_bp.route('/upload', methods=['POST'])
 def upload_image():
@@ -21,27 +25,97 @@ def upload_image():
         if file.filename == '':
             return jsonify({'error': 'Nebyl vybrán žádný soubor'}), 400
         
-        if not allowed_file(file.filename, ALLOWED_EXTENSIONS):
-            return jsonify({'error': 'Nepodporovaný formát souboru'}), 400
+        image_bytes, content_hash = read_upload(file)
         
-        filename = secure_filename(file.filename)
-        unique_filename = f"{uuid.uuid4()}_{filename}"
+        # Formát se ověřuje podle obsahu, ne podle přípony - poškozený soubor neplatíme API voláním
+        image_info = probe_image(image_bytes)
+        if not image_info or image_info['mime_type'] not in ALLOWED_MIME_TYPES:
+            return jsonify({'error': 'Nepodporovaný nebo poškozený obrázek'}), 400
         
-        file_path = save_image(file, unique_filename, current_app.config['UPLOAD_FOLDER'])
+        services = get_services()
+        stored = services.upload_store.store(image_bytes, content_hash, image_info,
+                                             secure_filename(file.filename))
         
-        analyzer = ImageAnalyzer()
-        ingredients = analyzer.analyze_fridge_content(file_path)
+        if is_async_request():
+            return submit_job('image_analysis', _analyze_upload, services.image_analyzer,
+                              services.upload_store, image_bytes, content_hash, stored)
         
-        return jsonify({
-            'message': 'Obrázek byl úspěšně nahrán a analyzován',
-            'filename': unique_filename,
-            'ingredients': ingredients,
-            'upload_time': datetime.now().isoformat()
-        }), 200
+        return jsonify(_analyze_upload(services.image_analyzer, services.upload_store,
+                                       image_bytes, content_hash, stored)), 200
         
     except Exception as e:
         return jsonify({'error': f'Chyba při nahrávání: {str(e)}'}), 500
 
+def _analyze_upload(analyzer, upload_store, image_bytes, content_hash, stored):
+    try:
+        ingredients = analyzer.analyze_fridge_bytes(image_bytes, content_hash)
+    except Exception:
+        upload_store.mark_analysis(content_hash, 'failed')
+        raise
+    upload_store.mark_analysis(content_hash, 'done' if ingredients else 'empty')
+    
+    return {
+        'message': 'Obrázek byl úspěšně nahrán a analyzován',
+        'filename': stored['filename'],
+        'duplicate': stored['duplicate'],
+        'ingredients': ingredients,
+        'upload_time': datetime.now().isoformat()
+    }
+
+@image_bp.route('/upload-batch', methods=['POST'])
+def upload_image_batch():
+    try:
+        files = [file for file in request.files.getlist('images') + request.files.getlist('image')
+                 if file.filename]
+        
+        if not files:
+            return jsonify({'error': 'Nebyl vybrán žádný soubor'}), 400
+        
+        if len(files) > BATCH_MAX_IMAGES:
+            return jsonify({'error': f'Najednou lze nahrát nejvýše {BATCH_MAX_IMAGES} obrázků'}), 400
+        
+        services = get_services()
+        images = []
+        for file in files:
+            image_bytes, content_hash = read_upload(file)
+            image_info = probe_image(image_bytes)
+            if not image_info or image_info['mime_type'] not in ALLOWED_MIME_TYPES:
+                return jsonify({'error': f'Nepodporovaný nebo poškozený obrázek: {file.filename}'}), 400
+            images.append((image_bytes, content_hash, image_info, secure_filename(file.filename)))
+        
+        # Stejná fotka nahraná dvakrát se analyzuje jen jednou
+        unique_images = list({content_hash: (image_bytes, content_hash)
+                              for image_bytes, content_hash, _, _ in images}.values())
+        stored = [services.upload_store.store(image_bytes, content_hash, image_info, filename)
+                  for image_bytes, content_hash, image_info, filename in images]
+        
+        if is_async_request():
+            return submit_job('image_batch_analysis', _analyze_batch, services.image_analyzer,
+                              services.upload_store, unique_images, stored)
+        
+        return jsonify(_analyze_batch(services.image_analyzer, services.upload_store,
+                                      unique_images, stored)), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Chyba při nahrávání: {str(e)}'}), 500
+
+def _analyze_batch(analyzer, upload_store, images, stored):
+    try:
+        ingredients = analyzer.analyze_fridge_batch(images)
+    except Exception:
+        for _, content_hash in images:
+            upload_store.mark_analysis(content_hash, 'failed')
+        raise
+    for _, content_hash in images:
+        upload_store.mark_analysis(content_hash, 'done' if ingredients else 'empty')
+    
+    return {
+        'message': f'Nahráno a analyzováno {len(stored)} obrázků',
+        'files': [{'filename': item['filename'], 'duplicate': item['duplicate']} for item in stored],
+        'ingredients': ingredients,
+        'upload_time': datetime.now().isoformat()
+    }
+
 @image_bp.route('/analyze/<filename>', methods=['GET'])
 def analyze_image(filename):
     try:
@@ -50,7 +124,7 @@ def analyze_image(filename):
         if not os.path.exists(file_path):
             return jsonify({'error': 'Soubor nebyl nalezen'}), 404
         
-        analyzer = ImageAnalyzer()
+        analyzer = get_services().image_analyzer
         ingredients = analyzer.analyze_fridge_content(file_path)
         
         return jsonify({
@@ -61,3 +135,59 @@ def analyze_image(filename):
         
     except Exception as e:
         return jsonify({'error': f'Chyba při analýze: {str(e)}'}), 500
+
+@image_bp.route('/uploads/<content_hash>', methods=['GET'])
+def upload_metadata(content_hash):
+    try:
+        metadata = get_services().upload_store.get(content_hash)
+        
+        if not metadata:
+            return jsonify({'error': 'Soubor nebyl nalezen'}), 404
+        
+        return jsonify(metadata), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Chyba při načítání metadat: {str(e)}'}), 500
+
+@image_bp.route('/uploads/stats', methods=['GET'])
+def upload_stats():
+    try:
+        return jsonify(get_services().upload_store.stats()), 200
+    except Exception as e:
+        return jsonify({'error': f'Chyba při načítání statistik úložiště: {str(e)}'}), 500
+
+@image_bp.route('/uploads/janitor', methods=['GET'])
+def upload_janitor_stats():
+    try:
+        janitor = get_services().upload_janitor
+        if janitor is None:
+            return jsonify({'enabled': False}), 200
+        
+        return jsonify({'enabled': True, **(janitor.stats() or {'runs': 0})}), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Chyba při načítání statistik úklidu: {str(e)}'}), 500
+
+@image_bp.route('/cache/stats', methods=['GET'])
+def analysis_cache_stats():
+    try:
+        cache = get_analysis_cache()
+        if cache is None:
+            return jsonify({'enabled': False}), 200
+        
+        return jsonify({'enabled': True, **cache.stats()}), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Chyba při načítání statistik cache: {str(e)}'}), 500
+
+@image_bp.route('/near-duplicates/stats', methods=['GET'])
+def near_duplicate_stats():
+    try:
+        cache = get_near_duplicate_cache()
+        if cache is None:
+            return jsonify({'enabled': False}), 200
+        
+        return jsonify({'enabled': True, **cache.stats()}), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Chyba při načítání statistik cache podobných fotek: {str(e)}'}), 500
@@ -0,0 +1,51 @@
+from flask import Blueprint, request, jsonify
+from services.job_queue import get_job_queue, JobQueueFull
+
+jobs_bp = Blueprint('jobs', __name__)
+
+# Čekání drží sync worker gunicornu, proto jen krátce - klient se má dotazovat opakovaně
+MAX_WAIT_SECONDS = 1.0
+
+def is_async_request(data=None) -> bool:
+    """
+    Režim úlohy se zapíná přes ?async=1, pole formuláře "async" nebo "async": true v JSON těle.
+    """
+    value = request.args.get('async') or request.form.get('async')
+    if value is None and isinstance(data, dict):
+        value = data.get('async')
+    return str(value).lower() in ('1', 'true', 'yes')
+
+def submit_job(kind, func, *args, **kwargs):
+    try:
+        job_id = get_job_queue().submit(kind, func, *args, **kwargs)
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 503
+    
+    return jsonify({
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': f'/api/jobs/{job_id}'
+    }), 202
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+def get_job(job_id):
+    try:
+        wait = min(max(float(request.args.get('wait', 0)), 0), MAX_WAIT_SECONDS)
+        job = get_job_queue().get(job_id, wait=wait)
+        
+        if not job:
+            return jsonify({'error': 'Úloha nebyla nalezena'}), 404
+        
+        return jsonify(job), 200
+        
+    except ValueError:
+        return jsonify({'error': 'Neplatná hodnota parametru wait'}), 400
+    except Exception as e:
+        return jsonify({'error': f'Chyba při načítání úlohy: {str(e)}'}), 500
+
+@jobs_bp.route('/stats', methods=['GET'])
+def job_stats():
+    try:
+        return jsonify(get_job_queue().stats()), 200
+    except Exception as e:
+        return jsonify({'error': f'Chyba při načítání statistik úloh: {str(e)}'}), 500
@@ -0,0 +1,73 @@
+from flask import Blueprint, request, jsonify
+from werkzeug.utils import secure_filename
+import os
+from datetime import datetime
+from services.registry import get_services
+from services.image_preprocessor import probe_image
+from utils.file_utils import read_upload
+from routes.image_upload import ALLOWED_MIME_TYPES
+from routes.jobs import is_async_request, submit_job
+
+pipeline_bp = Blueprint('pipeline', __name__)
+
+# Vypnutím se fotka zpracuje dvěma voláními (analýza, pak recepty) jako přes /image/upload a /recipes/generate
+PIPELINE_FUSED = os.getenv('PIPELINE_FUSED', 'true').lower() not in ('0', 'false', 'no')
+
+@pipeline_bp.route('/photo-to-recipes', methods=['POST'])
+def photo_to_recipes():
+    try:
+        if 'image' not in request.files:
+            return jsonify({'error': 'Nebyl nalezen soubor'}), 400
+        
+        file = request.files['image']
+        
+        if file.filename == '':
+            return jsonify({'error': 'Nebyl vybrán žádný soubor'}), 400
+        
+        try:
+            max_time = int(request.form.get('max_time', 20))
+        except ValueError:
+            return jsonify({'error': 'Neplatná hodnota max_time'}), 400
+        dietary_restrictions = [item.strip() for item in request.form.get('dietary_restrictions', '').split(',')
+                                if item.strip()]
+        
+        image_bytes, content_hash = read_upload(file)
+        
+        image_info = probe_image(image_bytes)
+        if not image_info or image_info['mime_type'] not in ALLOWED_MIME_TYPES:
+            return jsonify({'error': 'Nepodporovaný nebo poškozený obrázek'}), 400
+        
+        services = get_services()
+        stored = services.upload_store.store(image_bytes, content_hash, image_info,
+                                             secure_filename(file.filename))
+        
+        if is_async_request():
+            return submit_job('photo_to_recipes', _photo_to_recipes, services.image_analyzer,
+                              services.upload_store, image_bytes, content_hash, stored,
+                              max_time, dietary_restrictions)
+        
+        return jsonify(_photo_to_recipes(services.image_analyzer, services.upload_store, image_bytes,
+                                         content_hash, stored, max_time, dietary_restrictions)), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Chyba při zpracování fotky: {str(e)}'}), 500
+
+def _photo_to_recipes(analyzer, upload_store, image_bytes, content_hash, stored, max_time, dietary_restrictions):
+    try:
+        result = analyzer.analyze_fridge_with_recipes(image_bytes, content_hash, max_time,
+                                                      dietary_restrictions, fused=PIPELINE_FUSED)
+    except Exception:
+        upload_store.mark_analysis(content_hash, 'failed')
+        raise
+    upload_store.mark_analysis(content_hash, 'done' if result['ingredients'] else 'empty')
+    
+    return {
+        'message': 'Obrázek byl úspěšně nahrán a analyzován',
+        'filename': stored['filename'],
+        'duplicate': stored['duplicate'],
+        'ingredients': result['ingredients'],
+        'recipes': result['recipes'],
+        'total_count': len(result['recipes']),
+        'fused': PIPELINE_FUSED,
+        'upload_time': datetime.now().isoformat()
+    }
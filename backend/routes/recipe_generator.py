@@ -1,6 +1,9 @@
-from flask import Blueprint, request, jsonify
-from services.recipe_generator import OpenAIService
-from services.recipe_database import RecipeDatabase
+import json
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from services.registry import get_services
+from services.recipe_cache import get_recipe_cache
+from services.similar_recipe_cache import get_similar_recipe_cache
+from routes.jobs import is_async_request, submit_job
 
 recipe_bp = Blueprint('recipes', __name__)
 
@@ -15,36 +18,102 @@ def generate_recipes():
         ingredients = data['ingredients']
         max_time = data.get('max_time', 20)
         dietary_restrictions = data.get('dietary_restrictions', [])
+        use_cache = data.get('use_cache', True) is not False
         
-        generator = OpenAIService()
-        recipes = generator.generate_recipes(
-            ingredients=ingredients,
-            max_time=max_time,
-            dietary_restrictions=dietary_restrictions
-        )
+        generator = get_services().openai_service
         
-        return jsonify({
-            'recipes': recipes,
-            'total_count': len(recipes),
-            'generation_time': 'okamžité'
-        }), 200
+        if is_async_request(data):
+            return submit_job('recipe_generation', _generate_recipes,
+                              generator, ingredients, max_time, dietary_restrictions, use_cache)
+        
+        return jsonify(_generate_recipes(generator, ingredients, max_time, dietary_restrictions, use_cache)), 200
         
     except Exception as e:
         return jsonify({'error': f'Chyba při generování receptů: {str(e)}'}), 500
 
+def _generate_recipes(generator, ingredients, max_time, dietary_restrictions, use_cache):
+    recipes = generator.generate_recipes(
+        ingredients=ingredients,
+        max_time=max_time,
+        dietary_restrictions=dietary_restrictions,
+        use_cache=use_cache
+    )
+    
+    return {
+        'recipes': recipes,
+        'total_count': len(recipes),
+        'generation_time': 'okamžité'
+    }
+
+@recipe_bp.route('/generate/stream', methods=['POST'])
+def generate_recipes_stream():
+    data = request.get_json(silent=True)
+    
+    if not data or 'ingredients' not in data:
+        return jsonify({'error': 'Chybí seznam ingrediencí'}), 400
+    
+    ingredients = data['ingredients']
+    max_time = data.get('max_time', 20)
+    dietary_restrictions = data.get('dietary_restrictions', [])
+    use_cache = data.get('use_cache', True) is not False
+    
+    def events():
+        count = 0
+        try:
+            generator = get_services().openai_service
+            for recipe in generator.stream_recipes(ingredients, max_time, dietary_restrictions, use_cache):
+                count += 1
+                yield _sse_event('recipe', recipe)
+            yield _sse_event('done', {'total_count': count})
+        except Exception as e:
+            yield _sse_event('error', {'error': f'Chyba při generování receptů: {str(e)}'})
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+def _sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+@recipe_bp.route('/cache/stats', methods=['GET'])
+def recipe_cache_stats():
+    try:
+        cache = get_recipe_cache()
+        if cache is None:
+            return jsonify({'enabled': False}), 200
+        
+        return jsonify({'enabled': True, **cache.stats()}), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Chyba při načítání statistik cache: {str(e)}'}), 500
+
+@recipe_bp.route('/cache/similar/stats', methods=['GET'])
+def similar_recipe_cache_stats():
+    try:
+        cache = get_similar_recipe_cache()
+        if cache is None:
+            return jsonify({'enabled': False}), 200
+        
+        return jsonify({'enabled': True, **cache.stats()}), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Chyba při načítání statistik cache podobných receptů: {str(e)}'}), 500
+
 @recipe_bp.route('/search', methods=['GET'])
 def search_recipes():
     try:
         ingredients = request.args.get('ingredients', '').split(',')
         max_time = int(request.args.get('max_time', 20))
+        limit = int(request.args.get('limit', 50))
         
         if not ingredients or ingredients[0] == '':
             return jsonify({'error': 'Nebyly zadány ingredience'}), 400
         
         ingredients = [ing.strip() for ing in ingredients if ing.strip()]
         
-        db = RecipeDatabase()
-        recipes = db.search_recipes_by_ingredients(ingredients, max_time)
+        db = get_services().recipe_database
+        recipes = db.search_recipes_by_ingredients(ingredients, max_time, limit)
         
         return jsonify({
             'recipes': recipes,
@@ -58,7 +127,7 @@ def search_recipes():
 @recipe_bp.route('/categories', methods=['GET'])
 def get_recipe_categories():
     try:
-        db = RecipeDatabase()
+        db = get_services().recipe_database
         categories = db.get_recipe_categories()
         
         return jsonify({
@@ -71,7 +140,7 @@ def get_recipe_categories():
 @recipe_bp.route('/<recipe_id>', methods=['GET'])
 def get_recipe_details(recipe_id):
     try:
-        db = RecipeDatabase()
+        db = get_services().recipe_database
         recipe = db.get_recipe_by_id(recipe_id)
         
         if not recipe:
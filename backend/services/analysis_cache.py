@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from typing import Any, Dict, Optional
+from utils.metrics import get_metrics
+from utils.process_utils import connect_wal, env_disabled, process_registry
+
+
+class AnalysisCache:
+    """
+    Diskový cache výsledků analýzy obrázků sdílený mezi gunicorn workery (SQLite).
+    Klíčem je hash obsahu obrázku + verze promptu/modelu. Zásah do cache nezapisuje:
+    accessed_at se obnoví nejvýš jednou za touch_interval a čítače jsou v metrikách.
+    """
+    def __init__(self, db_path: str = None, ttl_seconds: int = None, max_bytes: int = None,
+                 touch_interval: float = None):
+        self.db_path = db_path or os.getenv('ANALYSIS_CACHE_PATH', os.path.join('cache', 'analysis_cache.sqlite3'))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(os.getenv('ANALYSIS_CACHE_TTL', 7 * 24 * 3600))
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv('ANALYSIS_CACHE_MAX_MB', 200)) * 1024 * 1024
+        self.touch_interval = touch_interval if touch_interval is not None else float(os.getenv('ANALYSIS_CACHE_TOUCH_INTERVAL', 300))
+
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._init_db()
+
+    @staticmethod
+    def make_key(data: bytes, *version_parts: str) -> str:
+        digest = hashlib.sha256()
+        for part in version_parts:
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        digest.update(data)
+        return digest.hexdigest()
+
+    def _init_db(self):
+        conn = connect_wal(self.db_path)
+        try:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, '
+                'created_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries(accessed_at)')
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        conn = connect_wal(self.db_path)
+        try:
+            row = conn.execute('SELECT value, created_at, accessed_at FROM entries WHERE key = ?', (key,)).fetchone()
+            # Prošlé záznamy smaže až _evict při zápisu, čtení zámek WAL nebere
+            hit = row is not None and now - row[1] <= self.ttl_seconds
+            if hit and now - row[2] > self.touch_interval:
+                # Pro LRU stačí hrubý čas posledního přístupu
+                conn.execute('UPDATE entries SET accessed_at = ? WHERE key = ?', (now, key))
+        finally:
+            conn.close()
+        get_metrics().inc('fridge_analysis_cache_total', result='hit' if hit else 'miss')
+        return json.loads(row[0]) if hit else None
+
+    def set(self, key: str, value: Any):
+        payload = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        conn = connect_wal(self.db_path)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute(
+                'INSERT OR REPLACE INTO entries (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)',
+                (key, payload, len(payload.encode('utf-8')), now, now)
+            )
+            self._evict(conn, now)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        expired = conn.execute('DELETE FROM entries WHERE created_at < ?', (now - self.ttl_seconds,)).rowcount
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        evicted = 0
+        if total > self.max_bytes:
+            for key, size in conn.execute('SELECT key, size FROM entries ORDER BY accessed_at').fetchall():
+                if total <= self.max_bytes:
+                    break
+                conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+                total -= size
+                evicted += 1
+        if expired or evicted:
+            get_metrics().inc('fridge_analysis_cache_evictions_total', expired + evicted)
+
+    def stats(self) -> Dict[str, Any]:
+        conn = connect_wal(self.db_path)
+        try:
+            entries, total = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        finally:
+            conn.close()
+
+        # Souhrn za všechny workery z metrik
+        results = {'hit': 0, 'miss': 0}
+        evictions = 0
+        for (name, labels), value in get_metrics().collect()['counters'].items():
+            result = dict(labels).get('result')
+            if name == 'fridge_analysis_cache_total' and result in results:
+                results[result] += int(value)
+            elif name == 'fridge_analysis_cache_evictions_total':
+                evictions += int(value)
+        hits, misses = results['hit'], results['miss']
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'evictions': evictions,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'entries': entries,
+            'size_bytes': total,
+            'max_bytes': self.max_bytes,
+            'ttl_seconds': self.ttl_seconds
+        }
+
+
+def _create_analysis_cache() -> Optional[AnalysisCache]:
+    return None if env_disabled('ANALYSIS_CACHE_ENABLED') else AnalysisCache()
+
+
+process_registry().register('analysis_cache', _create_analysis_cache)
+
+
+def get_analysis_cache() -> Optional[AnalysisCache]:
+    return process_registry().get('analysis_cache')
@@ -0,0 +1,104 @@
+import os
+import time
+import random
+from email.utils import parsedate_to_datetime
+from typing import Optional
+import requests
+from requests.adapters import HTTPAdapter
+from utils.process_utils import process_registry
+
+
+class HttpClient:
+    """
+    Sdílený HTTP klient s keep-alive poolem spojení, timeouty a omezeným počtem
+    opakování (429/5xx, chyby spojení) s náhodným exponenciálním čekáním.
+    Všechny pokusy včetně čekání se musí vejít do total_timeout (pod timeoutem
+    gunicorn workeru); poslední pokus dostane jen zbytek rozpočtu.
+    """
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, connect_timeout: float = None, read_timeout: float = None,
+                 max_retries: int = None, backoff_base: float = None,
+                 backoff_max: float = None, pool_size: int = None,
+                 total_timeout: float = None, min_attempt: float = None):
+        self.connect_timeout = connect_timeout if connect_timeout is not None else float(os.getenv('OPENAI_CONNECT_TIMEOUT', 5))
+        self.read_timeout = read_timeout if read_timeout is not None else float(os.getenv('OPENAI_READ_TIMEOUT', 25))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('OPENAI_MAX_RETRIES', 2))
+        self.backoff_base = backoff_base if backoff_base is not None else float(os.getenv('OPENAI_BACKOFF_BASE', 0.5))
+        self.backoff_max = backoff_max if backoff_max is not None else float(os.getenv('OPENAI_BACKOFF_MAX', 8))
+        pool_size = pool_size if pool_size is not None else int(os.getenv('OPENAI_POOL_SIZE', 10))
+        # Rezerva pod timeoutem workeru na zpracování odpovědi
+        default_total = float(os.getenv('GUNICORN_TIMEOUT', 30)) - 5
+        self.total_timeout = total_timeout if total_timeout is not None else float(os.getenv('OPENAI_TOTAL_TIMEOUT', default_total))
+        # Kratší zbytek rozpočtu už na další pokus nestojí
+        self.min_attempt = min_attempt if min_attempt is not None else float(os.getenv('OPENAI_MIN_ATTEMPT', 5))
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        connect_timeout, read_timeout = kwargs.pop('timeout', (self.connect_timeout, self.read_timeout))
+        deadline = time.monotonic() + self.total_timeout
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            kwargs['timeout'] = (min(connect_timeout, remaining), min(read_timeout, remaining))
+            try:
+                response = self.session.post(url, **kwargs)
+            except requests.ConnectionError as e:
+                # ReadTimeout sem nepatří - neopakujeme požadavek, který už upstream zpracovává
+                delay = self._backoff_delay(attempt)
+                if not self._can_retry(attempt, delay, deadline):
+                    raise
+                reason = str(e)
+            else:
+                if response.status_code not in self.RETRY_STATUSES:
+                    return response
+                delay = self._retry_after_delay(response)
+                if delay is None:
+                    delay = self._backoff_delay(attempt)
+                if not self._can_retry(attempt, delay, deadline):
+                    return response
+                reason = f"HTTP {response.status_code}"
+                response.close()
+
+            attempt += 1
+            print(f"⏳ Opakuji požadavek ({attempt}/{self.max_retries}) za {delay:.2f} s: {reason}")
+            time.sleep(delay)
+
+    def _can_retry(self, attempt: int, delay: float, deadline: float) -> bool:
+        return attempt < self.max_retries and deadline - time.monotonic() - delay >= self.min_attempt
+
+    def _backoff_delay(self, attempt: int) -> float:
+        # "Full jitter": náhodně v intervalu <0, base * 2^attempt>
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _retry_after_delay(self, response: requests.Response) -> Optional[float]:
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                seconds = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return min(max(seconds, 0.0), self.backoff_max)
+
+    def close(self):
+        self.session.close()
+
+
+def _create_http_client() -> HttpClient:
+    # Po forku workeru (preload_app) vzniká nový klient, aby workery nesdílely sockety
+    return HttpClient()
+
+
+process_registry().register('http_client', _create_http_client)
+
+
+def get_http_client() -> HttpClient:
+    return process_registry().get('http_client')
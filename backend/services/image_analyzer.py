@@ -3,125 +3,339 @@ import numpy as np
 from PIL import Image
 import os
 import json
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
 from services.recipe_generator import OpenAIService
+from services.upstream_guard import UpstreamUnavailable, get_upstream_guard
+from services.image_preprocessor import resize_to_max_edge, probe_image
+from services.near_duplicate_cache import get_near_duplicate_cache, perceptual_hash
+from utils.text_utils import fold_text
+from utils.ingredient_lexicon import ingredient_category, canonical_ingredient_name
+from utils.metrics import timed
+
+ANALYZER_MAX_EDGE = 1024
+ANALYZER_TILE_GRID = os.getenv('ANALYZER_TILE_GRID', '4x4')
+# Menší obrázky než mřížka dlaždic této velikosti se analyzují jako jedna dlaždice
+ANALYZER_MIN_TILE = int(os.getenv('ANALYZER_MIN_TILE', 16))
+ANALYZER_THREADS = int(os.getenv('ANALYZER_THREADS', os.cpu_count() or 2))
+ANALYZER_MIN_CONFIDENCE = float(os.getenv('ANALYZER_MIN_CONFIDENCE', 0.55))
+# Nejmenší delší hrana, ze které se ještě počítá perceptuální hash
+PHASH_DECODE_EDGE = 256
+
+_COLOR_DECODE_FLAGS = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+                       4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+_GRAYSCALE_DECODE_FLAGS = {1: cv2.IMREAD_GRAYSCALE, 2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+                           4: cv2.IMREAD_REDUCED_GRAYSCALE_4, 8: cv2.IMREAD_REDUCED_GRAYSCALE_8}
+
+# Referenční signatury dlaždic: (odstín ve stupních, sytost, jas, textura)
+INGREDIENT_SIGNATURES = {
+    'rajčata': (4, 0.80, 0.75, 0.04),
+    'paprika': (355, 0.85, 0.80, 0.02),
+    'hovězí maso': (355, 0.65, 0.45, 0.05),
+    'mrkev': (24, 0.85, 0.85, 0.03),
+    'losos': (16, 0.55, 0.85, 0.03),
+    'pomeranče': (32, 0.85, 0.90, 0.04),
+    'kuřecí prsa': (15, 0.25, 0.85, 0.02),
+    'brambory': (35, 0.45, 0.65, 0.04),
+    'cibule': (30, 0.35, 0.75, 0.03),
+    'vajíčka': (35, 0.20, 0.90, 0.01),
+    'sýr': (48, 0.55, 0.90, 0.02),
+    'máslo': (50, 0.35, 0.95, 0.01),
+    'citrony': (55, 0.85, 0.90, 0.03),
+    'banány': (52, 0.75, 0.85, 0.02),
+    'okurka': (110, 0.60, 0.45, 0.03),
+    'salát': (90, 0.55, 0.75, 0.06),
+    'brokolice': (105, 0.60, 0.45, 0.10),
+    'špenát': (120, 0.65, 0.30, 0.07),
+    'jablka': (85, 0.70, 0.75, 0.02),
+    'zelí': (95, 0.25, 0.80, 0.06),
+    'květák': (45, 0.12, 0.88, 0.09),
+    'mléko': (0, 0.03, 0.97, 0.01),
+    'jogurt': (40, 0.06, 0.93, 0.01)
+}
+
+_SIGNATURE_NAMES = list(INGREDIENT_SIGNATURES)
+_SIGNATURE_MATRIX = np.array(list(INGREDIENT_SIGNATURES.values()), dtype=np.float32)
+
+_tile_executor = None
+
+def _get_tile_executor() -> ThreadPoolExecutor:
+    global _tile_executor
+    if _tile_executor is None:
+        _tile_executor = ThreadPoolExecutor(max_workers=ANALYZER_THREADS, thread_name_prefix='tiles')
+    return _tile_executor
+
+def _parse_grid(grid: str) -> Tuple[int, int]:
+    try:
+        rows, cols = (int(part) for part in grid.lower().split('x'))
+        return max(rows, 1), max(cols, 1)
+    except ValueError:
+        return 4, 4
 
 class ImageAnalyzer:
-    def __init__(self):
-        self.common_ingredients = {
-            'zelenina': ['mrkev', 'cibule', 'česnek', 'paprika', 'rajčata', 'okurka', 
-                        'salát', 'špenát', 'brokolice', 'květák', 'zelí', 'brambory'],
-            'ovoce': ['jablka', 'banány', 'pomeranče', 'citrony', 'limetky', 'hrušky'],
-            'maso': ['kuřecí prsa', 'vepřové maso', 'hovězí maso', 'ryby', 'losos', 'treska'],
-            'mléčné': ['mléko', 'jogurt', 'sýr', 'tvaroh', 'smetana', 'máslo'],
-            'vejce': ['vajíčka'],
-            'těstoviny': ['špagety', 'penne', 'fusilli', 'tagliatelle'],
-            'rýže': ['rýže', 'basmati', 'jasmínová rýže'],
-            'luštěniny': ['čočka', 'fazole', 'cizrna', 'hrách'],
-            'koření': ['sůl', 'pepř', 'oregano', 'bazalka', 'tymián', 'rozmarýn']
-        }
-        
-        try:
-            self.openai_service = OpenAIService()
-            self.use_openai = True
-        except Exception as e:
-            print(f"OpenAI služba není dostupná: {e}")
-            self.use_openai = False
+    def __init__(self, openai_service: OpenAIService = None, use_openai: bool = True):
+        self.openai_service = openai_service
+        self.use_openai = use_openai
+        if use_openai and openai_service is None:
+            try:
+                self.openai_service = OpenAIService()
+            except Exception as e:
+                print(f"OpenAI služba není dostupná: {e}")
+                self.use_openai = False
     
     def analyze_fridge_content(self, image_path: str) -> List[Dict[str, Any]]:
         try:
-            if self.use_openai:
+            with open(image_path, 'rb') as image_file:
+                image_bytes = image_file.read()
+        except OSError as e:
+            print(f"Chyba při analýze obrázku: {e}")
+            return []
+        return self.analyze_fridge_bytes(image_bytes)
+    
+    def analyze_fridge_bytes(self, image_bytes: bytes, content_hash: str = None) -> List[Dict[str, Any]]:
+        try:
+            if self._openai_available():
+                # Cache téměř shodných fotek drží jen výsledky OpenAI - bez něj ji nemá smysl prohledávat
+                image_hash = self._image_hash(image_bytes)
+                cached = self._near_duplicate_get(image_hash)
+                if cached is not None:
+                    return cached
+
                 print("🔍 Používám OpenAI Vision API pro analýzu obrázku...")
-                return self.openai_service.analyze_fridge_image(image_path)
+                try:
+                    ingredients = self.openai_service.analyze_fridge_image_bytes(image_bytes, content_hash)
+                    self._near_duplicate_set(image_hash, ingredients)
+                    return ingredients
+                except UpstreamUnavailable as e:
+                    print(f"⚠️ {e} - přepínám na lokální detekci")
             
-            print("🔍 Používám simulaci AI detekce...")
-            image = cv2.imread(image_path)
-            if image is None:
-                raise ValueError("Nepodařilo se načíst obrázek")
+            print("🔍 Používám lokální detekci podle barev a textury...")
+            return self._analyze_offline(image_bytes)
             
-            processed_image = self._preprocess_image(image)
-            detected_objects = self._detect_objects(processed_image)
-            ingredients = self._classify_ingredients(detected_objects)
+        except Exception as e:
+            print(f"Chyba při analýze obrázku: {e}")
+            return []
+    
+    def analyze_fridge_batch(self, images: List[Tuple[bytes, Optional[str]]]) -> List[Dict[str, Any]]:
+        """
+        Analyzuje několik fotek téže ledničky (police, dveře, mrazák) zadaných jako
+        (image_bytes, content_hash) a vrací jeden seznam ingrediencí bez duplicit.
+        """
+        try:
+            if self._openai_available():
+                print(f"🔍 Používám OpenAI Vision API pro analýzu {len(images)} obrázků...")
+                try:
+                    return self._deduplicate_ingredients(self.openai_service.analyze_fridge_images_bytes(images))
+                except UpstreamUnavailable as e:
+                    print(f"⚠️ {e} - přepínám na lokální detekci")
+            
+            print(f"🔍 Používám lokální detekci pro {len(images)} obrázků...")
+            ingredients = []
+            for image_bytes, _ in images:
+                try:
+                    ingredients.extend(self._analyze_offline(image_bytes))
+                except ValueError as e:
+                    print(f"Chyba při analýze obrázku: {e}")
+            # Z více fotek si ponecháme nejjistější detekci každé ingredience
+            ingredients.sort(key=lambda ingredient: ingredient.get('confidence', 0), reverse=True)
             
-            return ingredients
+            return self._deduplicate_ingredients(ingredients)
             
         except Exception as e:
-            print(f"Chyba při analýze obrázku: {e}")
+            print(f"Chyba při analýze obrázků: {e}")
             return []
     
+    def analyze_fridge_with_recipes(self, image_bytes: bytes, content_hash: str = None,
+                                    max_time: int = 20, dietary_restrictions: List[str] = None,
+                                    fused: bool = True) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Rozpozná ingredience a navrhne k nim recepty. Ve sloučeném režimu (fused) stačí
+        jediné volání vision modelu; jinak, nebo když OpenAI není k dispozici, proběhne
+        analýza a generování receptů postupně.
+        """
+        ingredients = None
+        if fused and self._openai_available():
+            image_hash = self._image_hash(image_bytes)
+            ingredients = self._near_duplicate_get(image_hash)
+            if ingredients is None:
+                print("🔍 Používám OpenAI Vision API pro analýzu obrázku a recepty najednou...")
+                try:
+                    result = self.openai_service.analyze_and_generate_recipes(image_bytes, content_hash, max_time,
+                                                                              dietary_restrictions)
+                    self._near_duplicate_set(image_hash, result['ingredients'])
+                    return result
+                except UpstreamUnavailable as e:
+                    print(f"⚠️ {e} - přepínám na lokální detekci")
+                    try:
+                        ingredients = self._analyze_offline(image_bytes)
+                    except Exception as e:
+                        print(f"Chyba při analýze obrázku: {e}")
+                        ingredients = []
+
+        if ingredients is None:
+            ingredients = self.analyze_fridge_bytes(image_bytes, content_hash)
+        if not ingredients or self.openai_service is None:
+            return {'ingredients': ingredients, 'recipes': []}
+
+        # Při nedostupném OpenAI vrátí generate_recipes recepty z katalogu
+        recipes = self.openai_service.generate_recipes(ingredients, max_time, dietary_restrictions)
+        return {'ingredients': ingredients, 'recipes': recipes}
+
+    def _analyze_offline(self, image_bytes: bytes) -> List[Dict[str, Any]]:
+        with timed('offline_decode'):
+            image = self._decode_image(image_bytes)
+            if image is None:
+                raise ValueError("Nepodařilo se načíst obrázek")
+            processed_image = self._preprocess_image(image)
+        
+        with timed('offline_detection'):
+            detected_objects = self._detect_objects(processed_image)
+            return self._classify_ingredients(detected_objects)
+    
+    def _image_hash(self, image_bytes: bytes) -> Optional[int]:
+        """
+        Perceptuální hash z malého šedotónového dekódování (pHash stejně pracuje s 32x32).
+        Bez cache téměř shodných fotek, nebo pro formáty, které OpenCV nepřečte, vrací None.
+        """
+        if get_near_duplicate_cache() is None:
+            return None
+        with timed('perceptual_hash'):
+            try:
+                image = self._decode_image(image_bytes, grayscale=True, max_edge=PHASH_DECODE_EDGE)
+            except cv2.error as e:
+                print(f"Chyba při načítání obrázku: {e}")
+                return None
+            return perceptual_hash(image) if image is not None else None
+    
+    def _near_duplicate_get(self, image_hash: Optional[int]) -> Optional[List[Dict[str, Any]]]:
+        cache = get_near_duplicate_cache()
+        if cache is None or image_hash is None:
+            return None
+        return cache.get(image_hash)
+    
+    def _near_duplicate_set(self, image_hash: Optional[int], ingredients: List[Dict[str, Any]]):
+        # Ukládají se jen výsledky OpenAI - lokální detekce je na opakované použití moc hrubá
+        cache = get_near_duplicate_cache()
+        if cache is not None and image_hash is not None and OpenAIService.is_complete_result(ingredients):
+            cache.set(image_hash, ingredients)
+    
+    def _openai_available(self) -> bool:
+        # Při otevřeném jističi rovnou analyzujeme lokálně, bez čekání na odmítnutí
+        return self.use_openai and get_upstream_guard().available()
+    
+    def _decode_image(self, image_bytes: bytes, grayscale: bool = False,
+                      max_edge: int = ANALYZER_MAX_EDGE) -> Optional[np.ndarray]:
+        # U velkých JPEG fotek dekódujeme rovnou ve zmenšeném rozlišení (řádově rychlejší)
+        flags = _GRAYSCALE_DECODE_FLAGS if grayscale else _COLOR_DECODE_FLAGS
+        flag = flags[1]
+        info = probe_image(image_bytes)
+        if info and info.get('width'):
+            longest_edge = max(info['width'], info['height'])
+            for scale in (8, 4, 2):
+                if longest_edge >= max_edge * scale:
+                    flag = flags[scale]
+                    break
+        return cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), flag)
+    
     def _preprocess_image(self, image: np.ndarray) -> np.ndarray:
         rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        
-        height, width = rgb_image.shape[:2]
-        max_size = 1024
-        
-        if max(height, width) > max_size:
-            scale = max_size / max(height, width)
-            new_width = int(width * scale)
-            new_height = int(height * scale)
-            rgb_image = cv2.resize(rgb_image, (new_width, new_height))
+        rgb_image = resize_to_max_edge(rgb_image, ANALYZER_MAX_EDGE)
         
         normalized = rgb_image.astype(np.float32) / 255.0
         return normalized
     
     def _detect_objects(self, image: np.ndarray) -> List[Dict[str, Any]]:
-        detected_objects = []
         height, width = image.shape[:2]
+        if not height or not width:
+            return []
+        rows, cols = _parse_grid(ANALYZER_TILE_GRID)
+        if height < rows * ANALYZER_MIN_TILE or width < cols * ANALYZER_MIN_TILE:
+            rows, cols = 1, 1
+        tile_h, tile_w = height // rows, width // cols
         
         regions = [
-            {'x': 0, 'y': 0, 'w': width//2, 'h': height//2, 'confidence': 0.8},
-            {'x': width//2, 'y': 0, 'w': width//2, 'h': height//2, 'confidence': 0.7},
-            {'x': 0, 'y': height//2, 'w': width//2, 'h': height//2, 'confidence': 0.9},
-            {'x': width//2, 'y': height//2, 'w': width//2, 'h': height//2, 'confidence': 0.6}
+            {'x': col * tile_w, 'y': row * tile_h, 'w': tile_w, 'h': tile_h}
+            for row in range(rows) for col in range(cols)
         ]
         
-        for region in regions:
-            detected_objects.append({
-                'region': region,
-                'ingredients': self._simulate_ingredient_detection(region)
-            })
+        # OpenCV během výpočtu uvolňuje GIL, dlaždice se tak zpracují paralelně
+        tiles = [image[r['y']:r['y'] + r['h'], r['x']:r['x'] + r['w']] for r in regions]
+        features = np.array(list(_get_tile_executor().map(self._tile_features, tiles)), dtype=np.float32)
+        names, confidences = self._match_signatures(features)
         
+        detected_objects = []
+        for region, tile_features, name, confidence in zip(regions, features, names, confidences):
+            # Tmavé dlaždice (stíny, zadní stěna) a slabé shody přeskočíme
+            if tile_features[2] < 0.15 or confidence < ANALYZER_MIN_CONFIDENCE:
+                continue
+            region['confidence'] = round(float(confidence), 2)
+            detected_objects.append({'region': region, 'ingredients': [name]})
+        
+        detected_objects.sort(key=lambda obj: obj['region']['confidence'], reverse=True)
         return detected_objects
     
-    def _simulate_ingredient_detection(self, region: Dict[str, Any]) -> List[str]:
-        import random
+    @staticmethod
+    def _tile_features(tile: np.ndarray) -> Tuple[float, float, float, float]:
+        hsv = cv2.cvtColor(tile, cv2.COLOR_RGB2HSV)
+        hue = np.deg2rad(hsv[..., 0])
+        saturation = hsv[..., 1]
+        
+        # Kruhový průměr odstínu vážený sytostí (odstín šedých pixelů nic neříká)
+        weight = saturation.sum() or 1.0
+        mean_hue = np.rad2deg(np.arctan2((np.sin(hue) * saturation).sum() / weight,
+                                         (np.cos(hue) * saturation).sum() / weight)) % 360
         
-        all_ingredients = []
-        for category in self.common_ingredients.values():
-            all_ingredients.extend(category)
+        gray = cv2.cvtColor(tile, cv2.COLOR_RGB2GRAY)
+        texture = cv2.Laplacian(gray, cv2.CV_32F).std()
+        return float(mean_hue), float(saturation.mean()), float(hsv[..., 2].mean()), float(texture)
+    
+    @staticmethod
+    def _match_signatures(features: np.ndarray) -> Tuple[List[str], np.ndarray]:
+        if len(features) == 0:
+            return [], np.zeros(0, dtype=np.float32)
         
-        num_ingredients = random.randint(3, 7)
-        detected = random.sample(all_ingredients, min(num_ingredients, len(all_ingredients)))
+        tiles = features[:, None, :]
+        signatures = _SIGNATURE_MATRIX[None, :, :]
+        hue_diff = np.abs(tiles[..., 0] - signatures[..., 0]) % 360
+        hue_diff = np.minimum(hue_diff, 360 - hue_diff) / 180.0
+        hue_weight = np.minimum(tiles[..., 1], signatures[..., 1]) * 4.0
         
-        return detected
+        distance = np.sqrt(
+            hue_weight * hue_diff ** 2
+            + (tiles[..., 1] - signatures[..., 1]) ** 2
+            + (tiles[..., 2] - signatures[..., 2]) ** 2
+            + ((tiles[..., 3] - signatures[..., 3]) * 5.0) ** 2
+        )
+        best = distance.argmin(axis=1)
+        confidence = np.clip(1.0 - distance[np.arange(len(best)), best] / 0.6, 0.0, 1.0)
+        return [_SIGNATURE_NAMES[index] for index in best], confidence
     
     def _classify_ingredients(self, detected_objects: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         ingredients = []
         
         for obj in detected_objects:
             for ingredient_name in obj['ingredients']:
-                category = self._get_ingredient_category(ingredient_name)
-                
                 ingredients.append({
                     'name': ingredient_name,
-                    'category': category,
+                    'category': ingredient_category(ingredient_name),
                     'confidence': obj['region']['confidence'],
                     'quantity': 'dostupné',
                     'freshness': 'čerstvé'
                 })
         
+        return self._deduplicate_ingredients(ingredients)
+    
+    @staticmethod
+    def _deduplicate_ingredients(ingredients: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         unique_ingredients = []
         seen_names = set()
         
         for ingredient in ingredients:
-            if ingredient['name'] not in seen_names:
+            # 'vejce' a 'vajíčka' z různých fotek jsou stejná ingredience
+            raw_name = str(ingredient.get('name', ''))
+            name = canonical_ingredient_name(raw_name) or fold_text(raw_name)
+            if name and name not in seen_names:
                 unique_ingredients.append(ingredient)
-                seen_names.add(ingredient['name'])
+                seen_names.add(name)
         
         return unique_ingredients
-    
-    def _get_ingredient_category(self, ingredient_name: str) -> str:
-        for category, ingredients in self.common_ingredients.items():
-            if ingredient_name.lower() in [ing.lower() for ing in ingredients]:
-                return category
-        return 'ostatní' 
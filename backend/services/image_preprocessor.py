@@ -0,0 +1,143 @@
+import os
+import struct
+import cv2
+import numpy as np
+from typing import Any, Dict, Optional, Tuple
+
+VISION_MAX_EDGE = int(os.getenv('VISION_MAX_EDGE', 1024))
+VISION_IMAGE_FORMAT = os.getenv('VISION_IMAGE_FORMAT', 'jpeg').lower()
+VISION_IMAGE_QUALITY = int(os.getenv('VISION_IMAGE_QUALITY', 85))
+
+_ENCODERS = {
+    'jpeg': ('.jpg', 'image/jpeg', cv2.IMWRITE_JPEG_QUALITY),
+    'webp': ('.webp', 'image/webp', cv2.IMWRITE_WEBP_QUALITY)
+}
+
+_SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp')
+]
+
+
+def sniff_mime_type(data: bytes) -> str:
+    for signature, mime_type in _SIGNATURES:
+        if data.startswith(signature):
+            return mime_type
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'application/octet-stream'
+
+
+def probe_image(data: bytes) -> Optional[Dict[str, Any]]:
+    """
+    Ověří obrázek podle hlavičky a konce souboru bez dekódování pixelů.
+    Vrací {'mime_type', 'width', 'height'} nebo None pro poškozená/nepodporovaná data.
+    """
+    mime_type = sniff_mime_type(data)
+    try:
+        if mime_type == 'image/png':
+            # Stejně jako u JPEG EOI: za chunkem IEND mohou exporty přidat další data
+            if data[12:16] != b'IHDR' or data.rfind(b'\0\0\0\0IEND', 33) < 0:
+                return None
+            width, height = struct.unpack('>II', data[16:24])
+        elif mime_type == 'image/gif':
+            if not data.rstrip(b'\0').endswith(b'\x3b'):
+                return None
+            width, height = struct.unpack('<HH', data[6:10])
+        elif mime_type == 'image/bmp':
+            if struct.unpack('<I', data[2:6])[0] > len(data):
+                return None
+            width, height = struct.unpack('<ii', data[18:26])
+            height = abs(height)
+        elif mime_type == 'image/jpeg':
+            # EOI nemusí být na konci - telefony za něj přidávají trailery (Samsung SEFT, MPF, XMP)
+            if data.rfind(b'\xff\xd9', 2) < 0:
+                return None
+            width, height = _jpeg_dimensions(data)
+        elif mime_type == 'image/webp':
+            if struct.unpack('<I', data[4:8])[0] + 8 > len(data):
+                return None
+            width, height = None, None
+        else:
+            return None
+    except (struct.error, ValueError):
+        return None
+
+    if width is not None and (width <= 0 or height <= 0):
+        return None
+    return {'mime_type': mime_type, 'width': width, 'height': height}
+
+
+def _jpeg_dimensions(data: bytes) -> Tuple[int, int]:
+    position = 2
+    while position + 9 < len(data):
+        if data[position] != 0xFF:
+            raise ValueError("Neplatná JPEG značka")
+        marker = data[position + 1]
+        if marker == 0xFF:
+            position += 1
+            continue
+        length = struct.unpack('>H', data[position + 2:position + 4])[0]
+        # SOF0-SOF15 kromě DHT (C4), JPG (C8) a DAC (CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack('>HH', data[position + 5:position + 9])
+            return width, height
+        position += 2 + length
+    raise ValueError("JPEG neobsahuje SOF segment")
+
+
+def resize_to_max_edge(image: np.ndarray, max_size: int) -> np.ndarray:
+    height, width = image.shape[:2]
+
+    if max(height, width) > max_size:
+        scale = max_size / max(height, width)
+        new_width = int(width * scale)
+        new_height = int(height * scale)
+        image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
+
+    return image
+
+
+def preprocessing_version() -> str:
+    return f"{VISION_IMAGE_FORMAT}:{VISION_MAX_EDGE}:{VISION_IMAGE_QUALITY}"
+
+
+def run_cpu_bound(func, *args):
+    """
+    V gevent režimu by CPU práce (dekódování, resize) blokovala všechny greenlety
+    workeru, proto ji přesuneme do nativního threadpoolu hubu (OpenCV uvolňuje GIL).
+    """
+    try:
+        from gevent import monkey, get_hub
+    except ImportError:
+        return func(*args)
+    if not monkey.is_module_patched('socket'):
+        return func(*args)
+    return get_hub().threadpool.apply(func, args)
+
+
+def prepare_image_for_vision(image_bytes: bytes) -> Tuple[bytes, str]:
+    """
+    Dekóduje obrázek, zmenší ho na VISION_MAX_EDGE a znovu zakóduje (bez EXIF).
+    Vrací (data, mime_type); pokud obrázek nejde dekódovat, vrací původní data.
+    """
+    return run_cpu_bound(_prepare_image, image_bytes)
+
+
+def _prepare_image(image_bytes: bytes) -> Tuple[bytes, str]:
+    image = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return image_bytes, sniff_mime_type(image_bytes)
+
+    extension, mime_type, quality_flag = _ENCODERS.get(VISION_IMAGE_FORMAT, _ENCODERS['jpeg'])
+    image = resize_to_max_edge(image, VISION_MAX_EDGE)
+    success, encoded = cv2.imencode(extension, image, [quality_flag, VISION_IMAGE_QUALITY])
+    if not success:
+        return image_bytes, sniff_mime_type(image_bytes)
+
+    # Posíláme vždy znovu zakódovaná data, i když jsou větší: originál nese EXIF
+    # (včetně GPS) a orientaci už imdecode zapracoval do pixelů
+    return encoded.tobytes(), mime_type
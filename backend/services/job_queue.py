@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import uuid
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from utils.process_utils import connect_wal, pid_alive, process_registry
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobQueue:
+    """
+    Omezený background executor pro dlouhé LLM úlohy. Stav a výsledky úloh jsou
+    v SQLite, takže je lze dotazovat z libovolného gunicorn workeru.
+    """
+    def __init__(self, db_path: str = None, max_workers: int = None,
+                 max_pending: int = None, result_ttl: int = None):
+        self.db_path = db_path or os.getenv('JOB_DB_PATH', os.path.join('cache', 'jobs.sqlite3'))
+        self.max_workers = max_workers if max_workers is not None else int(os.getenv('JOB_WORKERS', 4))
+        self.max_pending = max_pending if max_pending is not None else int(os.getenv('JOB_QUEUE_MAX', 50))
+        self.result_ttl = result_ttl if result_ttl is not None else int(os.getenv('JOB_RESULT_TTL', 3600))
+
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._init_db()
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job')
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._events = {}
+
+    def _init_db(self):
+        conn = connect_wal(self.db_path)
+        try:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, '
+                'result TEXT, error TEXT, pid INTEGER NOT NULL, created_at REAL NOT NULL, '
+                'started_at REAL, finished_at REAL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs(finished_at)')
+        finally:
+            conn.close()
+
+    def _update(self, job_id: str, **fields):
+        columns = ', '.join(f'{name} = ?' for name in fields)
+        conn = connect_wal(self.db_path)
+        try:
+            conn.execute(f'UPDATE jobs SET {columns} WHERE id = ?', (*fields.values(), job_id))
+        finally:
+            conn.close()
+
+    def submit(self, kind: str, func: Callable[..., Any], *args, **kwargs) -> str:
+        with self._lock:
+            if self._pending + self._running >= self.max_pending:
+                raise JobQueueFull("Fronta úloh je plná, zkuste to prosím později")
+            self._pending += 1
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        try:
+            conn = connect_wal(self.db_path)
+            try:
+                conn.execute(
+                    'INSERT INTO jobs (id, kind, status, pid, created_at) VALUES (?, ?, ?, ?, ?)',
+                    (job_id, kind, 'queued', os.getpid(), now)
+                )
+                conn.execute('DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?',
+                             (now - self.result_ttl,))
+            finally:
+                conn.close()
+
+            with self._lock:
+                self._events[job_id] = threading.Event()
+            self._executor.submit(self._run, job_id, func, args, kwargs)
+        except Exception:
+            # Úloha se nezařadila - místo ve frontě musí zase uvolnit
+            with self._lock:
+                self._pending -= 1
+                self._events.pop(job_id, None)
+            raise
+        return job_id
+
+    def _run(self, job_id: str, func: Callable[..., Any], args: tuple, kwargs: Dict[str, Any]):
+        with self._lock:
+            self._pending -= 1
+            self._running += 1
+
+        try:
+            self._update(job_id, status='running', started_at=time.time())
+            result = func(*args, **kwargs)
+            self._update(job_id, status='done', finished_at=time.time(),
+                         result=json.dumps(result, ensure_ascii=False))
+        except Exception as e:
+            print(f"Chyba při zpracování úlohy {job_id}: {e}")
+            traceback.print_exc()
+            self._update(job_id, status='failed', finished_at=time.time(), error=str(e))
+        finally:
+            with self._lock:
+                self._running -= 1
+                event = self._events.pop(job_id, None)
+            if event:
+                event.set()
+
+    def get(self, job_id: str, wait: float = 0) -> Optional[Dict[str, Any]]:
+        deadline = time.monotonic() + wait
+        while True:
+            job = self._load(job_id)
+            if job is None or job['status'] in ('done', 'failed'):
+                return job
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return job
+            with self._lock:
+                event = self._events.get(job_id)
+            if event:
+                event.wait(remaining)
+            else:
+                # Úlohu zpracovává jiný worker - stav čteme z databáze
+                time.sleep(min(0.25, remaining))
+
+    def _load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        conn = connect_wal(self.db_path)
+        try:
+            row = conn.execute(
+                'SELECT id, kind, status, result, error, pid, created_at, started_at, finished_at '
+                'FROM jobs WHERE id = ?', (job_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+
+        job = {
+            'job_id': row[0],
+            'kind': row[1],
+            'status': row[2],
+            'result': json.loads(row[3]) if row[3] else None,
+            'error': row[4],
+            'created_at': row[6],
+            'started_at': row[7],
+            'finished_at': row[8],
+            'duration': round(row[8] - row[7], 3) if row[7] and row[8] else None
+        }
+        if job['status'] in ('queued', 'running') and not pid_alive(row[5]):
+            job['status'] = 'failed'
+            job['error'] = 'Worker zpracovávající úlohu byl ukončen'
+            self._update(job_id, status='failed', error=job['error'], finished_at=time.time())
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        conn = connect_wal(self.db_path)
+        try:
+            by_status = dict(conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+            durations = conn.execute(
+                'SELECT COUNT(*), AVG(finished_at - started_at), MAX(finished_at - started_at) '
+                'FROM jobs WHERE status = ? AND started_at IS NOT NULL', ('done',)
+            ).fetchone()
+        finally:
+            conn.close()
+
+        with self._lock:
+            pending, running = self._pending, self._running
+        return {
+            'worker_pid': os.getpid(),
+            'queue_depth': pending,
+            'running': running,
+            'max_workers': self.max_workers,
+            'max_pending': self.max_pending,
+            'jobs_by_status': by_status,
+            'completed': durations[0],
+            'avg_duration': round(durations[1], 3) if durations[1] is not None else None,
+            'max_duration': round(durations[2], 3) if durations[2] is not None else None
+        }
+
+
+# Vlákna executoru forkem nepřežijí, každý worker potřebuje vlastní frontu
+process_registry().register('job_queue', JobQueue)
+
+
+def get_job_queue() -> JobQueue:
+    return process_registry().get('job_queue')
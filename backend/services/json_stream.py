@@ -0,0 +1,178 @@
+import re
+import json
+import codecs
+from typing import Any, Dict, Iterable, List, Tuple, Union
+
+# Čárka před zavírací závorkou - častá chyba modelů, json.loads ji nepřijme
+_TRAILING_COMMA_RE = re.compile(r',\s*([}\]])')
+_PREVIEW_LENGTH = 80
+
+
+class JsonArrayStreamParser:
+    """
+    Inkrementální parser pole objektů pod daným klíčem, např. {"recipes": [{...}, {...}]}.
+    Metoda feed() přijímá kusy textu (str nebo UTF-8 bytes) a vrací objekty, které jsou
+    již kompletní. Text před klíčem i za polem (```json, komentáře) se ignoruje.
+    Objekty, které nejde načíst, položky, které nejsou objekty, a objekt useknutý koncem
+    vstupu (close()) se zapíší do dropped, takže z useknuté nebo zašuměné odpovědi
+    zůstanou všechny celé objekty.
+    """
+    def __init__(self, key: str):
+        self.key = key
+        self._key_re = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+        # Klíč, za kterým ještě může přijít dvojtečka a '[' v dalším kusu
+        self._pending_key_re = re.compile(r'"%s"\s*(?::\s*)?$' % re.escape(key))
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._buffer = ''
+        self._offset = 0
+        self._pos = 0
+        self._in_array = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._obj_start = None
+        self._in_scalar = False
+        self.finished = False
+        self.closed = False
+        self.parsed = 0
+        self.dropped: List[Dict[str, Any]] = []
+
+    def feed(self, chunk: Union[str, bytes]) -> List[Any]:
+        completed = []
+        if isinstance(chunk, (bytes, bytearray)):
+            # Vícebajtový znak rozdělený mezi dva kusy dekodér podrží do dalšího volání
+            chunk = self._decoder.decode(chunk)
+        if self.finished or not chunk:
+            return completed
+
+        self._buffer += chunk
+        if not self._in_array:
+            match = self._key_re.search(self._buffer)
+            if not match:
+                # Klíč může být rozdělený mezi kusy - ponecháme text od jeho možného začátku,
+                # tedy od celého klíče s mezerami za ním, jinak od poslední uvozovky
+                pending = self._pending_key_re.search(self._buffer)
+                keep_from = pending.start() if pending else self._buffer.rfind('"')
+                if keep_from < 0:
+                    keep_from = len(self._buffer)
+                self._offset += keep_from
+                self._buffer = self._buffer[keep_from:]
+                return completed
+            self._in_array = True
+            self._pos = match.end()
+
+        buffer = self._buffer
+        i = self._pos
+        while i < len(buffer):
+            ch = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 0:
+                        self._finish_item(buffer, i + 1, completed)
+            elif self._in_scalar:
+                if ch == ',' or ch in '}]' or ch.isspace():
+                    # Konec čísla nebo literálu; oddělovač zpracujeme znovu
+                    self._in_scalar = False
+                    self._finish_item(buffer, i, completed)
+                    continue
+            elif ch == '"':
+                if self._depth == 0:
+                    self._obj_start = i
+                self._in_string = True
+            elif ch in '{[':
+                if self._depth == 0:
+                    self._obj_start = i
+                self._depth += 1
+            elif ch in '}]':
+                if self._depth == 0:
+                    # Konec sledovaného pole
+                    self.finished = True
+                    break
+                self._depth -= 1
+                if self._depth == 0 and self._obj_start is not None:
+                    self._finish_item(buffer, i + 1, completed)
+            elif self._depth == 0 and ch != ',' and not ch.isspace():
+                self._obj_start = i
+                self._in_scalar = True
+            i += 1
+
+        # Zpracovaný text už nepotřebujeme, držíme jen rozpracovaný objekt
+        keep_from = self._obj_start if self._obj_start is not None else i
+        self._buffer = buffer[keep_from:]
+        self._offset += keep_from
+        self._obj_start = 0 if self._obj_start is not None else None
+        self._pos = i - keep_from
+        return completed
+
+    def _finish_item(self, buffer: str, end: int, completed: List[Any]):
+        text = buffer[self._obj_start:end]
+        offset = self._offset + self._obj_start
+        self._obj_start = None
+        if not text.startswith('{'):
+            # Pole má obsahovat jen objekty - řetězce, čísla a vnořená pole hlásíme
+            self._drop('not_object', offset, text)
+            return
+        item = self._load(text, offset)
+        if item is not None:
+            completed.append(item)
+
+    def _load(self, text: str, offset: int) -> Any:
+        try:
+            item = json.loads(text)
+        except json.JSONDecodeError:
+            try:
+                item = json.loads(_TRAILING_COMMA_RE.sub(r'\1', text))
+            except json.JSONDecodeError as e:
+                print(f"Přeskakuji nevalidní objekt v poli '{self.key}': {e}")
+                self._drop('invalid_json', offset, text)
+                return None
+        self.parsed += 1
+        return item
+
+    def _drop(self, reason: str, offset: int, text: str):
+        self.dropped.append({
+            'reason': reason,
+            'offset': offset,
+            'length': len(text),
+            'preview': text[:_PREVIEW_LENGTH]
+        })
+
+    def close(self) -> List[Dict[str, Any]]:
+        """
+        Ukončí vstup a vrátí seznam zahozených částí. Useknutý poslední objekt
+        se hlásí jako 'truncated', chybějící klíč jako 'missing_key'.
+        """
+        if self.closed:
+            return self.dropped
+        self.closed = True
+        tail = self._decoder.decode(b'', final=True)
+        if tail and not self.finished:
+            self.feed(tail)
+
+        if not self._in_array:
+            self._drop('missing_key', 0, '')
+        elif self._obj_start is not None and not self.finished:
+            self._drop('truncated', self._offset + self._obj_start, self._buffer[self._obj_start:])
+        return self.dropped
+
+
+def salvage_json_array(chunks: Union[str, bytes, Iterable[Union[str, bytes]]],
+                       key: str) -> Tuple[List[Any], List[Dict[str, Any]]]:
+    """
+    Vytáhne všechny kompletní objekty pole pod klíčem key z celé (i useknuté nebo
+    zašuměné) odpovědi nebo z proudu jejích kusů. Vrací (objekty, zahozené části).
+    """
+    if isinstance(chunks, (str, bytes, bytearray)):
+        chunks = [chunks]
+    parser = JsonArrayStreamParser(key)
+    items = []
+    for chunk in chunks:
+        items.extend(parser.feed(chunk))
+        if parser.finished:
+            break
+    return items, parser.close()
@@ -0,0 +1,251 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import deque
+from itertools import combinations
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+from utils.metrics import get_metrics, timed
+from utils.process_utils import connect_wal, env_disabled, process_registry
+
+HASH_BITS = 64
+_SEGMENTS = 4
+_SEGMENT_BITS = HASH_BITS // _SEGMENTS
+_SEGMENT_MASK = (1 << _SEGMENT_BITS) - 1
+
+
+def perceptual_hash(image: np.ndarray) -> int:
+    """
+    64bitový pHash: znaménka nízkých frekvencí DCT zmenšeného šedotónového obrázku
+    vůči jejich mediánu. Malý posun, ořez, jas nebo JPEG komprese změní jen pár bitů.
+    Přijímá šedotónový nebo RGB obrázek (uint8 nebo float 0-1).
+    """
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    gray = gray.astype(np.float32)
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA)
+    low_frequencies = cv2.dct(small)[:8, :8].flatten()
+    # Stejnosměrná složka (průměrný jas) se do mediánu nepočítá
+    bits = low_frequencies > np.median(low_frequencies[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def _to_signed(value: int) -> int:
+    # SQLite INTEGER je 64bitový se znaménkem
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << HASH_BITS) if value < 0 else value
+
+
+class MultiIndexHashTable:
+    """
+    Vyhledávání hashů do Hammingovy vzdálenosti max_distance. Hash se dělí na 4 úseky
+    po 16 bitech a každý má vlastní tabulku; podle Dirichletova principu se aspoň jeden
+    úsek shoduje do vzdálenosti max_distance // 4, takže stačí projít pár set
+    sousedních hodnot místo všech uložených hashů.
+    """
+    def __init__(self, max_distance: int):
+        self.max_distance = max_distance
+        radius = min(max_distance // _SEGMENTS, _SEGMENT_BITS)
+        self._flip_masks = [0] + [sum(1 << bit for bit in bits)
+                                  for distance in range(1, radius + 1)
+                                  for bits in combinations(range(_SEGMENT_BITS), distance)]
+        # Tabulky drží přímo hashe (bez dohledávání podle id); stejný hash nese id nejnovějšího záznamu
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in range(_SEGMENTS)]
+        self._ids: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @staticmethod
+    def _segments(value: int) -> List[int]:
+        return [(value >> (index * _SEGMENT_BITS)) & _SEGMENT_MASK for index in range(_SEGMENTS)]
+
+    def add(self, entry_id: int, value: int):
+        if value not in self._ids:
+            for table, segment in zip(self._tables, self._segments(value)):
+                table.setdefault(segment, []).append(value)
+        self._ids[value] = entry_id
+
+    def remove(self, entry_id: int, value: int):
+        # Hash mezitím převzal novější záznam
+        if self._ids.get(value) != entry_id:
+            return
+        del self._ids[value]
+        for table, segment in zip(self._tables, self._segments(value)):
+            bucket = table.get(segment)
+            if bucket is not None:
+                bucket.remove(value)
+                if not bucket:
+                    del table[segment]
+
+    def nearest(self, value: int) -> Optional[Tuple[int, int]]:
+        """
+        Vrací (entry_id, vzdálenost) nejbližšího hashe, nebo None, pokud žádný není dost blízko.
+        """
+        best = None
+        best_distance = self.max_distance + 1
+        for table, segment in zip(self._tables, self._segments(value)):
+            for mask in self._flip_masks:
+                bucket = table.get(segment ^ mask)
+                if not bucket:
+                    continue
+                for other in bucket:
+                    distance = (value ^ other).bit_count()
+                    # Při shodné vzdálenosti vyhrává novější záznam (vyšší id)
+                    if distance < best_distance or (best is not None and distance == best_distance
+                                                    and self._ids[other] > self._ids[best]):
+                        best, best_distance = other, distance
+        return (self._ids[best], best_distance) if best is not None else None
+
+
+class NearDuplicateCache:
+    """
+    Cache výsledků analýzy podle vizuální podobnosti fotek. Záznamy jsou v SQLite
+    sdíleném workery; každý worker si nad nimi drží index hashů v paměti a nejvýš
+    jednou za sync_interval do něj dočte nové řádky (podle rostoucího id). Vyhledání
+    bez shody tak SQLite vůbec neotevře, při shodě se čte jen uložený výsledek.
+    """
+    def __init__(self, db_path: str = None, max_distance: int = None, ttl_seconds: int = None,
+                 max_entries: int = None, sync_interval: float = None):
+        self.db_path = db_path or os.getenv('NEAR_DUPLICATE_CACHE_PATH', os.path.join('cache', 'near_duplicates.sqlite3'))
+        self.max_distance = max_distance if max_distance is not None else int(os.getenv('NEAR_DUPLICATE_MAX_DISTANCE', 6))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(os.getenv('NEAR_DUPLICATE_TTL', 900))
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv('NEAR_DUPLICATE_MAX_ENTRIES', 200000))
+        self.sync_interval = sync_interval if sync_interval is not None else float(os.getenv('NEAR_DUPLICATE_SYNC_INTERVAL', 1.0))
+
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._init_db()
+
+        self._index = MultiIndexHashTable(self.max_distance)
+        self._order: Deque[Tuple[int, int, float]] = deque()
+        self._last_id = 0
+        self._next_sync = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _init_db(self):
+        conn = connect_wal(self.db_path)
+        try:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, phash INTEGER NOT NULL, '
+                'value TEXT NOT NULL, created_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_entries_created ON entries(created_at)')
+        finally:
+            conn.close()
+
+    def _sync(self, now: float):
+        if time.monotonic() >= self._next_sync:
+            conn = connect_wal(self.db_path)
+            try:
+                self._load_new_rows(conn, now)
+            finally:
+                conn.close()
+            self._next_sync = time.monotonic() + self.sync_interval
+
+        while self._order and (now - self._order[0][2] > self.ttl_seconds or len(self._order) > self.max_entries):
+            entry_id, phash, _ = self._order.popleft()
+            self._index.remove(entry_id, phash)
+
+    def _load_new_rows(self, conn: sqlite3.Connection, now: float):
+        rows = conn.execute('SELECT id, phash, created_at FROM entries WHERE id > ? AND created_at >= ? ORDER BY id',
+                            (self._last_id, now - self.ttl_seconds)).fetchall()
+        for entry_id, phash, created_at in rows:
+            phash = _to_unsigned(phash)
+            self._index.add(entry_id, phash)
+            self._order.append((entry_id, phash, created_at))
+            self._last_id = entry_id
+
+    def get(self, phash: int) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            self._sync(now)
+            with timed('near_duplicate_lookup'):
+                match = self._index.nearest(phash)
+
+        row = None
+        if match is not None:
+            conn = connect_wal(self.db_path)
+            try:
+                row = conn.execute('SELECT value FROM entries WHERE id = ? AND created_at >= ?',
+                                   (match[0], now - self.ttl_seconds)).fetchone()
+            finally:
+                conn.close()
+
+        with self._lock:
+            if row is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        get_metrics().inc('fridge_near_duplicate_total', result='hit' if row is not None else 'miss')
+        if row is None:
+            return None
+        print(f"⚡ Téměř shodná fotka nalezena v cache (vzdálenost {match[1]})")
+        return json.loads(row[0])
+
+    def set(self, phash: int, value: Any):
+        payload = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        conn = connect_wal(self.db_path)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('INSERT INTO entries (phash, value, created_at) VALUES (?, ?, ?)',
+                         (_to_signed(phash), payload, now))
+            conn.execute('DELETE FROM entries WHERE created_at < ?', (now - self.ttl_seconds,))
+            conn.execute('DELETE FROM entries WHERE id <= (SELECT MAX(id) FROM entries) - ?', (self.max_entries,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+        # Vlastní zápis musí být vidět hned při dalším vyhledání v tomto workeru
+        self._next_sync = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        conn = connect_wal(self.db_path)
+        try:
+            entries = conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        finally:
+            conn.close()
+
+        # Souhrn za všechny workery z metrik, vlastní čítače jen za tento worker
+        results = {'hit': 0, 'miss': 0}
+        for (name, labels), value in get_metrics().collect()['counters'].items():
+            result = dict(labels).get('result')
+            if name == 'fridge_near_duplicate_total' and result in results:
+                results[result] += int(value)
+        lookups = results['hit'] + results['miss']
+        with self._lock:
+            worker = {'worker_pid': os.getpid(), 'hits': self.hits, 'misses': self.misses,
+                      'indexed': len(self._index)}
+        return {
+            'hits': results['hit'],
+            'misses': results['miss'],
+            'reuse_rate': round(results['hit'] / lookups, 4) if lookups else 0.0,
+            'entries': entries,
+            'worker': worker,
+            'max_distance': self.max_distance,
+            'ttl_seconds': self.ttl_seconds,
+            'sync_interval': self.sync_interval
+        }
+
+
+def _create_near_duplicate_cache() -> Optional[NearDuplicateCache]:
+    return None if env_disabled('NEAR_DUPLICATE_CACHE_ENABLED') else NearDuplicateCache()
+
+
+process_registry().register('near_duplicate_cache', _create_near_duplicate_cache)
+
+
+def get_near_duplicate_cache() -> Optional[NearDuplicateCache]:
+    return process_registry().get('near_duplicate_cache')
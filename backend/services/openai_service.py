@@ -1,16 +1,57 @@
 import os
+import re
 import base64
 import json
-import requests
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable
 from dotenv import load_dotenv
+from utils.ingredient_lexicon import ingredient_category, recipe_tags, detect_appliances, find_ingredients
+from utils.metrics import get_metrics
+from services.http_client import get_http_client
+from services.image_preprocessor import prepare_image_for_vision
+from services.prompt_builder import RecipePromptBuilder
+from services.json_stream import salvage_json_array
 
 load_dotenv('config.env')
 
+_CODE_FENCE_RE = re.compile(r'^```(?:json)?\s*|\s*```$', re.IGNORECASE)
+
 class OpenAIService:
+    # Statický prefix promptu pro recepty; suroviny, čas a omezení se připojí až na konec
+    RECIPE_INSTRUCTIONS = """
+        Jsi expertní kuchař specializující se na rychlé a zdravé recepty.
+        Vytvoř rychlé a zdravé recepty na základě ingrediencí z ledničky uvedených v požadavku.
+        
+        DŮLEŽITÉ: Počítej s tím, že doma máš k dispozici tyto běžné suroviny:
+        Základní suroviny: těstoviny, rýže, brambory, mouka, cukr, med, olej, ocet, sojová omáčka, solamyl
+        Zelenina a houby: šalotka, houby (čerstvé i sušené)
+        Pesta a omáčky: bazalkové pesto, rajčatové pesto
+        Mražené potraviny: mražená zelenina, mražené krevety
+        Koření a bylinky: sůl, pepř, paprika, oregano, grilovací koření, chilli, česnek, cibule, bazalka, petržel, tymián, rozmarýn
+        
+        Požadavky:
+        - Maximální čas přípravy uvádí požadavek
+        - Žádné smažení, preferuj vaření, pečení, grilování, dušení
+        - Zdravé recepty s minimem oleje a soli
+        - Používej kombinaci ingrediencí z ledničky + běžných surovin doma
+        - Respektuj dostupné spotřebiče: elektrický sporák, trouba, mikrovlnná trouba, horkovzdušná parní fritéza, mixér, tyčový mixér, elektrický kontaktní gril, toastovač
+        - Respektuj dietní omezení z požadavku, pokud jsou uvedena
+        
+        Pro každý recept uveď: Název, čas přípravy, počet porcí, seznam ingrediencí s množstvím, postup, nutriční informace a tipy.
+        Vrať výsledek jako JSON objekt s jedním klíčem "recipes", který obsahuje pole objektů.
+        Každý objekt v poli musí mít klíče: name, prep_time, servings, ingredients, instructions, nutrition_info, cooking_tips.
+        Každý recept musí mít klíč "prep_time" s celým číslem v minutách (např. 10, 15, 20).
+        Vrať pouze validní JSON bez jakéhokoliv dalšího textu, komentářů nebo vysvětlení.
+        """
+    RECIPE_ASSUMED_INGREDIENTS = ['těstoviny', 'rýže', 'brambory', 'mouka', 'cukr', 'med', 'olej', 'ocet',
+                                  'sojová omáčka', 'solamyl', 'šalotka', 'houby', 'bazalkové pesto',
+                                  'rajčatové pesto', 'mražená zelenina', 'mražené krevety', 'sůl', 'pepř',
+                                  'paprika', 'oregano', 'grilovací koření', 'chilli', 'česnek', 'cibule',
+                                  'bazalka', 'petržel', 'tymián', 'rozmarýn']
+
     def __init__(self):
         self.api_key = os.getenv('OPENAI_API_KEY')
-        self.base_url = "https://api.openai.com/v1"
+        self.base_url = os.getenv('OPENAI_BASE_URL', "https://api.openai.com/v1")
+        self.recipe_prompt_builder = RecipePromptBuilder(self.RECIPE_INSTRUCTIONS, self.RECIPE_ASSUMED_INGREDIENTS)
         
         if not self.api_key:
             raise ValueError("OPENAI_API_KEY není nastaven v .env souboru")
@@ -18,7 +59,8 @@ class OpenAIService:
     def analyze_fridge_image(self, image_path: str) -> List[Dict[str, Any]]:
         try:
             with open(image_path, "rb") as image_file:
-                encoded_image = base64.b64encode(image_file.read()).decode('utf-8')
+                image_data, mime_type = prepare_image_for_vision(image_file.read())
+            encoded_image = base64.b64encode(image_data).decode('utf-8')
             
             prompt = """
             Analyzuj obsah ledničky na fotografii a identifikuj všechny dostupné ingredience.
@@ -33,7 +75,7 @@ class OpenAIService:
             Vrať pouze validní JSON bez jakéhokoliv dalšího textu, komentářů nebo vysvětlení.
             """
             
-            response_str = self._call_vision_api(encoded_image, prompt)
+            response_str = self._call_vision_api(encoded_image, prompt, mime_type)
             return self._parse_ingredients_response(response_str)
             
         except Exception as e:
@@ -51,12 +93,12 @@ class OpenAIService:
                 elif isinstance(ing, str):
                     ingredients_list.append(ing)
             
-            ingredients_text = ", ".join(filter(None, ingredients_list))
-            if not ingredients_text:
+            ingredients_list = list(filter(None, ingredients_list))
+            if not ingredients_list:
                 print("Seznam ingrediencí pro generování je prázdný.")
                 return []
 
-            prompt = self._create_recipe_prompt(ingredients_text, max_time, dietary_restrictions)
+            prompt = self._create_recipe_prompt(ingredients_list, max_time, dietary_restrictions)
             response_str = self._call_gpt_api(prompt)
             return self._parse_recipes_response(response_str)
             
@@ -74,7 +116,7 @@ class OpenAIService:
             "Authorization": f"Bearer {self.api_key}"
         }
         
-        response = requests.post(f"{self.base_url}/chat/completions", headers=headers, json=data)
+        response = get_http_client().post(f"{self.base_url}/chat/completions", headers=headers, json=data)
         
         if response.status_code != 200:
             raise Exception(f"OpenAI API error: {response.status_code} - {response.text}")
@@ -86,7 +128,7 @@ class OpenAIService:
 
         return content if content is not None else ""
 
-    def _call_vision_api(self, encoded_image: str, prompt: str) -> str:
+    def _call_vision_api(self, encoded_image: str, prompt: str, mime_type: str = "image/jpeg") -> str:
         data = {
             "model": "gpt-4o",
             "messages": [
@@ -96,7 +138,7 @@ class OpenAIService:
                         {"type": "text", "text": prompt},
                         {
                             "type": "image_url",
-                            "image_url": {"url": f"data:image/jpeg;base64,{encoded_image}"}
+                            "image_url": {"url": f"data:{mime_type};base64,{encoded_image}"}
                         }
                     ]
                 }
@@ -106,64 +148,35 @@ class OpenAIService:
         }
         return self._call_api(data)
 
-    def _call_gpt_api(self, prompt: str) -> str:
+    def _call_gpt_api(self, prompt: Dict[str, Any]) -> str:
         data = {
             "model": "gpt-4o",
-            "messages": [
-                {
-                    "role": "system",
-                    "content": "Jsi expertní kuchař specializující se na rychlé a zdravé recepty."
-                },
-                {"role": "user", "content": prompt}
-            ],
-            "max_tokens": 2000,
+            "messages": prompt['messages'],
+            "max_tokens": prompt['max_tokens'],
             "temperature": 0.7,
             "response_format": {"type": "json_object"}
         }
         return self._call_api(data)
 
-    def _create_recipe_prompt(self, ingredients_text: str, max_time: int, 
-                              dietary_restrictions: List[str]) -> str:
-        restrictions_text = ""
-        if dietary_restrictions:
-            restrictions_text = f"\nDietní omezení: {', '.join(dietary_restrictions)}"
-        
-        return f"""
-        Vytvoř 3-5 rychlých a zdravých receptů na základě těchto ingrediencí z ledničky: {ingredients_text}
-        
-        DŮLEŽITÉ: Počítej s tím, že doma máš k dispozici tyto běžné suroviny:
-        Základní suroviny: těstoviny, rýže, brambory, mouka, cukr, med, olej, ocet, sojová omáčka, solamyl
-        Zelenina a houby: šalotka, houby (čerstvé i sušené)
-        Pesta a omáčky: bazalkové pesto, rajčatové pesto
-        Mražené potraviny: mražená zelenina, mražené krevety
-        Koření a bylinky: sůl, pepř, paprika, oregano, grilovací koření, chilli, česnek, cibule, bazalka, petržel, tymián, rozmarýn
-        
-        Požadavky:
-        - Maximální čas přípravy: {max_time} minut
-        - Žádné smažení, preferuj vaření, pečení, grilování, dušení
-        - Zdravé recepty s minimem oleje a soli
-        - Používej kombinaci ingrediencí z ledničky + běžných surovin doma
-        - Respektuj dostupné spotřebiče: elektrický sporák, trouba, mikrovlnná trouba, horkovzdušná parní fritéza, mixér, tyčový mixér, elektrický kontaktní gril, toastovač
-        {restrictions_text}
-        
-        Pro každý recept uveď: Název, čas přípravy, počet porcí, seznam ingrediencí s množstvím, postup, nutriční informace a tipy.
-        Vrať výsledek jako JSON objekt s jedním klíčem "recipes", který obsahuje pole objektů.
-        Každý objekt v poli musí mít klíče: name, prep_time, servings, ingredients, instructions, nutrition_info, cooking_tips.
-        Každý recept musí mít klíč "prep_time" s celým číslem v minutách (např. 10, 15, 20).
-        Vrať pouze validní JSON bez jakéhokoliv dalšího textu, komentářů nebo vysvětlení.
-        """
+    def _create_recipe_prompt(self, ingredient_names: List[str], max_time: int, 
+                              dietary_restrictions: List[str]) -> Dict[str, Any]:
+        return self.recipe_prompt_builder.build(ingredient_names, max_time, dietary_restrictions)
 
     def _parse_json_response(self, response_str: str) -> Any:
         if not response_str:
             return None
-        cleaned_response = response_str.strip()
-        if cleaned_response.startswith('```json'):
-            cleaned_response = cleaned_response[7:-3].strip()
-        
+        cleaned_response = _CODE_FENCE_RE.sub('', response_str.strip())
         if not cleaned_response:
             return None
-            
-        return json.loads(cleaned_response)
+
+        try:
+            return json.loads(cleaned_response)
+        except json.JSONDecodeError:
+            # Text před nebo za objektem ("Tady jsou recepty: {...}")
+            start, end = cleaned_response.find('{'), cleaned_response.rfind('}')
+            if start < 0 or end <= start or (start == 0 and end == len(cleaned_response) - 1):
+                raise
+            return json.loads(cleaned_response[start:end + 1])
 
     def _parse_ingredients_response(self, response_str: str) -> List[Dict[str, Any]]:
         try:
@@ -171,18 +184,7 @@ class OpenAIService:
             if not parsed_json:
                 return []
                 
-            ingredients = parsed_json.get('ingredients', [])
-            
-            valid_ingredients = []
-            for ingredient in ingredients:
-                if isinstance(ingredient, dict) and 'name' in ingredient:
-                    valid_ingredients.append({
-                        'name': ingredient.get('name', 'Neznámá ingredience'),
-                        'category': ingredient.get('category', 'ostatní'),
-                        'quantity': ingredient.get('quantity', 'dostupné'),
-                        'freshness': ingredient.get('freshness', 'čerstvé')
-                    })
-            return valid_ingredients
+            return self._normalize_ingredients(parsed_json.get('ingredients', []))
         except (json.JSONDecodeError, AttributeError) as e:
             print(f"Chyba při parsování ingrediencí: {e}")
             print(f"Odpověď od OpenAI byla: {response_str}")
@@ -194,83 +196,90 @@ class OpenAIService:
             if not parsed_json:
                 return self._create_fallback_recipes()
                 
-            recipes_from_api = parsed_json.get('recipes', [])
+            return self._normalize_recipes(parsed_json.get('recipes', []))
             
-            valid_recipes = []
-            for recipe in recipes_from_api:
-                if not isinstance(recipe, dict):
-                    print(f"Špatný typ receptu z OpenAI: {recipe} ({type(recipe)})")
-                    continue
-
-                try:
-                    prep_time = int(recipe.get('prep_time', 0))
-                    if prep_time == 0:
-                        prep_time = 15  # výchozí hodnota, pokud model nevrátí čas
-                except (ValueError, TypeError):
-                    prep_time = 15
-                new_recipe = {
-                    'name': recipe.get('name', 'Recept bez názvu'),
-                    'prep_time': prep_time,
-                    'servings': recipe.get('servings', 1),
-                    'ingredients': recipe.get('ingredients', []),
-                    'instructions': recipe.get('instructions', []),
-                    'nutrition_info': recipe.get('nutrition_info', {}),
-                    'cooking_tips': recipe.get('cooking_tips', [])
-                }
-                
-                new_recipe['tags'] = self._generate_recipe_tags(new_recipe)
-                new_recipe['appliances'] = self._detect_appliances(new_recipe)
-                
-                valid_recipes.append(new_recipe)
-                
+        except json.JSONDecodeError as e:
+            # Useknutá (max_tokens) nebo zašuměná odpověď - zachráníme kompletní recepty
+            print(f"Chyba při parsování receptů: {e}")
+            recipes, dropped = salvage_json_array(response_str, 'recipes')
+            self._report_dropped('recipes', dropped)
+            valid_recipes = self._normalize_recipes(recipes)
+            if not valid_recipes:
+                print(f"Odpověď od OpenAI byla: {response_str}")
+                return self._create_fallback_recipes()
+            print(f"Zachráněno {len(valid_recipes)} receptů z nevalidní odpovědi")
+            for recipe in valid_recipes:
+                recipe['partial'] = True
             return valid_recipes
-            
-        except (json.JSONDecodeError, AttributeError, KeyError) as e:
+        except (AttributeError, KeyError) as e:
             print(f"Chyba při parsování receptů: {e}")
             print(f"Odpověď od OpenAI byla: {response_str}")
             return self._create_fallback_recipes()
 
+    def _normalize_recipes(self, recipes: Iterable[Any]) -> List[Dict[str, Any]]:
+        valid_recipes = []
+        for recipe in recipes:
+            if not isinstance(recipe, dict):
+                print(f"Špatný typ receptu z OpenAI: {recipe} ({type(recipe)})")
+                continue
+
+            try:
+                prep_time = int(recipe.get('prep_time', 0))
+                if prep_time == 0:
+                    prep_time = 15  # výchozí hodnota, pokud model nevrátí čas
+            except (ValueError, TypeError):
+                prep_time = 15
+            new_recipe = {
+                'name': recipe.get('name', 'Recept bez názvu'),
+                'prep_time': prep_time,
+                'servings': recipe.get('servings', 1),
+                'ingredients': recipe.get('ingredients', []),
+                'instructions': recipe.get('instructions', []),
+                'nutrition_info': recipe.get('nutrition_info', {}),
+                'cooking_tips': recipe.get('cooking_tips', [])
+            }
+            
+            new_recipe['tags'] = recipe_tags(new_recipe)
+            new_recipe['appliances'] = detect_appliances(new_recipe)
+            
+            valid_recipes.append(new_recipe)
+        return valid_recipes
+
+    def _normalize_ingredients(self, ingredients: Iterable[Any]) -> List[Dict[str, Any]]:
+        valid_ingredients = []
+        for ingredient in ingredients:
+            if isinstance(ingredient, dict) and 'name' in ingredient:
+                valid_ingredients.append({
+                    'name': ingredient.get('name', 'Neznámá ingredience'),
+                    'category': ingredient.get('category') or ingredient_category(str(ingredient['name'])),
+                    'quantity': ingredient.get('quantity', 'dostupné'),
+                    'freshness': ingredient.get('freshness', 'čerstvé')
+                })
+        return valid_ingredients
+
     def _fallback_ingredients_parsing(self, response_str: str) -> List[Dict[str, Any]]:
         print("Používám záložní parsování ingrediencí.")
-        ingredients = []
-        # ... (zbytek logiky můžeš doplnit) ...
-        return ingredients
+        if not response_str:
+            return []
 
-    def _generate_recipe_tags(self, recipe: Dict) -> List[str]:
-        tags = []
-        try:
-            prep_time = int(recipe.get('prep_time', 99))
-        except (ValueError, TypeError):
-            prep_time = 99
-        if prep_time <= 20:
-            tags.append('rychlé')
-        
-        ingredients_str = ' '.join(str(i) for i in recipe.get('ingredients', [])).lower()
-        if 'kuřecí' in ingredients_str or 'kuře' in ingredients_str:
-            tags.append('kuřecí')
-        if 'ryba' in ingredients_str or 'losos' in ingredients_str or 'tuňák' in ingredients_str:
-            tags.append('rybí')
-        if any(veg in ingredients_str for veg in ['zelenina', 'mrkev', 'cibule', 'špenát', 'brokolice']):
-             tags.append('zeleninové')
-        if not any(maso in ingredients_str for maso in ['kuřecí', 'ryba', 'vepřové', 'hovězí']):
-            tags.append('vegetariánské')
-        tags.append('zdravé')
-        return list(set(tags))
+        # Kompletní objekty z useknuté nebo zašuměné odpovědi
+        ingredients, dropped = salvage_json_array(response_str, 'ingredients')
+        self._report_dropped('ingredients', dropped)
+        valid_ingredients = self._normalize_ingredients(ingredients)
+        if valid_ingredients:
+            print(f"Zachráněno {len(valid_ingredients)} ingrediencí z nevalidní odpovědi")
+        else:
+            # Poslední možnost - známé ingredience zmíněné kdekoliv v textu
+            valid_ingredients = self._normalize_ingredients({'name': name} for name in find_ingredients(response_str))
+        for ingredient in valid_ingredients:
+            ingredient['partial'] = True
+        return valid_ingredients
 
-    def _detect_appliances(self, recipe: Dict) -> List[str]:
-        appliances = ['elektrický sporák']
-        instructions = ' '.join(recipe.get('instructions', [])).lower()
-        
-        if any(word in instructions for word in ['trouba', 'pečeme', 'pečení']):
-            appliances.append('trouba')
-        if any(word in instructions for word in ['mikrovln', 'mikrovlnná']):
-            appliances.append('mikrovlnná trouba')
-        if any(word in instructions for word in ['mixér', 'mixujeme']):
-            appliances.append('mixér')
-        if any(word in instructions for word in ['gril', 'grilování']):
-            appliances.append('elektrický kontaktní gril')
-        
-        return list(set(appliances))
+    def _report_dropped(self, key: str, dropped: List[Dict[str, Any]]):
+        metrics = get_metrics()
+        for item in dropped:
+            print(f"Zahozena část pole '{key}' ({item['reason']}, pozice {item['offset']}): {item['preview']!r}")
+            metrics.inc('fridge_json_dropped_total', key=key, reason=item['reason'])
 
     def _create_fallback_recipes(self) -> List[Dict[str, Any]]:
         print("Vracím záložní recepty.")
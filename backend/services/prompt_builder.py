@@ -0,0 +1,126 @@
+import os
+import re
+import textwrap
+from typing import Any, Dict, Iterable, List
+from utils.ingredient_lexicon import canonical_ingredient_name
+from utils.text_utils import fold_text
+from utils.metrics import get_metrics, TOKEN_BUCKETS
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+_TOKEN_PIECE_RE = re.compile(r'\w+|[^\w\s]')
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Počet tokenů textu. S nainstalovaným tiktoken přesně (o200k_base jako gpt-4o),
+    jinak odhad: ~4 znaky na token u ASCII slov, ~3 u slov s diakritikou, interpunkce po jednom.
+    """
+    global _encoding
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding('o200k_base')
+        return len(_encoding.encode(text))
+
+    tokens = 0
+    for piece in _TOKEN_PIECE_RE.findall(text):
+        chars_per_token = 4 if piece.isascii() else 3
+        tokens += max(1, -(-len(piece) // chars_per_token))
+    return tokens
+
+
+class RecipePromptBuilder:
+    """
+    Skládá zprávy pro generování receptů. Statické instrukce jsou v system zprávě,
+    která je pro všechny požadavky stejná (prefix použitelný pro prompt caching
+    OpenAI), data požadavku jsou až v user zprávě na konci. Seznam ingrediencí se
+    zkrátí na rozpočet tokenů a max_tokens se odvodí z počtu receptů.
+    """
+    # Režie chat formátu na zprávu (role, oddělovače)
+    MESSAGE_OVERHEAD_TOKENS = 4
+
+    def __init__(self, instructions: str, assumed_ingredients: Iterable[str] = (),
+                 ingredient_budget: int = None, recipe_count: int = None,
+                 tokens_per_recipe: int = None, max_completion_tokens: int = None):
+        self.system_message = textwrap.dedent(instructions).strip()
+        self.ingredient_budget = ingredient_budget if ingredient_budget is not None else int(os.getenv('PROMPT_INGREDIENT_TOKEN_BUDGET', 200))
+        self.recipe_count = recipe_count if recipe_count is not None else int(os.getenv('RECIPE_COUNT', 5))
+        self.tokens_per_recipe = tokens_per_recipe if tokens_per_recipe is not None else int(os.getenv('PROMPT_TOKENS_PER_RECIPE', 400))
+        self.max_completion_tokens = max_completion_tokens if max_completion_tokens is not None else int(os.getenv('PROMPT_MAX_COMPLETION_TOKENS', 4000))
+        # Suroviny, se kterými instrukce počítají vždy - v seznamu z ledničky je neopakujeme
+        self._assumed_keys = {self._ingredient_key(name) for name in assumed_ingredients}
+        self.prefix_tokens = count_tokens(self.system_message) + self.MESSAGE_OVERHEAD_TOKENS
+
+    @staticmethod
+    def _ingredient_key(name: str) -> str:
+        return canonical_ingredient_name(name) or fold_text(name)
+
+    def compact_ingredients(self, ingredient_names: List[str]) -> Dict[str, List[str]]:
+        """
+        Odstraní duplicity ('vejce' a 'vajíčka') a suroviny, které instrukce předpokládají,
+        a zbytek ořízne na rozpočet tokenů. Pořadí se zachová - analýza řadí
+        výraznější ingredience dopředu, oříznou se tedy ty od konce.
+        """
+        kept, dropped, assumed = [], [], []
+        seen = set()
+        used_tokens = 0
+        for name in ingredient_names:
+            name = str(name).strip()
+            key = self._ingredient_key(name)
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            if key in self._assumed_keys:
+                assumed.append(name)
+                continue
+            # +1 za oddělující čárku
+            name_tokens = count_tokens(name) + 1
+            if used_tokens + name_tokens > self.ingredient_budget:
+                dropped.append(name)
+                continue
+            kept.append(name)
+            used_tokens += name_tokens
+        # Lednička jen se základními surovinami - necháme je v seznamu, ať má model z čeho vařit
+        return {'kept': kept or assumed, 'dropped': dropped}
+
+    def max_tokens_for(self, recipe_count: int) -> int:
+        # Rezerva na obal JSON objektu
+        return min(self.max_completion_tokens, recipe_count * self.tokens_per_recipe + 100)
+
+    def build(self, ingredient_names: List[str], max_time: int, dietary_restrictions: List[str] = None,
+              recipe_count: int = None) -> Dict[str, Any]:
+        """
+        Vrací {'messages', 'max_tokens', 'prompt_tokens', 'dropped_ingredients'}.
+        """
+        recipe_count = recipe_count or self.recipe_count
+        ingredients = self.compact_ingredients(ingredient_names)
+
+        request_lines = [
+            f"Suroviny z ledničky: {', '.join(ingredients['kept'])}",
+            f"Maximální doba přípravy: {max_time} minut",
+            f"Počet receptů: nejvýše {recipe_count}"
+        ]
+        if dietary_restrictions:
+            request_lines.append(f"Dietní omezení: {', '.join(dietary_restrictions)}")
+        user_message = '\n'.join(request_lines)
+
+        prompt_tokens = self.prefix_tokens + count_tokens(user_message) + self.MESSAGE_OVERHEAD_TOKENS
+        metrics = get_metrics()
+        metrics.observe('fridge_prompt_tokens', prompt_tokens, TOKEN_BUCKETS, prompt='recipes')
+        if ingredients['dropped']:
+            print(f"✂️ Seznam ingrediencí zkrácen na rozpočet, vynechány: {', '.join(ingredients['dropped'])}")
+            metrics.inc('fridge_prompt_dropped_ingredients_total', len(ingredients['dropped']))
+
+        return {
+            'messages': [
+                {"role": "system", "content": self.system_message},
+                {"role": "user", "content": user_message}
+            ],
+            'max_tokens': self.max_tokens_for(recipe_count),
+            'prompt_tokens': prompt_tokens,
+            'dropped_ingredients': ingredients['dropped']
+        }
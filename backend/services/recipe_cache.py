@@ -0,0 +1,77 @@
+import os
+import copy
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from utils.text_utils import canonical_name_set
+from utils.process_utils import env_disabled, process_registry
+
+
+class RecipeCache:
+    """
+    In-memory LRU cache vygenerovaných receptů s expirací (TTL), sdílený vlákny workeru.
+    """
+    def __init__(self, max_entries: int = None, ttl_seconds: int = None):
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv('RECIPE_CACHE_SIZE', 256))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(os.getenv('RECIPE_CACHE_TTL', 1800))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(ingredient_names: List[str], max_time: Any, dietary_restrictions: List[str] = None) -> str:
+        return json.dumps({
+            'ingredients': canonical_name_set(ingredient_names),
+            'max_time': str(max_time),
+            'dietary_restrictions': canonical_name_set(dietary_restrictions or [])
+        }, sort_keys=True, ensure_ascii=False)
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            recipes = entry[1]
+        return copy.deepcopy(recipes)
+
+    def set(self, key: str, recipes: List[Dict[str, Any]]):
+        value = copy.deepcopy(recipes)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds
+            }
+
+
+def _create_recipe_cache() -> Optional[RecipeCache]:
+    return None if env_disabled('RECIPE_CACHE_ENABLED') else RecipeCache()
+
+
+process_registry().register('recipe_cache', _create_recipe_cache)
+
+
+def get_recipe_cache() -> Optional[RecipeCache]:
+    return process_registry().get('recipe_cache')
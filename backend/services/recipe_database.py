@@ -1,234 +1,250 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Set, Tuple
+from array import array
+from bisect import bisect_left
 import json
 import os
+import sys
+import threading
+from utils.text_utils import fold_text
+from utils.ingredient_lexicon import canonical_ingredient_name
+
+# Pozice ingredience v receptu se kóduje do dolních bitů postingu
+_INGREDIENT_BITS = 6
+_INGREDIENT_MASK = (1 << _INGREDIENT_BITS) - 1
+
+DEFAULT_CATALOGUE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'recipes.jsonl')
+
+class RecipeRecord:
+    """
+    Kompaktní záznam receptu držený v paměti. Postup, nutriční hodnoty apod. se
+    načítají z katalogu až v get_recipe_by_id podle offsetu řádku.
+    """
+    __slots__ = ('id', 'name', 'prep_time', 'servings', 'difficulty', 'tags',
+                 'ingredient_names', 'calories', 'offset')
+    
+    def __init__(self, data: Dict[str, Any], offset: int):
+        self.id = str(data['id'])
+        self.name = data['name']
+        self.prep_time = int(data.get('prep_time', 0))
+        self.servings = int(data.get('servings', 1))
+        self.difficulty = sys.intern(data.get('difficulty', 'snadné'))
+        self.tags = tuple(sys.intern(tag) for tag in data.get('tags', []))
+        self.ingredient_names = tuple(sys.intern(ing['name']) for ing in data.get('ingredients', []))
+        self.calories = data.get('calories')
+        self.offset = offset
+    
+    def to_summary(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'name': self.name,
+            'prep_time': self.prep_time,
+            'servings': self.servings,
+            'difficulty': self.difficulty,
+            'tags': list(self.tags),
+            'calories': self.calories
+        }
+
+class CatalogueSnapshot:
+    """
+    Načtený katalog a jeho index. Po sestavení se už nemění; RecipeDatabase při
+    výměně katalogu postaví nový snímek a vymění jedinou referenci, takže dotaz,
+    který si snímek přečte jednou, nikdy nesmíchá starý index s novými recepty.
+    """
+    __slots__ = ('signature', 'recipes', 'by_id', 'prep_times', 'ingredient_counts',
+                 'token_index', 'sorted_tokens', 'categories')
+
+    def __init__(self, signature: Optional[Tuple[int, int, int]], recipes: List[RecipeRecord]):
+        """
+        Invertovaný index: token názvu ingredience -> postingy (pozice receptu, pozice ingredience),
+        plus id -> pozice receptu a pole časů přípravy.
+        """
+        token_index = {}
+        name_tokens = {}
+        by_id = {}
+        prep_times = array('H')
+        ingredient_counts = array('B')
+        categories = set()
+
+        for position, recipe in enumerate(recipes):
+            by_id[recipe.id] = position
+            prep_times.append(min(recipe.prep_time, 0xFFFF))
+            ingredient_names = recipe.ingredient_names[:_INGREDIENT_MASK + 1]
+            ingredient_counts.append(len(ingredient_names))
+            categories.update(recipe.tags)
+
+            for ingredient_position, name in enumerate(ingredient_names):
+                posting = (position << _INGREDIENT_BITS) | ingredient_position
+                if name not in name_tokens:
+                    name_tokens[name] = RecipeDatabase._ingredient_tokens(name)
+                for token in name_tokens[name]:
+                    token_index.setdefault(token, array('I')).append(posting)
+
+        self.signature = signature
+        self.recipes = tuple(recipes)
+        self.by_id = by_id
+        self.prep_times = prep_times
+        self.ingredient_counts = ingredient_counts
+        self.token_index = token_index
+        self.sorted_tokens = sorted(token_index)
+        self.categories = tuple(categories)
 
 class RecipeDatabase:
-    def __init__(self):
-        self.recipes = self._load_recipes()
+    def __init__(self, catalogue_path: str = None):
+        self.catalogue_path = catalogue_path or os.getenv('RECIPE_CATALOGUE_PATH', DEFAULT_CATALOGUE_PATH)
+        self._reload_lock = threading.Lock()
+        signature = self._current_signature()
+        self._snapshot = CatalogueSnapshot(signature, self._load_recipes())
+
+    @property
+    def recipes(self) -> Tuple[RecipeRecord, ...]:
+        return self._snapshot.recipes
     
-    def _load_recipes(self) -> List[Dict[str, Any]]:
-        recipes = [
-            {
-                'id': '1',
-                'name': 'Kuřecí prsa s dušenou zeleninou',
-                'prep_time': 15,
-                'servings': 2,
-                'difficulty': 'snadné',
-                'tags': ['maso', 'zelenina', 'zdravé', 'rychlé'],
-                'ingredients': [
-                    {'name': 'kuřecí prsa', 'amount': '200g', 'unit': 'g'},
-                    {'name': 'mrkev', 'amount': '2', 'unit': 'ks'},
-                    {'name': 'cibule', 'amount': '1', 'unit': 'ks'},
-                    {'name': 'paprika', 'amount': '1', 'unit': 'ks'},
-                    {'name': 'česnek', 'amount': '2', 'unit': 'stroužky'},
-                    {'name': 'olivový olej', 'amount': '1', 'unit': 'lžíce'},
-                    {'name': 'sůl', 'amount': '1', 'unit': 'špetka'},
-                    {'name': 'pepř', 'amount': '1', 'unit': 'špetka'}
-                ],
-                'instructions': [
-                    'Kuřecí prsa nakrájejte na kousky',
-                    'Zeleninu nakrájejte na kousky',
-                    'Na pánvi rozehřejte olej',
-                    'Opečte kuřecí maso 5 minut',
-                    'Přidejte zeleninu a duste 8 minut',
-                    'Okořeňte solí a pepřem'
-                ],
-                'appliances': ['elektrický sporák'],
-                'calories': 280,
-                'protein': '35g',
-                'carbs': '15g',
-                'fat': '8g',
-                'fiber': '6g',
-                'health_rating': 'výborné'
-            },
-            {
-                'id': '2',
-                'name': 'Salát s tuňákem a avokádem',
-                'prep_time': 10,
-                'servings': 2,
-                'difficulty': 'snadné',
-                'tags': ['ryby', 'zelenina', 'zdravé', 'rychlé'],
-                'ingredients': [
-                    {'name': 'salát', 'amount': '1', 'unit': 'hlávka'},
-                    {'name': 'rajčata', 'amount': '2', 'unit': 'ks'},
-                    {'name': 'okurka', 'amount': '1', 'unit': 'ks'},
-                    {'name': 'tuňák', 'amount': '1', 'unit': 'konzerva'},
-                    {'name': 'avokádový olej', 'amount': '1', 'unit': 'lžíce'},
-                    {'name': 'citron', 'amount': '1/2', 'unit': 'ks'},
-                    {'name': 'sůl', 'amount': '1', 'unit': 'špetka'}
-                ],
-                'instructions': [
-                    'Salát nakrájejte na kousky',
-                    'Rajčata a okurku nakrájejte',
-                    'Smíchejte zeleninu v míse',
-                    'Přidejte tuňáka',
-                    'Zakápněte olejem a citronem',
-                    'Okořeňte solí'
-                ],
-                'appliances': [],
-                'calories': 220,
-                'protein': '25g',
-                'carbs': '8g',
-                'fat': '12g',
-                'fiber': '4g',
-                'health_rating': 'výborné'
-            },
-            {
-                'id': '3',
-                'name': 'Omeleta se špenátem a sýrem',
-                'prep_time': 12,
-                'servings': 1,
-                'difficulty': 'snadné',
-                'tags': ['vejce', 'zelenina', 'mléčné', 'zdravé'],
-                'ingredients': [
-                    {'name': 'vajíčka', 'amount': '3', 'unit': 'ks'},
-                    {'name': 'špenát', 'amount': '50g', 'unit': 'g'},
-                    {'name': 'sýr', 'amount': '30g', 'unit': 'g'},
-                    {'name': 'mléko', 'amount': '2', 'unit': 'lžíce'},
-                    {'name': 'sůl', 'amount': '1', 'unit': 'špetka'},
-                    {'name': 'pepř', 'amount': '1', 'unit': 'špetka'}
-                ],
-                'instructions': [
-                    'Vajíčka rozklepněte do mísy',
-                    'Přidejte mléko a rozšlehejte',
-                    'Na pánvi opečte špenát',
-                    'Přilijte vajíčka',
-                    'Posypte sýrem',
-                    'Složte a nechte dopéct'
-                ],
-                'appliances': ['elektrický sporák'],
-                'calories': 320,
-                'protein': '28g',
-                'carbs': '4g',
-                'fat': '22g',
-                'fiber': '2g',
-                'health_rating': 'výborné'
-            },
-            {
-                'id': '4',
-                'name': 'Rychlá zeleninová polévka',
-                'prep_time': 18,
-                'servings': 4,
-                'difficulty': 'snadné',
-                'tags': ['zelenina', 'vegetariánské', 'zdravé'],
-                'ingredients': [
-                    {'name': 'cibule', 'amount': '1', 'unit': 'ks'},
-                    {'name': 'mrkev', 'amount': '3', 'unit': 'ks'},
-                    {'name': 'celer', 'amount': '1', 'unit': 'ks'},
-                    {'name': 'brambory', 'amount': '2', 'unit': 'ks'},
-                    {'name': 'česnek', 'amount': '2', 'unit': 'stroužky'},
-                    {'name': 'zeleninový vývar', 'amount': '1', 'unit': 'litr'},
-                    {'name': 'sůl', 'amount': '1', 'unit': 'špetka'},
-                    {'name': 'pepř', 'amount': '1', 'unit': 'špetka'}
-                ],
-                'instructions': [
-                    'Cibuli nakrájejte na kostičky',
-                    'Zeleninu nakrájejte na kousky',
-                    'Na pánvi opečte cibuli',
-                    'Přidejte zeleninu a duste 5 minut',
-                    'Přilijte vývar a vařte 10 minut',
-                    'Okořeňte solí a pepřem'
-                ],
-                'appliances': ['elektrický sporák'],
-                'calories': 120,
-                'protein': '4g',
-                'carbs': '22g',
-                'fat': '2g',
-                'fiber': '6g',
-                'health_rating': 'výborné'
-            },
-            {
-                'id': '5',
-                'name': 'Grilovaný losos s citronem',
-                'prep_time': 15,
-                'servings': 2,
-                'difficulty': 'střední',
-                'tags': ['ryby', 'zdravé', 'rychlé'],
-                'ingredients': [
-                    {'name': 'losos', 'amount': '300g', 'unit': 'g'},
-                    {'name': 'citron', 'amount': '1', 'unit': 'ks'},
-                    {'name': 'olivový olej', 'amount': '1', 'unit': 'lžíce'},
-                    {'name': 'česnek', 'amount': '2', 'unit': 'stroužky'},
-                    {'name': 'sůl', 'amount': '1', 'unit': 'špetka'},
-                    {'name': 'pepř', 'amount': '1', 'unit': 'špetka'}
-                ],
-                'instructions': [
-                    'Lososa opláchněte a osušte',
-                    'Potřete olejem a kořením',
-                    'Rozpalte gril na střední teplotu',
-                    'Grilujte 6-8 minut z každé strany',
-                    'Servírujte s citronem'
-                ],
-                'appliances': ['elektrický kontaktní gril'],
-                'calories': 280,
-                'protein': '35g',
-                'carbs': '2g',
-                'fat': '15g',
-                'fiber': '0g',
-                'health_rating': 'výborné'
-            },
-            {
-                'id': '6',
-                'name': 'Quinoa s dušenou zeleninou',
-                'prep_time': 20,
-                'servings': 2,
-                'difficulty': 'snadné',
-                'tags': ['vegetariánské', 'zelenina', 'zdravé'],
-                'ingredients': [
-                    {'name': 'quinoa', 'amount': '100g', 'unit': 'g'},
-                    {'name': 'brokolice', 'amount': '1', 'unit': 'ks'},
-                    {'name': 'mrkev', 'amount': '2', 'unit': 'ks'},
-                    {'name': 'cibule', 'amount': '1', 'unit': 'ks'},
-                    {'name': 'olivový olej', 'amount': '1', 'unit': 'lžíce'},
-                    {'name': 'sůl', 'amount': '1', 'unit': 'špetka'}
-                ],
-                'instructions': [
-                    'Quinoa se uvaří podle návodu',
-                    'Zeleninu nakrájejte na kousky',
-                    'Na pánvi opečte cibuli',
-                    'Přidejte zeleninu a duste 8 minut',
-                    'Smíchejte s quinoou',
-                    'Okořeňte solí'
-                ],
-                'appliances': ['elektrický sporák'],
-                'calories': 250,
-                'protein': '8g',
-                'carbs': '45g',
-                'fat': '6g',
-                'fiber': '8g',
-                'health_rating': 'výborné'
-            }
-        ]
+    def _current_signature(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.catalogue_path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+    
+    def _reload_if_changed(self, force: bool = False) -> CatalogueSnapshot:
+        """
+        Offsety v záznamech platí jen pro načtený soubor. Po výměně katalogu
+        (tools/import_recipes.py přes os.replace) se index postaví znovu.
+        Vrací snímek, se kterým má volající pracovat.
+        """
+        signature = self._current_signature()
+        snapshot = self._snapshot
+        if not force and signature == snapshot.signature:
+            return snapshot
+        with self._reload_lock:
+            if self._snapshot is not snapshot:
+                # Jiné vlákno mezitím katalog načetlo
+                return self._snapshot
+            print("Katalog receptů se změnil, načítám ho znovu")
+            signature = self._current_signature()
+            # Jediné přiřazení reference - souběžné dotazy drží buď celý starý, nebo celý nový snímek
+            self._snapshot = CatalogueSnapshot(signature, self._load_recipes())
+            return self._snapshot
+    
+    def _load_recipes(self) -> List[RecipeRecord]:
+        recipes = []
+        if not os.path.exists(self.catalogue_path):
+            print(f"Katalog receptů nebyl nalezen: {self.catalogue_path}")
+            return recipes
+        
+        with open(self.catalogue_path, 'rb') as catalogue:
+            offset = 0
+            for line in catalogue:
+                if line.strip():
+                    try:
+                        recipes.append(RecipeRecord(json.loads(line), offset))
+                    except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+                        print(f"Přeskakuji nevalidní recept v katalogu (offset {offset}): {e}")
+                offset += len(line)
         
         return recipes
     
-    def get_recipes_by_ingredients(self, ingredients: List[str], max_time: int = 20) -> List[Dict]:
-        matching_recipes = []
+    def _read_recipe(self, record: RecipeRecord) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.catalogue_path, 'rb') as catalogue:
+                catalogue.seek(record.offset)
+                recipe = json.loads(catalogue.readline())
+        except (OSError, json.JSONDecodeError):
+            return None
+        # Katalog mohl být vyměněn od načtení - offset pak ukazuje na jiný recept
+        if not isinstance(recipe, dict) or str(recipe.get('id')) != record.id:
+            return None
+        return recipe
+    
+    @staticmethod
+    def _ingredient_tokens(name: str) -> Set[str]:
+        # Indexujeme i kanonický název, aby 'vejce' v katalogu našlo dotaz 'vajíčka' a naopak
+        tokens = set(fold_text(name).split())
+        canonical = canonical_ingredient_name(name)
+        if canonical:
+            tokens.update(fold_text(canonical).split())
+        return tokens
+    
+    @staticmethod
+    def _postings_for_token(snapshot: CatalogueSnapshot, token: str) -> Set[int]:
+        # Prefixové hledání zachovává původní chování ("kuře" najde "kuřecí prsa")
+        postings = set()
+        sorted_tokens = snapshot.sorted_tokens
+        position = bisect_left(sorted_tokens, token)
+        while position < len(sorted_tokens) and sorted_tokens[position].startswith(token):
+            postings.update(snapshot.token_index[sorted_tokens[position]])
+            position += 1
+        return postings
+    
+    def _postings_for_ingredient(self, snapshot: CatalogueSnapshot, ingredient: str) -> Set[int]:
+        postings = self._postings_for_tokens(snapshot, fold_text(ingredient).split())
+        canonical = canonical_ingredient_name(ingredient)
+        if canonical:
+            postings |= self._postings_for_tokens(snapshot, fold_text(canonical).split())
+        return postings
+    
+    def _postings_for_tokens(self, snapshot: CatalogueSnapshot, tokens: List[str]) -> Set[int]:
+        postings = None
+        for token in sorted(set(tokens), key=len, reverse=True):
+            token_postings = self._postings_for_token(snapshot, token)
+            postings = token_postings if postings is None else postings & token_postings
+            if not postings:
+                break
+        return postings or set()
+    
+    def get_recipes_by_ingredients(self, ingredients: List[str], max_time: int = 20, limit: int = None) -> List[Dict]:
+        """
+        Vrací recepty obsahující aspoň jednu z ingrediencí, seřazené podle pokrytí
+        (podíl ingrediencí receptu, které jsou v ledničce).
+        """
+        snapshot = self._reload_if_changed()
+        prep_times = snapshot.prep_times
+        ingredient_counts = snapshot.ingredient_counts
+        covered = {}
+        for ingredient in ingredients:
+            for posting in self._postings_for_ingredient(snapshot, ingredient):
+                position = posting >> _INGREDIENT_BITS
+                if prep_times[position] > max_time:
+                    continue
+                covered.setdefault(position, set()).add(posting & _INGREDIENT_MASK)
+        
+        ranked = sorted(
+            covered.items(),
+            key=lambda item: (-len(item[1]) / ingredient_counts[item[0]],
+                              -len(item[1]), prep_times[item[0]])
+        )
+        if limit is not None:
+            ranked = ranked[:limit]
         
-        for recipe in self.recipes:
-            if recipe['prep_time'] > max_time:
-                continue
-            
-            recipe_ingredients = [ing['name'].lower() for ing in recipe['ingredients']]
-            
-            for ingredient in ingredients:
-                if any(ingredient in recipe_ing for recipe_ing in recipe_ingredients):
-                    matching_recipes.append(recipe)
-                    break
+        matching_recipes = []
+        for position, ingredient_positions in ranked:
+            total_count = ingredient_counts[position]
+            recipe = snapshot.recipes[position].to_summary()
+            recipe['ingredient_availability'] = {
+                'available_count': len(ingredient_positions),
+                'total_count': total_count,
+                'coverage': round(len(ingredient_positions) / total_count, 3)
+            }
+            matching_recipes.append(recipe)
         
         return matching_recipes
     
-    def search_recipes_by_ingredients(self, ingredients: List[str], max_time: int = 20) -> List[Dict]:
-        return self.get_recipes_by_ingredients(ingredients, max_time)
+    def search_recipes_by_ingredients(self, ingredients: List[str], max_time: int = 20, limit: int = None) -> List[Dict]:
+        return self.get_recipes_by_ingredients(ingredients, max_time, limit)
     
     def get_recipe_by_id(self, recipe_id: str) -> Dict:
-        for recipe in self.recipes:
-            if recipe['id'] == recipe_id:
+        recipe_id = str(recipe_id)
+        snapshot = self._reload_if_changed()
+        for attempt in range(2):
+            position = snapshot.by_id.get(recipe_id)
+            if position is None:
+                return None
+            recipe = self._read_recipe(snapshot.recipes[position])
+            if recipe is not None:
                 return recipe
+            if attempt == 0:
+                snapshot = self._reload_if_changed(force=True)
         return None
     
     def get_recipe_categories(self) -> List[str]:
-        categories = set()
-        for recipe in self.recipes:
-            categories.update(recipe.get('tags', []))
-        return list(categories) 
\ No newline at end of file
+        return list(self._reload_if_changed().categories)
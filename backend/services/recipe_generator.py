@@ -1,30 +1,37 @@
 import os
 import base64
+import hashlib
+import re
 import json
-import requests
 import traceback
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 from dotenv import load_dotenv
+from utils.ingredient_lexicon import ingredient_category, recipe_tags, detect_appliances, find_ingredients
+from utils.metrics import get_metrics, timed, count_fallback, record_openai_response
+from services.http_client import get_http_client
+from services.analysis_cache import AnalysisCache, get_analysis_cache
+from services.recipe_cache import RecipeCache, get_recipe_cache
+from services.similar_recipe_cache import get_similar_recipe_cache
+from services.single_flight import coalesce
+from services.upstream_guard import UpstreamUnavailable, get_upstream_guard
+from services.image_preprocessor import prepare_image_for_vision, preprocessing_version
+from services.json_stream import JsonArrayStreamParser, salvage_json_array
+from services.prompt_builder import RecipePromptBuilder
 
 load_dotenv('../config.env')
 
+VISION_BATCH_MAX_BYTES = int(os.getenv('VISION_BATCH_MAX_BYTES', 3 * 1024 * 1024))
+CATALOGUE_FALLBACK_LIMIT = int(os.getenv('CATALOGUE_FALLBACK_LIMIT', 5))
+PIPELINE_MAX_TOKENS = int(os.getenv('PIPELINE_MAX_TOKENS', 3000))
+_CODE_FENCE_RE = re.compile(r'^```(?:json)?\s*|\s*```$', re.IGNORECASE)
+
 class OpenAIService:
     """
     Služba pro komunikaci s OpenAI API pro analýzu obrázků ledničky a generování receptů.
     """
-    def __init__(self):
-        self.api_key = os.getenv('OPENAI_API_KEY')
-        self.base_url = "https://api.openai.com/v1"
-        
-        if not self.api_key:
-            raise ValueError("OPENAI_API_KEY není nastaven v .env souboru")
-
-    def analyze_fridge_image(self, image_path: str) -> List[Dict[str, Any]]:
-        try:
-            with open(image_path, "rb") as image_file:
-                encoded_image = base64.b64encode(image_file.read()).decode('utf-8')
-            
-            prompt = """
+    VISION_MODEL = "gpt-4o"
+    ANALYSIS_PROMPT = """
             Analyzuj obsah ledničky na fotografii a identifikuj všechny dostupné ingredience.
             
             Pro každou ingredienci uveď:
@@ -36,108 +43,510 @@ class OpenAIService:
             Vrať výsledek jako JSON objekt s klíčem "ingredients", který obsahuje pole objektů s klíči: name, category, quantity, freshness.
             Vrať pouze validní JSON bez jakéhokoliv dalšího textu, komentářů nebo vysvětlení.
             """
+    BATCH_ANALYSIS_PROMPT = ANALYSIS_PROMPT + """
+            Fotografie zachycují různé části téže ledničky (police, dveře, mrazák).
+            Každou ingredienci uveď jen jednou, i když je vidět na více fotkách.
+            """
+    # Statický prefix promptu pro recepty; suroviny, čas a omezení se připojí až na konec
+    RECIPE_INSTRUCTIONS = """
+        Jsi expertní kuchař specializující se na rychlé a zdravé recepty.
+        Na základě surovin z ledničky uvedených v požadavku vygeneruj rychlé a zdravé recepty. Použij pouze ty suroviny, které jsou s jistotou rozpoznané z obrázku.
+        Nepřidávej žádné ingredience, které neznáš, pokud není identifikovatelné, do receptů takové suroviny nedávej. Předpokládej, že jsou doma běžné suroviny: sůl, pepř, olivový olej, cibule, mléko, česnek, mouka, rýže, těstoviny, kuskus, bazalkové pesto. V mrazáku je prakticky vždy kuřecí maso, nebo mražené krevety, pokud se ti bude hodit do receptu, použij.
+        Recepty musí splňovat:
+        - doba přípravy nejvýše tolik minut, kolik uvádí požadavek
+        - zdravý způsob přípravy (žádné smažení)
+        - dostupné spotřebiče: sporák, trouba, gril, mixér, mikrovlná trouba, rychlovarná konvice
+        - dietní omezení z požadavku, pokud jsou uvedena
+        Vrať JSON objekt s klíčem "recipes", což je pole objektů. Každý objekt musí mít klíče: name, prep_time, servings, ingredients (pole stringů), instructions (pole stringů), nutrition_info (objekt), cooking_tips (pole stringů).
+        Vrať POUZE validní JSON.
+        """
+    RECIPE_ASSUMED_INGREDIENTS = ['sůl', 'pepř', 'olivový olej', 'cibule', 'mléko', 'česnek', 'mouka', 'rýže',
+                                  'těstoviny', 'kuskus', 'bazalkové pesto']
+
+    def __init__(self, recipe_database=None):
+        self.api_key = os.getenv('OPENAI_API_KEY')
+        self.base_url = os.getenv('OPENAI_BASE_URL', "https://api.openai.com/v1")
+        # Katalog receptů slouží jako náhrada, když je OpenAI přetížené nebo nedostupné
+        self.recipe_database = recipe_database
+        self.recipe_prompt_builder = RecipePromptBuilder(self.RECIPE_INSTRUCTIONS, self.RECIPE_ASSUMED_INGREDIENTS)
+        
+        if not self.api_key:
+            raise ValueError("OPENAI_API_KEY není nastaven v .env souboru")
+
+    def analyze_fridge_image(self, image_path: str) -> List[Dict[str, Any]]:
+        try:
+            with open(image_path, "rb") as image_file:
+                image_bytes = image_file.read()
+        except OSError as e:
+            print(f"Chyba při analýze obrázku: {e}")
+            return []
+        return self.analyze_fridge_image_bytes(image_bytes)
+
+    def analyze_fridge_image_bytes(self, image_bytes: bytes, content_hash: str = None,
+                                   prepared: Tuple[bytes, str] = None) -> List[Dict[str, Any]]:
+        """
+        Analyzuje obrázek z paměti. content_hash (SHA-256 hex) lze předat, pokud už byl
+        spočítán při čtení uploadu, prepared pokud už byl obrázek zmenšen.
+        Souběžné analýzy téhož obrázku se sloučí do jednoho volání API.
+        """
+        try:
+            content_hash = content_hash or hashlib.sha256(image_bytes).hexdigest()
+            cache_key = self._analysis_cache_key(content_hash, self.ANALYSIS_PROMPT)
+            cache = get_analysis_cache()
+            if cache:
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    print("⚡ Výsledek analýzy nalezen v cache")
+                    return cached
+
+            return coalesce(f'analysis:{cache_key}', self._analyze_image, image_bytes, prepared, cache_key,
+                            shareable=self.is_complete_result)
             
-            response_str = self._call_vision_api(encoded_image, prompt)
-            return self._parse_ingredients_response(response_str)
-            
+        except UpstreamUnavailable:
+            raise
         except Exception as e:
             print(f"Chyba při analýze obrázku: {e}")
             traceback.print_exc()
             return []
 
+    def analyze_fridge_images_bytes(self, images: List[Tuple[bytes, Optional[str]]]) -> List[Dict[str, Any]]:
+        """
+        Analyzuje několik fotek téže ledničky, images je seznam (image_bytes, content_hash).
+        Pokud se zmenšené snímky vejdou do VISION_BATCH_MAX_BYTES, odejdou v jediném
+        požadavku; jinak se analyzují souběžně po jednom. Výsledky nejsou deduplikované.
+        """
+        images = [(image_bytes, content_hash or hashlib.sha256(image_bytes).hexdigest())
+                  for image_bytes, content_hash in images]
+        if len(images) == 1:
+            return self.analyze_fridge_image_bytes(*images[0])
+
+        try:
+            batch_hash = ','.join(sorted(content_hash for _, content_hash in images))
+            cache_key = self._analysis_cache_key(batch_hash, self.BATCH_ANALYSIS_PROMPT)
+            cache = get_analysis_cache()
+            if cache:
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    print("⚡ Výsledek analýzy nalezen v cache")
+                    return cached
+
+            return coalesce(f'analysis:{cache_key}', self._analyze_image_batch, images, cache_key,
+                            shareable=self.is_complete_result)
+
+        except UpstreamUnavailable:
+            raise
+        except Exception as e:
+            print(f"Chyba při analýze obrázků: {e}")
+            traceback.print_exc()
+            return []
+
+    def _analyze_image(self, image_bytes: bytes, prepared: Optional[Tuple[bytes, str]], cache_key: str) -> List[Dict[str, Any]]:
+        if prepared is None:
+            with timed('image_preprocess'):
+                prepared = prepare_image_for_vision(image_bytes)
+        ingredients = self._analyze_prepared_images([prepared], self.ANALYSIS_PROMPT)
+
+        cache = get_analysis_cache()
+        if cache and self.is_complete_result(ingredients):
+            cache.set(cache_key, ingredients)
+        return ingredients
+
+    def _analyze_image_batch(self, images: List[Tuple[bytes, str]], cache_key: str) -> List[Dict[str, Any]]:
+        with timed('image_preprocess'):
+            prepared = [prepare_image_for_vision(image_bytes) for image_bytes, _ in images]
+        if sum(len(image_data) for image_data, _ in prepared) > VISION_BATCH_MAX_BYTES:
+            with ThreadPoolExecutor(max_workers=len(images), thread_name_prefix='vision') as executor:
+                results = executor.map(lambda args: self.analyze_fridge_image_bytes(*args),
+                                       [(image_bytes, content_hash, image) for (image_bytes, content_hash), image
+                                        in zip(images, prepared)])
+                return [ingredient for result in results for ingredient in result]
+
+        ingredients = self._analyze_prepared_images(prepared, self.BATCH_ANALYSIS_PROMPT)
+        cache = get_analysis_cache()
+        if cache and self.is_complete_result(ingredients):
+            cache.set(cache_key, ingredients)
+        return ingredients
+
+    def _analysis_cache_key(self, content_hash: str, prompt: str) -> str:
+        return AnalysisCache.make_key(content_hash.encode('utf-8'), self.VISION_MODEL, prompt, preprocessing_version())
+
+    def _analyze_prepared_images(self, prepared: List[Tuple[bytes, str]], prompt: str) -> List[Dict[str, Any]]:
+        response_str = self._call_vision_api_images(self._encode_images(prepared), prompt)
+        return self._parse_ingredients_response(response_str)
+
+    def _encode_images(self, prepared: List[Tuple[bytes, str]]) -> List[Tuple[str, str]]:
+        with timed('base64_encode'):
+            return [(base64.b64encode(image_data).decode('utf-8'), mime_type) for image_data, mime_type in prepared]
+
+    def analyze_and_generate_recipes(self, image_bytes: bytes, content_hash: str = None,
+                                     max_time: int = 20,
+                                     dietary_restrictions: List[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Rozpozná ingredience na fotce a navrhne k nim recepty jediným voláním vision
+        modelu. Výsledek se uloží do cache analýz i receptů, takže opakovaná fotka
+        ani následné /recipes/generate se stejnými ingrediencemi API nevolají.
+        """
+        try:
+            content_hash = content_hash or hashlib.sha256(image_bytes).hexdigest()
+            analysis_key = self._analysis_cache_key(content_hash, self.ANALYSIS_PROMPT)
+            cache = get_analysis_cache()
+            if cache:
+                cached = cache.get(analysis_key)
+                if cached is not None:
+                    print("⚡ Výsledek analýzy nalezen v cache")
+                    return {'ingredients': cached,
+                            'recipes': self.generate_recipes(cached, max_time, dietary_restrictions) if cached else []}
+
+            prompt = self._create_pipeline_prompt(max_time, dietary_restrictions)
+            pipeline_key = self._analysis_cache_key(content_hash, prompt)
+            result = coalesce(f'pipeline:{pipeline_key}', self._analyze_and_generate,
+                              image_bytes, prompt, analysis_key, max_time, dietary_restrictions,
+                              shareable=lambda shared: self.is_complete_result(shared['ingredients']))
+
+            recipes = result['recipes']
+            if result['ingredients'] and not recipes:
+                # Model recepty vynechal - doplníme je samostatným voláním
+                recipes = self.generate_recipes(result['ingredients'], max_time, dietary_restrictions)
+            # Výsledek může patřit vedoucímu single-flight - vracíme nový slovník, sdílený neměníme
+            return {'ingredients': result['ingredients'], 'recipes': recipes}
+
+        except UpstreamUnavailable:
+            raise
+        except Exception as e:
+            print(f"Chyba při analýze obrázku a generování receptů: {e}")
+            traceback.print_exc()
+            return {'ingredients': [], 'recipes': []}
+
+    def _analyze_and_generate(self, image_bytes: bytes, prompt: str, analysis_key: str, max_time: int,
+                              dietary_restrictions: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        with timed('image_preprocess'):
+            prepared = prepare_image_for_vision(image_bytes)
+        response_str = self._call_vision_api_images(self._encode_images([prepared]), prompt,
+                                                    max_tokens=PIPELINE_MAX_TOKENS)
+
+        # Obě poloviny odpovědi zpracují stejné parsery jako samostatná volání
+        ingredients = self._parse_ingredients_response(response_str)
+        recipes = self._parse_recipes_response(response_str) if ingredients else []
+        recipes = [recipe for recipe in recipes if not recipe.get('fallback')]
+
+        analysis_cache = get_analysis_cache()
+        if analysis_cache and self.is_complete_result(ingredients):
+            analysis_cache.set(analysis_key, ingredients)
+        if self.is_complete_result(recipes):
+            ingredient_names = self._ingredient_names(ingredients)
+            recipe_cache = get_recipe_cache()
+            if recipe_cache:
+                recipe_cache.set(RecipeCache.make_key(ingredient_names, max_time, dietary_restrictions), recipes)
+            similar_cache = get_similar_recipe_cache()
+            if similar_cache:
+                similar_cache.set(ingredient_names, max_time, dietary_restrictions, recipes)
+        return {'ingredients': ingredients, 'recipes': recipes}
+
     def generate_recipes(self, ingredients: List[Any], 
                          max_time: int = 20, 
-                         dietary_restrictions: List[str] = None) -> List[Dict[str, Any]]:
+                         dietary_restrictions: List[str] = None,
+                         use_cache: bool = True) -> List[Dict[str, Any]]:
         """
         Generuje recepty na základě seznamu názvů ingrediencí.
+        Výsledky se cachují podle normalizované sady ingrediencí (vypnutelné přes use_cache).
         """
         try:
-            ingredient_names = []
-            for ing in ingredients:
-                if isinstance(ing, dict):
-                    name = ing.get('name')
-                    if name:
-                        ingredient_names.append(name)
-                elif isinstance(ing, str):
-                    ingredient_names.append(ing)
+            ingredient_names = self._ingredient_names(ingredients)
 
             if not ingredient_names:
                 print("Seznam ingrediencí pro generování je prázdný.")
                 return []
 
-            ingredients_text = ", ".join(ingredient_names)
-            
-            prompt = self._create_recipe_prompt(ingredients_text, max_time, dietary_restrictions)
-            response_str = self._call_gpt_api(prompt)
-            
-            return self._parse_recipes_response(response_str)
+            cache = get_recipe_cache() if use_cache else None
+            cache_key = RecipeCache.make_key(ingredient_names, max_time, dietary_restrictions)
+            if cache:
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    print("⚡ Recepty nalezeny v cache")
+                    return cached
+
+            similar_cache = get_similar_recipe_cache() if use_cache else None
+            if similar_cache:
+                similar = similar_cache.get(ingredient_names, max_time, dietary_restrictions)
+                if similar is not None:
+                    print("⚡ Recepty pro podobnou sadu ingrediencí nalezeny v cache")
+                    return similar
+
+            if use_cache:
+                # Stejná sada ingrediencí zadaná souběžně (i dvojklikem) vede na jediné volání API
+                recipes = coalesce(f'recipes:{cache_key}', self._generate_recipes,
+                                   ingredient_names, max_time, dietary_restrictions,
+                                   shareable=self.is_complete_result)
+            else:
+                recipes = self._generate_recipes(ingredient_names, max_time, dietary_restrictions)
+
+            if self.is_complete_result(recipes):
+                if cache:
+                    cache.set(cache_key, recipes)
+                if similar_cache:
+                    similar_cache.set(ingredient_names, max_time, dietary_restrictions, recipes)
+            return recipes
             
+        except UpstreamUnavailable as e:
+            print(f"⚠️ {e} - vracím recepty z katalogu")
+            return self._catalogue_recipes(ingredient_names, max_time)
         except Exception as e:
             print(f"Chyba při generování receptů: {e}")
             traceback.print_exc()
             return self._create_fallback_recipes()
 
+    def _generate_recipes(self, ingredient_names: List[str], max_time: int,
+                          dietary_restrictions: List[str]) -> List[Dict[str, Any]]:
+        prompt = self._create_recipe_prompt(ingredient_names, max_time, dietary_restrictions)
+        response_str = self._call_gpt_api(prompt)
+        return self._parse_recipes_response(response_str)
+
+    def stream_recipes(self, ingredients: List[Any],
+                       max_time: int = 20,
+                       dietary_restrictions: List[str] = None,
+                       use_cache: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Streamuje recepty jeden po druhém, jakmile je model dokončí.
+        """
+        ingredient_names = self._ingredient_names(ingredients)
+        if not ingredient_names:
+            print("Seznam ingrediencí pro generování je prázdný.")
+            return
+
+        cache = get_recipe_cache() if use_cache else None
+        cache_key = None
+        if cache:
+            cache_key = cache.make_key(ingredient_names, max_time, dietary_restrictions)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                print("⚡ Recepty nalezeny v cache")
+                yield from cached
+                return
+
+        similar_cache = get_similar_recipe_cache() if use_cache else None
+        if similar_cache:
+            similar = similar_cache.get(ingredient_names, max_time, dietary_restrictions)
+            if similar is not None:
+                print("⚡ Recepty pro podobnou sadu ingrediencí nalezeny v cache")
+                yield from similar
+                return
+
+        recipes = []
+        complete = False
+        try:
+            prompt = self._create_recipe_prompt(ingredient_names, max_time, dietary_restrictions)
+            parser = JsonArrayStreamParser('recipes')
+            for delta in self._stream_gpt_api(prompt):
+                for recipe in parser.feed(delta):
+                    new_recipe = self._normalize_recipe(recipe)
+                    if new_recipe:
+                        recipes.append(new_recipe)
+                        yield new_recipe
+                if parser.finished:
+                    break
+            self._report_dropped('recipes', parser.close())
+            # Do cache jen celé pole - useknutý stream by /generate vracel po celé TTL
+            complete = parser.finished and not parser.dropped
+        except UpstreamUnavailable as e:
+            print(f"⚠️ {e} - vracím recepty z katalogu")
+            if not recipes:
+                yield from self._catalogue_recipes(ingredient_names, max_time)
+                return
+        except Exception as e:
+            print(f"Chyba při streamování receptů: {e}")
+            traceback.print_exc()
+
+        if not recipes:
+            yield from self._create_fallback_recipes()
+            return
+        if not complete:
+            return
+        if cache:
+            cache.set(cache_key, recipes)
+        if similar_cache:
+            similar_cache.set(ingredient_names, max_time, dietary_restrictions, recipes)
+
+    def _catalogue_recipes(self, ingredient_names: List[str], max_time: int) -> List[Dict[str, Any]]:
+        if self.recipe_database is None:
+            return self._create_fallback_recipes()
+
+        count_fallback('catalogue_recipes')
+        recipes = []
+        for summary in self.recipe_database.get_recipes_by_ingredients(ingredient_names, max_time,
+                                                                        limit=CATALOGUE_FALLBACK_LIMIT):
+            recipe = self.recipe_database.get_recipe_by_id(summary['id'])
+            if not recipe:
+                continue
+            recipe.setdefault('nutrition_info', {
+                'calories_per_serving': recipe.get('calories'),
+                'protein': recipe.get('protein'),
+                'carbs': recipe.get('carbs'),
+                'fat': recipe.get('fat'),
+                'fiber': recipe.get('fiber')
+            })
+            recipe.setdefault('cooking_tips', [])
+            recipe['ingredient_availability'] = summary['ingredient_availability']
+            recipe['source'] = 'catalogue'
+            recipes.append(recipe)
+        return recipes or self._create_fallback_recipes()
+
+    def _ingredient_names(self, ingredients: List[Any]) -> List[str]:
+        ingredient_names = []
+        for ing in ingredients:
+            if isinstance(ing, dict):
+                name = ing.get('name')
+                if name:
+                    ingredient_names.append(name)
+            elif isinstance(ing, str):
+                ingredient_names.append(ing)
+        return ingredient_names
+
     def _call_api(self, data: Dict[str, Any]) -> str:
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}"
         }
         
-        response = requests.post(f"{self.base_url}/chat/completions", headers=headers, json=data)
+        with get_upstream_guard().slot() as slot, timed('openai_call'):
+            response = get_http_client().post(f"{self.base_url}/chat/completions", headers=headers, json=data)
+            slot.mark_status(response.status_code)
+            if response.status_code == 200:
+                try:
+                    body = response.json()
+                except ValueError:
+                    body = None
+                if not isinstance(body, dict):
+                    # 200 s tělem, které není JSON (chybová stránka proxy, useknutý přenos), je selhání
+                    # upstreamu - výjimka uvnitř slotu ho započítá jističi i limiteru
+                    record_openai_response(data.get("model"), 'invalid_body')
+                    raise Exception(f"OpenAI API error: invalid JSON body - {response.text[:200]}")
         
         if response.status_code != 200:
+            record_openai_response(data.get("model"), response.status_code)
             raise Exception(f"OpenAI API error: {response.status_code} - {response.text}")
         
+        record_openai_response(data.get("model"), response.status_code, body.get('usage'))
         try:
-            content = response.json()['choices'][0]['message']['content']
-        except (KeyError, IndexError):
+            content = body['choices'][0]['message']['content']
+        except (KeyError, IndexError, TypeError):
             return ""
 
         return content if content is not None else ""
 
-    def _call_vision_api(self, encoded_image: str, prompt: str) -> str:
+    def _call_vision_api(self, encoded_image: str, prompt: str, mime_type: str = "image/jpeg") -> str:
+        return self._call_vision_api_images([(encoded_image, mime_type)], prompt)
+
+    def _call_vision_api_images(self, images: List[Tuple[str, str]], prompt: str, max_tokens: int = None) -> str:
+        content = [{"type": "text", "text": prompt}]
+        content.extend({"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{encoded_image}"}}
+                       for encoded_image, mime_type in images)
         data = {
-            "model": "gpt-4o",
-            "messages": [{"role": "user", "content": [{"type": "text", "text": prompt}, {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{encoded_image}"}}]}],
-            "max_tokens": 1000,
+            "model": self.VISION_MODEL,
+            "messages": [{"role": "user", "content": content}],
+            "max_tokens": max_tokens or 1000 + 500 * (len(images) - 1),
             "response_format": {"type": "json_object"}
         }
         return self._call_api(data)
 
-    def _call_gpt_api(self, prompt: str) -> str:
-        data = {
+    def _call_gpt_api(self, prompt: Dict[str, Any]) -> str:
+        return self._call_api(self._gpt_request_data(prompt))
+
+    def _gpt_request_data(self, prompt: Dict[str, Any]) -> Dict[str, Any]:
+        return {
             "model": "gpt-4o",
-            "messages": [{"role": "system", "content": "Jsi expertní kuchař specializující se na rychlé a zdravé recepty."}, {"role": "user", "content": prompt}],
-            "max_tokens": 2000,
+            "messages": prompt['messages'],
+            "max_tokens": prompt['max_tokens'],
             "temperature": 0.7,
             "response_format": {"type": "json_object"}
         }
-        return self._call_api(data)
 
-    def _create_recipe_prompt(self, ingredients_text: str, max_time: int, dietary_restrictions: List[str]) -> str:
+    def _stream_gpt_api(self, prompt: Dict[str, Any]) -> Iterator[str]:
+        data = self._gpt_request_data(prompt)
+        data["stream"] = True
+        # Poslední chunk pak nese spotřebu tokenů
+        data["stream_options"] = {"include_usage": True}
+        return self._stream_api(data)
+
+    def _stream_api(self, data: Dict[str, Any]) -> Iterator[str]:
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        
+        with get_upstream_guard().slot() as slot:
+            with timed('openai_stream_connect'):
+                response = get_http_client().post(f"{self.base_url}/chat/completions", headers=headers, json=data, stream=True)
+            slot.mark_status(response.status_code)
+            
+            if response.status_code == 200:
+                yield from self._iter_stream_content(response, data.get("model"))
+                return
+            error_text = response.text
+        
+        record_openai_response(data.get("model"), response.status_code)
+        raise Exception(f"OpenAI API error: {response.status_code} - {error_text}")
+
+    def _iter_stream_content(self, response, model: str) -> Iterator[str]:
+        # text/event-stream bez charsetu by requests dekódoval jako latin-1
+        response.encoding = 'utf-8'
+        usage = None
+        with response:
+            try:
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith('data:'):
+                        continue
+                    payload = line[5:].strip()
+                    if payload == '[DONE]':
+                        break
+                    try:
+                        chunk = json.loads(payload)
+                        usage = chunk.get('usage') or usage
+                        content = chunk['choices'][0]['delta'].get('content')
+                    except (json.JSONDecodeError, KeyError, IndexError, AttributeError):
+                        continue
+                    if content:
+                        yield content
+            finally:
+                record_openai_response(model, response.status_code, usage)
+
+    def _create_recipe_prompt(self, ingredient_names: List[str], max_time: int,
+                              dietary_restrictions: List[str]) -> Dict[str, Any]:
+        return self.recipe_prompt_builder.build(ingredient_names, max_time, dietary_restrictions)
+
+    def _create_pipeline_prompt(self, max_time: int, dietary_restrictions: List[str]) -> str:
         restrictions_text = f"\nDietní omezení: {', '.join(dietary_restrictions)}" if dietary_restrictions else ""
         
         return f"""
-        Na základě detekovaných surovin vygeneruj 3–5 rychlých a zdravých receptů. Použij pouze ty suroviny, které jsou s jistotou rozpoznané z obrázku {ingredients_text}.
-        Nepřidávej žádné ingredience, které neznáš, pokud není identifikovatelné, do receptů takové suroviny nedávej. Předpokládej, že jsou doma běžné suroviny: sůl, pepř, olivový olej, cibule, mléko, česnek, mouka, rýže, těstoviny, kuskus, bazalkové pesto. V mrazáku je prakticky vždy kuřecí maso, nebo mražené krevety, pokud se ti bude hodit do receptu, použij. 
+        Analyzuj obsah ledničky na fotografii a identifikuj všechny dostupné ingredience.
+        Pro každou ingredienci uveď název, kategorii (zelenina, ovoce, maso, mléčné, vejce, těstoviny, rýže, luštěniny, koření, ostatní), odhadované množství a čerstvost (čerstvé, dobré, spotřebuj brzy).
+        
+        Z rozpoznaných ingrediencí pak vygeneruj 3–5 rychlých a zdravých receptů. Použij pouze suroviny, které jsou na fotografii s jistotou rozpoznané. Předpokládej, že jsou doma běžné suroviny: sůl, pepř, olivový olej, cibule, mléko, česnek, mouka, rýže, těstoviny, kuskus, bazalkové pesto. V mrazáku je prakticky vždy kuřecí maso, nebo mražené krevety, pokud se ti bude hodit do receptu, použij.
         Recepty musí splňovat:
         - maximální doba přípravy {max_time} minut
         - zdravý způsob přípravy (žádné smažení)
         - dostupné spotřebiče: sporák, trouba, gril, mixér, mikrovlná trouba, rychlovarná konvice
         {restrictions_text}
-        Vrať JSON objekt s klíčem "recipes", což je pole objektů. Každý objekt musí mít klíče: name, prep_time, servings, ingredients (pole stringů), instructions (pole stringů), nutrition_info (objekt), cooking_tips (pole stringů).
-        Vrať POUZE validní JSON.
+        Vrať JSON objekt se dvěma klíči:
+        - "ingredients": pole objektů s klíči name, category, quantity, freshness
+        - "recipes": pole objektů s klíči name, prep_time, servings, ingredients (pole stringů), instructions (pole stringů), nutrition_info (objekt), cooking_tips (pole stringů)
+        Vrať POUZE validní JSON bez jakéhokoliv dalšího textu.
         """
 
     def _parse_json_response(self, response_str: str) -> Any:
         if not response_str:
             return None
-        cleaned_response = response_str.strip()
-        if cleaned_response.startswith('```json'):
-            cleaned_response = cleaned_response[7:-3].strip()
+        cleaned_response = _CODE_FENCE_RE.sub('', response_str.strip())
         if not cleaned_response:
             return None
-        return json.loads(cleaned_response)
+        with timed('json_parse'):
+            try:
+                return json.loads(cleaned_response)
+            except json.JSONDecodeError:
+                # Text před nebo za objektem ("Tady jsou recepty: {...}")
+                start, end = cleaned_response.find('{'), cleaned_response.rfind('}')
+                if start < 0 or end <= start or (start == 0 and end == len(cleaned_response) - 1):
+                    raise
+                return json.loads(cleaned_response[start:end + 1])
 
     def _parse_ingredients_response(self, response_str: str) -> List[Dict[str, Any]]:
         try:
@@ -145,16 +554,7 @@ class OpenAIService:
             if not parsed_json:
                 return []
             
-            valid_ingredients = []
-            for ingredient in parsed_json.get('ingredients', []):
-                if isinstance(ingredient, dict) and 'name' in ingredient:
-                    valid_ingredients.append({
-                        'name': ingredient.get('name', 'Neznámá ingredience'),
-                        'category': ingredient.get('category', 'ostatní'),
-                        'quantity': ingredient.get('quantity', 'dostupné'),
-                        'freshness': ingredient.get('freshness', 'čerstvé')
-                    })
-            return valid_ingredients
+            return self._normalize_ingredients(parsed_json.get('ingredients', []))
         except (json.JSONDecodeError, AttributeError) as e:
             print(f"Chyba při parsování ingrediencí: {e}")
             return self._fallback_ingredients_parsing(response_str)
@@ -167,63 +567,105 @@ class OpenAIService:
             
             valid_recipes = []
             for recipe in parsed_json.get('recipes', []):
-                if not isinstance(recipe, dict):
-                    continue
-
-                new_recipe = {
-                    'name': recipe.get('name', 'Recept bez názvu'),
-                    'prep_time': int(recipe.get('prep_time', 0)),
-                    'servings': int(recipe.get('servings', 1)),
-                    'ingredients': recipe.get('ingredients', []),
-                    'instructions': recipe.get('instructions', []),
-                    'nutrition_info': recipe.get('nutrition_info', {}),
-                    'cooking_tips': recipe.get('cooking_tips', [])
-                }
-                
-                new_recipe['tags'] = self._generate_recipe_tags(new_recipe)
-                new_recipe['appliances'] = self._detect_appliances(new_recipe)
-                
-                valid_recipes.append(new_recipe)
+                new_recipe = self._normalize_recipe(recipe)
+                if new_recipe:
+                    valid_recipes.append(new_recipe)
             return valid_recipes
-        except (json.JSONDecodeError, AttributeError, KeyError, ValueError) as e:
+        except json.JSONDecodeError as e:
+            # Useknutá (max_tokens) nebo zašuměná odpověď - zachráníme kompletní recepty
+            print(f"Chyba při parsování receptů: {e}")
+            recipes, dropped = salvage_json_array(response_str, 'recipes')
+            self._report_dropped('recipes', dropped)
+            valid_recipes = []
+            for recipe in recipes:
+                new_recipe = self._normalize_recipe(recipe)
+                if new_recipe:
+                    new_recipe['partial'] = True
+                    valid_recipes.append(new_recipe)
+            if valid_recipes:
+                print(f"Zachráněno {len(valid_recipes)} receptů z nevalidní odpovědi")
+                return valid_recipes
+            return self._create_fallback_recipes()
+        except (AttributeError, KeyError, ValueError) as e:
             print(f"Chyba při parsování receptů: {e}")
             traceback.print_exc()
             return self._create_fallback_recipes()
 
+    def _normalize_recipe(self, recipe: Any) -> Optional[Dict[str, Any]]:
+        if not isinstance(recipe, dict):
+            return None
+
+        # Jedna nečíselná hodnota nesmí shodit celou odpověď do záložních receptů
+        try:
+            prep_time = int(recipe.get('prep_time', 0))
+        except (ValueError, TypeError):
+            prep_time = 0
+        try:
+            servings = int(recipe.get('servings', 1))
+        except (ValueError, TypeError):
+            servings = 1
+
+        new_recipe = {
+            'name': recipe.get('name', 'Recept bez názvu'),
+            'prep_time': prep_time or 15,  # výchozí hodnota, pokud model nevrátí čas
+            'servings': servings,
+            'ingredients': recipe.get('ingredients', []),
+            'instructions': recipe.get('instructions', []),
+            'nutrition_info': recipe.get('nutrition_info', {}),
+            'cooking_tips': recipe.get('cooking_tips', [])
+        }
+        
+        with timed('recipe_postprocess'):
+            new_recipe['tags'] = recipe_tags(new_recipe)
+            new_recipe['appliances'] = detect_appliances(new_recipe)
+        return new_recipe
+
+    def _normalize_ingredients(self, ingredients: Iterable[Any]) -> List[Dict[str, Any]]:
+        valid_ingredients = []
+        for ingredient in ingredients:
+            if isinstance(ingredient, dict) and 'name' in ingredient:
+                valid_ingredients.append({
+                    'name': ingredient.get('name', 'Neznámá ingredience'),
+                    'category': ingredient.get('category') or ingredient_category(str(ingredient['name'])),
+                    'quantity': ingredient.get('quantity', 'dostupné'),
+                    'freshness': ingredient.get('freshness', 'čerstvé')
+                })
+        return valid_ingredients
+
     def _fallback_ingredients_parsing(self, response_str: str) -> List[Dict[str, Any]]:
         print("Používám záložní parsování ingrediencí.")
-        return []
+        count_fallback('ingredients_parsing')
+        if not response_str:
+            return []
 
-    def _generate_recipe_tags(self, recipe: Dict) -> List[str]:
-        tags = []
-        if recipe.get('prep_time', 99) <= 20:
-            tags.append('rychlé')
-        
-        ingredients_str = ' '.join(str(i) for i in recipe.get('ingredients', [])).lower()
-        if 'kuřecí' in ingredients_str or 'kuře' in ingredients_str:
-            tags.append('kuřecí')
-        if 'ryba' in ingredients_str or 'losos' in ingredients_str or 'tuňák' in ingredients_str:
-            tags.append('rybí')
-        if any(veg in ingredients_str for veg in ['zelenina', 'mrkev', 'cibule', 'špenát', 'brokolice']):
-             tags.append('zeleninové')
-        if not any(maso in ingredients_str for maso in ['kuřecí', 'ryba', 'vepřové', 'hovězí']):
-            tags.append('vegetariánské')
-        tags.append('zdravé')
-        return list(set(tags))
-
-    def _detect_appliances(self, recipe: Dict) -> List[str]:
-        appliances = ['elektrický sporák']
-        instructions = ' '.join(recipe.get('instructions', [])).lower()
-        if any(word in instructions for word in ['trouba', 'pečeme', 'pečení']):
-            appliances.append('trouba')
-        if any(word in instructions for word in ['mikrovln', 'mikrovlnná']):
-            appliances.append('mikrovlnná trouba')
-        if any(word in instructions for word in ['mixér', 'mixujeme']):
-            appliances.append('mixér')
-        if any(word in instructions for word in ['gril', 'grilování']):
-            appliances.append('elektrický kontaktní gril')
-        return list(set(appliances))
+        # Kompletní objekty z useknuté nebo zašuměné odpovědi
+        ingredients, dropped = salvage_json_array(response_str, 'ingredients')
+        self._report_dropped('ingredients', dropped)
+        valid_ingredients = self._normalize_ingredients(ingredients)
+        if valid_ingredients:
+            print(f"Zachráněno {len(valid_ingredients)} ingrediencí z nevalidní odpovědi")
+        else:
+            # Poslední možnost - známé ingredience zmíněné kdekoliv v textu
+            valid_ingredients = self._normalize_ingredients({'name': name} for name in find_ingredients(response_str))
+        for ingredient in valid_ingredients:
+            ingredient['partial'] = True
+        return valid_ingredients
+
+    @staticmethod
+    def is_complete_result(items: List[Dict[str, Any]]) -> bool:
+        """
+        Do cache patří jen úplné výsledky - bez záložních (fallback) a bez položek
+        zachráněných z useknuté nebo nevalidní odpovědi (partial).
+        """
+        return bool(items) and not any(item.get('fallback') or item.get('partial') for item in items)
+
+    def _report_dropped(self, key: str, dropped: List[Dict[str, Any]]):
+        metrics = get_metrics()
+        for item in dropped:
+            print(f"Zahozena část pole '{key}' ({item['reason']}, pozice {item['offset']}): {item['preview']!r}")
+            metrics.inc('fridge_json_dropped_total', key=key, reason=item['reason'])
 
     def _create_fallback_recipes(self) -> List[Dict[str, Any]]:
+        count_fallback('recipes')
         print("Vracím záložní recepty.")
-        return [{'name': 'Záložní recept: Zeleninová polévka', 'prep_time': 15, 'servings': 2, 'ingredients': ['Zelenina z ledničky'], 'instructions': ['Nakrájejte zeleninu.', 'Vařte 15 minut.', 'Ochuťte.'], 'nutrition_info': {}, 'cooking_tips': [], 'tags': ['rychlé', 'zdravé'], 'appliances': ['elektrický sporák']}] 
+        return [{'name': 'Záložní recept: Zeleninová polévka', 'prep_time': 15, 'servings': 2, 'ingredients': ['Zelenina z ledničky'], 'instructions': ['Nakrájejte zeleninu.', 'Vařte 15 minut.', 'Ochuťte.'], 'nutrition_info': {}, 'cooking_tips': [], 'tags': ['rychlé', 'zdravé'], 'appliances': ['elektrický sporák'], 'fallback': True}] 
@@ -0,0 +1,70 @@
+from typing import Any, Dict, Optional
+from flask import current_app
+from services.recipe_generator import OpenAIService
+from services.image_analyzer import ImageAnalyzer
+from services.recipe_database import RecipeDatabase
+from services.upload_store import UploadStore
+from services.upload_janitor import UploadJanitor
+from utils.process_utils import ProcessRegistry, env_disabled, process_registry
+
+
+class ServiceRegistry(ProcessRegistry):
+    """
+    Registr služeb aplikace. Každá služba se vytvoří jednou na worker (líně, po forku
+    při preload_app) a sdílí se mezi vlákny. Služby, které aplikace nedefinuje (cache,
+    jistič, fronta úloh, metriky), se berou z registru procesu. V testech lze služby
+    nahradit přes override().
+    """
+    def __init__(self, config: Dict[str, Any] = None):
+        self._config = config or {}
+        super().__init__({
+            'openai_service': lambda: OpenAIService(recipe_database=self.get('recipe_database')),
+            'image_analyzer': self._create_image_analyzer,
+            'recipe_database': RecipeDatabase,
+            'upload_store': lambda: UploadStore(self._config.get('UPLOAD_FOLDER', 'uploads')),
+            'upload_janitor': self._create_upload_janitor
+        })
+
+    def get(self, name: str) -> Any:
+        if name not in self._factories and name not in self._overrides:
+            return process_registry().get(name)
+        return super().get(name)
+
+    def _create_image_analyzer(self) -> ImageAnalyzer:
+        try:
+            openai_service = self.get('openai_service')
+        except Exception as e:
+            print(f"OpenAI služba není dostupná: {e}")
+            return ImageAnalyzer(use_openai=False)
+        return ImageAnalyzer(openai_service=openai_service)
+
+    def _create_upload_janitor(self) -> Optional[UploadJanitor]:
+        if env_disabled('JANITOR_ENABLED'):
+            return None
+        janitor = UploadJanitor(self.get('upload_store'))
+        janitor.start()
+        return janitor
+
+    @property
+    def openai_service(self) -> OpenAIService:
+        return self.get('openai_service')
+
+    @property
+    def image_analyzer(self) -> ImageAnalyzer:
+        return self.get('image_analyzer')
+
+    @property
+    def recipe_database(self) -> RecipeDatabase:
+        return self.get('recipe_database')
+
+    @property
+    def upload_store(self) -> UploadStore:
+        return self.get('upload_store')
+
+    @property
+    def upload_janitor(self) -> Optional[UploadJanitor]:
+        return self.get('upload_janitor')
+
+
+def get_services() -> ServiceRegistry:
+    return current_app.extensions['services']
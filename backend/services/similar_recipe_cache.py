@@ -0,0 +1,220 @@
+import os
+import copy
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+import numpy as np
+from utils.ingredient_lexicon import canonical_ingredient_name, find_ingredients, ingredient_category, stem_key
+from utils.text_utils import canonical_name_set
+from utils.metrics import get_metrics
+from utils.process_utils import env_disabled, process_registry
+
+# Suroviny, které prompt pro recepty považuje za dostupné v každé domácnosti
+PANTRY_STAPLES = ['sůl', 'pepř', 'olivový olej', 'cibule', 'mléko', 'česnek', 'mouka', 'rýže', 'těstoviny',
+                  'kuskus', 'bazalkové pesto', 'kuřecí maso', 'krevety']
+
+# Prompt žádá 3-5 receptů, víc jich z cache nevracíme
+MAX_SERVED_RECIPES = 5
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def ingredient_key(name: str) -> str:
+    """
+    Klíč ingredience pro porovnání množin: kanonický název ze slovníku, jinak stemmovaný text.
+    """
+    return canonical_ingredient_name(name) or stem_key(name)
+
+
+_STAPLE_KEYS = frozenset(ingredient_key(name) for name in PANTRY_STAPLES)
+
+
+def _token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=4).digest(), 'big')
+
+
+class MinHasher:
+    """
+    MinHash signatura množiny řetězců: pro každou z num_perm náhodných permutací
+    (a * x + b) mod p si pamatuje nejmenší hodnotu. Podíl shodných pozic dvou
+    signatur odhaduje Jaccardovu podobnost množin.
+    """
+    def __init__(self, num_perm: int, seed: int = 1):
+        generator = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self._a = generator.randint(1, 1 << 32, num_perm, dtype=np.uint64)
+        self._b = generator.randint(0, 1 << 32, num_perm, dtype=np.uint64)
+
+    def signature(self, tokens: FrozenSet[str]) -> np.ndarray:
+        values = np.array([_token_hash(token) for token in sorted(tokens)], dtype=np.uint64)
+        permuted = (values[:, None] * self._a + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0)
+
+
+class _Entry:
+    __slots__ = ('created_at', 'ingredients', 'band_keys', 'recipes', 'required')
+
+    def __init__(self, created_at: float, ingredients: FrozenSet[str], band_keys: List[Tuple],
+                 recipes: List[Dict[str, Any]], required: List[FrozenSet[str]]):
+        self.created_at = created_at
+        self.ingredients = ingredients
+        self.band_keys = band_keys
+        self.recipes = recipes
+        self.required = required
+
+
+class SimilarRecipeCache:
+    """
+    Cache receptů podle podobnosti sady ingrediencí. Sady se indexují MinHash/LSH
+    (signatura rozdělená do pásem, shoda v libovolném pásmu = kandidát); z kandidátů
+    s Jaccardovou podobností nad prahem se vrátí recepty, jejichž potřebné suroviny
+    nová lednička celé obsahuje. In-memory v rámci workeru, jako RecipeCache.
+    """
+    def __init__(self, threshold: float = None, num_perm: int = None, bands: int = None,
+                 min_recipes: int = None, max_entries: int = None, ttl_seconds: int = None):
+        self.threshold = threshold if threshold is not None else float(os.getenv('SIMILAR_RECIPE_THRESHOLD', 0.6))
+        self.num_perm = num_perm if num_perm is not None else int(os.getenv('SIMILAR_RECIPE_NUM_PERM', 64))
+        self.bands = bands if bands is not None else int(os.getenv('SIMILAR_RECIPE_BANDS', 16))
+        self.min_recipes = min_recipes if min_recipes is not None else int(os.getenv('SIMILAR_RECIPE_MIN_RECIPES', 3))
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv('SIMILAR_RECIPE_CACHE_SIZE', 2048))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(os.getenv('SIMILAR_RECIPE_CACHE_TTL', 3600))
+        self.rows = max(1, self.num_perm // self.bands)
+
+        self._hasher = MinHasher(self.bands * self.rows)
+        self._entries: 'OrderedDict[str, _Entry]' = OrderedDict()
+        self._buckets: Dict[Tuple, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.served_recipes = 0
+
+    @staticmethod
+    def _context(max_time: Any, dietary_restrictions: List[str] = None) -> str:
+        # Recepty se sdílejí jen mezi požadavky se stejným časem a dietními omezeními
+        return f"{max_time}|{','.join(canonical_name_set(dietary_restrictions or []))}"
+
+    def _band_keys(self, context: str, ingredients: FrozenSet[str]) -> List[Tuple]:
+        signature = self._hasher.signature(ingredients)
+        return [(context, band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+                for band in range(self.bands)]
+
+    @staticmethod
+    def _required_ingredients(recipe: Dict[str, Any], fridge: FrozenSet[str]) -> FrozenSet[str]:
+        """
+        Suroviny, bez kterých recept nejde uvařit: ingredience z ledničky zmíněné v receptu
+        a známé ingredience ze slovníku, kromě běžných zásob. Maso a ryby jsou potřeba vždy,
+        i když je prompt počítá mezi zásoby.
+        """
+        text = ' , '.join(str(item.get('name', '')) if isinstance(item, dict) else str(item)
+                          for item in recipe.get('ingredients', []))
+        words = set(stem_key(text).split())
+        known = set(find_ingredients(text))
+        proteins = {name for name in known if ingredient_category(name) == 'maso'}
+        required = known | {key for key in fridge if set(key.split()) <= words}
+        return frozenset((required - _STAPLE_KEYS) | proteins)
+
+    def get(self, ingredient_names: List[str], max_time: Any,
+            dietary_restrictions: List[str] = None) -> Optional[List[Dict[str, Any]]]:
+        fridge = frozenset(ingredient_key(name) for name in ingredient_names) - {''}
+        if not fridge:
+            return None
+        context = self._context(max_time, dietary_restrictions)
+        band_keys = self._band_keys(context, fridge)
+
+        with self._lock:
+            candidates = set()
+            for band_key in band_keys:
+                candidates.update(self._buckets.get(band_key, ()))
+
+            now = time.monotonic()
+            scored = []
+            for key in candidates:
+                entry = self._entries[key]
+                if now - entry.created_at > self.ttl_seconds:
+                    self._remove(key)
+                    continue
+                similarity = len(fridge & entry.ingredients) / len(fridge | entry.ingredients)
+                if similarity >= self.threshold:
+                    scored.append((similarity, key))
+
+            recipes = []
+            seen_names = set()
+            for similarity, key in sorted(scored, reverse=True):
+                entry = self._entries[key]
+                self._entries.move_to_end(key)
+                for recipe, required in zip(entry.recipes, entry.required):
+                    if len(recipes) >= MAX_SERVED_RECIPES:
+                        break
+                    if not required <= fridge or recipe.get('name') in seen_names:
+                        continue
+                    seen_names.add(recipe.get('name'))
+                    recipes.append(dict(recipe, source='cache', cache_similarity=round(similarity, 3)))
+
+            hit = len(recipes) >= self.min_recipes
+            if hit:
+                self.hits += 1
+                self.served_recipes += len(recipes)
+            else:
+                self.misses += 1
+        get_metrics().inc('fridge_similar_recipe_cache_total', result='hit' if hit else 'miss')
+        return copy.deepcopy(recipes) if hit else None
+
+    def set(self, ingredient_names: List[str], max_time: Any, dietary_restrictions: List[str],
+            recipes: List[Dict[str, Any]]):
+        fridge = frozenset(ingredient_key(name) for name in ingredient_names) - {''}
+        if not fridge or not recipes:
+            return
+        context = self._context(max_time, dietary_restrictions)
+        key = f"{context}|{','.join(sorted(fridge))}"
+        entry = _Entry(time.monotonic(), fridge, self._band_keys(context, fridge),
+                       copy.deepcopy(recipes), [self._required_ingredients(recipe, fridge) for recipe in recipes])
+
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = entry
+            for band_key in entry.band_keys:
+                self._buckets.setdefault(band_key, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for band_key in entry.band_keys:
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'worker_pid': os.getpid(),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'served_recipes': self.served_recipes,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'threshold': self.threshold,
+                'bands': self.bands,
+                'rows': self.rows,
+                'ttl_seconds': self.ttl_seconds
+            }
+
+
+def _create_similar_recipe_cache() -> Optional[SimilarRecipeCache]:
+    return None if env_disabled('SIMILAR_RECIPE_CACHE_ENABLED') else SimilarRecipeCache()
+
+
+process_registry().register('similar_recipe_cache', _create_similar_recipe_cache)
+
+
+def get_similar_recipe_cache() -> Optional[SimilarRecipeCache]:
+    return process_registry().get('similar_recipe_cache')
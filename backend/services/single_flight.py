@@ -0,0 +1,210 @@
+import os
+import copy
+import json
+import time
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+from services.upstream_guard import UpstreamUnavailable
+from utils.metrics import get_metrics
+from utils.process_utils import connect_wal, env_disabled, pid_alive, process_registry
+
+# Rezerva pod timeoutem gunicorn workeru na záložní odpověď po vypršení čekání
+_WORKER_TIMEOUT_MARGIN = 5.0
+
+
+def _worker_wait_limit() -> float:
+    return max(1.0, float(os.getenv('GUNICORN_TIMEOUT', 30)) - _WORKER_TIMEOUT_MARGIN)
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Slučuje souběžná volání se stejným klíčem do jednoho. Vlákna workeru čekají na
+    Event vedoucího vlákna; mezi workery se vedoucí volí přes řádek v SQLite a
+    ostatní workery čekají na jeho výsledek (jako JobQueue, pollingem s kontrolou pid).
+    Sdílí se jen výsledek právě probíhajícího volání - kdo přijde po jeho dokončení,
+    volá znovu; není to cache. Čekání je omezené max_wait pod timeoutem workeru, po
+    jeho uplynutí se vyhodí UpstreamUnavailable a volající použije lokální náhradu.
+    """
+    def __init__(self, db_path: str = None, poll_interval: float = None,
+                 lease_seconds: float = None, result_ttl: float = None, max_wait: float = None):
+        self.db_path = db_path or os.getenv('SINGLE_FLIGHT_PATH', os.path.join('cache', 'single_flight.sqlite3'))
+        self.poll_interval = poll_interval if poll_interval is not None else float(os.getenv('SINGLE_FLIGHT_POLL', 0.1))
+        self.lease_seconds = (lease_seconds if lease_seconds is not None
+                              else float(os.getenv('SINGLE_FLIGHT_LEASE', _worker_wait_limit())))
+        self.max_wait = min(max_wait if max_wait is not None else _worker_wait_limit(), self.lease_seconds)
+        self.result_ttl = result_ttl if result_ttl is not None else float(os.getenv('SINGLE_FLIGHT_RESULT_TTL', 5))
+
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._init_db()
+
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def _init_db(self):
+        conn = connect_wal(self.db_path)
+        try:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS flights ('
+                'key TEXT PRIMARY KEY, pid INTEGER NOT NULL, started_at REAL NOT NULL, '
+                'finished_at REAL, result TEXT)'
+            )
+        finally:
+            conn.close()
+
+    def do(self, key: str, func: Callable[..., Any], *args,
+           shareable: Callable[[Any], bool] = None) -> Any:
+        """
+        Zavolá func(*args), nebo počká na stejné probíhající volání. Ostatním workerům
+        se předá jen výsledek, pro který shareable(result) vrátí True (bez záložních
+        a neúplných výsledků).
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            get_metrics().inc('fridge_single_flight_total', role='thread_follower')
+            if not flight.done.wait(self.max_wait):
+                self._wait_timeout()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result)
+
+        try:
+            result = self._do_shared(key, func, args, shareable)
+            # Následovníci dostanou kopii, volající vedoucího může výsledek upravovat
+            flight.result = copy.deepcopy(result)
+            return result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def _wait_timeout(self):
+        # Volat upstream teď by se do timeoutu workeru už nevešlo
+        get_metrics().inc('fridge_single_flight_total', role='wait_timeout')
+        raise UpstreamUnavailable("Souběžné volání OpenAI trvá příliš dlouho")
+
+    def _do_shared(self, key: str, func: Callable[..., Any], args: tuple,
+                   shareable: Optional[Callable[[Any], bool]]) -> Any:
+        deadline = time.monotonic() + self.max_wait
+        flight_started = None
+        while True:
+            role, result, flight_started = self._claim(key, flight_started)
+            if role == 'leader':
+                break
+            if role == 'done':
+                get_metrics().inc('fridge_single_flight_total', role='worker_follower')
+                return result
+            if time.monotonic() >= deadline:
+                self._wait_timeout()
+            time.sleep(min(self.poll_interval, max(0.0, deadline - time.monotonic())))
+
+        get_metrics().inc('fridge_single_flight_total', role='leader')
+        try:
+            result = func(*args)
+        except Exception:
+            self._release(key)
+            raise
+        if shareable is None or shareable(result):
+            self._publish(key, result)
+        else:
+            self._release(key)
+        return result
+
+    def _claim(self, key: str, flight_started: Optional[float]) -> Tuple[str, Any, Optional[float]]:
+        """
+        Vrací (role, výsledek, started_at sledovaného volání). Dokončený výsledek dostane
+        jen ten, kdo na totéž volání (stejné started_at) už čekal.
+        """
+        now = time.time()
+        conn = connect_wal(self.db_path)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT pid, started_at, finished_at, result FROM flights WHERE key = ?',
+                               (key,)).fetchone()
+            if row is None:
+                conn.execute('DELETE FROM flights WHERE finished_at IS NOT NULL AND finished_at < ?',
+                             (now - self.result_ttl,))
+                conn.execute('INSERT INTO flights (key, pid, started_at) VALUES (?, ?, ?)',
+                             (key, os.getpid(), now))
+                conn.execute('COMMIT')
+                return 'leader', None, now
+
+            pid, started_at, finished_at, result = row
+            if finished_at is not None and started_at == flight_started:
+                conn.execute('COMMIT')
+                return 'done', json.loads(result), started_at
+            if finished_at is None and now - started_at <= self.lease_seconds and pid_alive(pid):
+                conn.execute('COMMIT')
+                return 'wait', None, started_at
+
+            # Dokončené dřívější volání, nebo vedoucí worker skončil či překročil lhůtu - převezmeme vedení
+            conn.execute('UPDATE flights SET pid = ?, started_at = ?, finished_at = NULL, result = NULL '
+                         'WHERE key = ?', (os.getpid(), now, key))
+            conn.execute('COMMIT')
+            return 'leader', None, now
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def _publish(self, key: str, result: Any):
+        try:
+            payload = json.dumps(result, ensure_ascii=False)
+        except (TypeError, ValueError):
+            self._release(key)
+            return
+        conn = connect_wal(self.db_path)
+        try:
+            conn.execute('UPDATE flights SET finished_at = ?, result = ? WHERE key = ? AND pid = ?',
+                         (time.time(), payload, key, os.getpid()))
+        finally:
+            conn.close()
+
+    def _release(self, key: str):
+        conn = connect_wal(self.db_path)
+        try:
+            conn.execute('DELETE FROM flights WHERE key = ? AND pid = ? AND finished_at IS NULL',
+                         (key, os.getpid()))
+        finally:
+            conn.close()
+
+
+def _create_single_flight() -> Optional[SingleFlight]:
+    return None if env_disabled('SINGLE_FLIGHT_ENABLED') else SingleFlight()
+
+
+process_registry().register('single_flight', _create_single_flight)
+
+
+def get_single_flight() -> Optional[SingleFlight]:
+    return process_registry().get('single_flight')
+
+
+def coalesce(key: str, func: Callable[..., Any], *args, shareable: Callable[[Any], bool] = None) -> Any:
+    """
+    Zavolá func(*args), pokud už stejný klíč neprobíhá jinde; jinak počká na jeho výsledek.
+    """
+    single_flight = get_single_flight()
+    if single_flight is None:
+        return func(*args)
+    return single_flight.do(key, func, *args, shareable=shareable)
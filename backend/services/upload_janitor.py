@@ -0,0 +1,153 @@
+import os
+import json
+import time
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from services.upload_store import UploadStore
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class UploadJanitor:
+    """
+    Periodický úklid složky uploads/. Běží ve vlákně každého workeru, ale úklid
+    provádí jen držitel zámku (leader); po pádu leadera zámek převezme jiný worker.
+    Adresář neprochází: nejstarší soubory vybírá z indexu UploadStore po dávkách
+    (ORDER BY last_seen LIMIT batch_size) a za jeden běh smaže nejvýš max_batches dávek.
+    """
+    def __init__(self, upload_store: UploadStore,
+                 max_age_hours: float = None, max_total_mb: float = None,
+                 interval: float = None, batch_size: int = None, max_batches: int = None,
+                 batch_pause: float = None, lock_path: str = None, stats_path: str = None):
+        self.upload_store = upload_store
+        self.max_age_hours = max_age_hours if max_age_hours is not None else float(os.getenv('UPLOAD_MAX_AGE_HOURS', 24))
+        self.max_total_mb = max_total_mb if max_total_mb is not None else float(os.getenv('UPLOAD_MAX_TOTAL_MB', 500))
+        self.interval = interval if interval is not None else float(os.getenv('JANITOR_INTERVAL', 600))
+        self.batch_size = batch_size if batch_size is not None else int(os.getenv('JANITOR_BATCH_SIZE', 500))
+        self.max_batches = max_batches if max_batches is not None else int(os.getenv('JANITOR_MAX_BATCHES', 20))
+        self.batch_pause = batch_pause if batch_pause is not None else float(os.getenv('JANITOR_BATCH_PAUSE', 0.01))
+        self.lock_path = lock_path or os.getenv('JANITOR_LOCK_PATH', os.path.join('cache', 'janitor.lock'))
+        self.stats_path = stats_path or os.getenv('JANITOR_STATS_PATH', os.path.join('cache', 'janitor_stats.json'))
+        self._lock_file = None
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name='upload-janitor', daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            try:
+                if self._acquire_leadership():
+                    self.run_once()
+            except Exception as e:
+                print(f"Chyba při úklidu uploads: {e}")
+            time.sleep(self.interval)
+
+    def _acquire_leadership(self) -> bool:
+        if self._lock_file is not None:
+            return True
+        if fcntl is None:
+            return True
+
+        directory = os.path.dirname(self.lock_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        # Zámek držíme po celou dobu života workeru, OS ho uvolní při jeho ukončení
+        self._lock_file = lock_file
+        return True
+
+    def run_once(self) -> Dict[str, Any]:
+        started = time.time()
+        result = {'deleted_files': 0, 'deleted_bytes': 0, 'batches': 0}
+        cutoff = started - self.max_age_hours * 3600 if self.max_age_hours else None
+        max_bytes = int(self.max_total_mb * 1024 * 1024) if self.max_total_mb else None
+        total = self.upload_store.stored_bytes()
+
+        while result['batches'] < self.max_batches:
+            batch = self.upload_store.oldest(self.batch_size, seen_before=cutoff) if cutoff is not None else []
+            if not batch and max_bytes is not None and total > max_bytes:
+                batch = self._over_limit(self.upload_store.oldest(self.batch_size), total - max_bytes)
+            if not batch:
+                break
+            deleted_files, deleted_bytes = self._delete_batch(batch)
+            result['deleted_files'] += deleted_files
+            result['deleted_bytes'] += deleted_bytes
+            result['batches'] += 1
+            total -= deleted_bytes
+            if not deleted_files:
+                # Nic nešlo smazat - stejnou dávku by vybral i další dotaz
+                break
+            time.sleep(self.batch_pause)
+
+        result['remaining_bytes'] = max(total, 0)
+        if result['deleted_files']:
+            print(f"🧹 Úklid uploads: smazáno {result['deleted_files']} souborů ({result['deleted_bytes']} B)")
+
+        stats = self.stats() or {'runs': 0, 'files_reclaimed': 0, 'bytes_reclaimed': 0}
+        stats.update({
+            'runs': stats['runs'] + 1,
+            'files_reclaimed': stats['files_reclaimed'] + result['deleted_files'],
+            'bytes_reclaimed': stats['bytes_reclaimed'] + result['deleted_bytes'],
+            'leader_pid': os.getpid(),
+            'last_run': started,
+            'last_duration': round(time.time() - started, 3),
+            'last_result': result
+        })
+        self._write_stats(stats)
+        return result
+
+    @staticmethod
+    def _over_limit(batch: List[Tuple[str, int]], excess: int) -> List[Tuple[str, int]]:
+        # Z nejstarších souborů jen tolik, kolik je potřeba pod limit
+        selected = []
+        for filename, size in batch:
+            if excess <= 0:
+                break
+            selected.append((filename, size))
+            excess -= size
+        return selected
+
+    def _delete_batch(self, batch: List[Tuple[str, int]]) -> Tuple[int, int]:
+        deleted_names = []
+        deleted_bytes = 0
+        for filename, size in batch:
+            try:
+                os.remove(os.path.join(self.upload_store.upload_folder, filename))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                # Řádek necháme v indexu, příští běh to zkusí znovu
+                print(f"Chyba při mazání souboru {filename}: {e}")
+                continue
+            deleted_names.append(filename)
+            deleted_bytes += size
+        if deleted_names:
+            self.upload_store.forget(deleted_names)
+        return len(deleted_names), deleted_bytes
+
+    def _write_stats(self, stats: Dict[str, Any]):
+        directory = os.path.dirname(self.stats_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.stats_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as stats_file:
+            json.dump(stats, stats_file)
+        os.replace(temp_path, self.stats_path)
+
+    def stats(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.stats_path, 'r', encoding='utf-8') as stats_file:
+                return json.load(stats_file)
+        except (OSError, json.JSONDecodeError):
+            return None
+
@@ -0,0 +1,145 @@
+import os
+import time
+import sqlite3
+from typing import Any, Dict, List, Optional, Tuple
+from utils.file_utils import persist_image_async
+from utils.process_utils import connect_wal
+
+_EXTENSIONS = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/gif': 'gif',
+    'image/bmp': 'bmp',
+    'image/webp': 'webp'
+}
+
+
+class UploadStore:
+    """
+    Úložiště nahraných fotek adresované obsahem: soubor se jmenuje podle SHA-256,
+    takže identické fotky se ukládají jen jednou. Metadata (velikost, rozměry,
+    první výskyt, stav analýzy) jsou v malém SQLite indexu.
+    """
+    def __init__(self, upload_folder: str, index_path: str = None, persist: bool = None):
+        self.upload_folder = upload_folder
+        self.index_path = index_path or os.getenv('UPLOAD_INDEX_PATH', os.path.join('cache', 'uploads.sqlite3'))
+        self.persist = persist if persist is not None else \
+            os.getenv('PERSIST_UPLOADS', 'true').lower() not in ('0', 'false', 'no')
+
+        directory = os.path.dirname(self.index_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._init_db()
+
+    def _init_db(self):
+        conn = connect_wal(self.index_path)
+        try:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS uploads ('
+                'hash TEXT PRIMARY KEY, filename TEXT NOT NULL, mime_type TEXT NOT NULL, '
+                'size INTEGER NOT NULL, width INTEGER, height INTEGER, original_name TEXT, '
+                'first_seen REAL NOT NULL, last_seen REAL NOT NULL, upload_count INTEGER NOT NULL, '
+                'analysis_status TEXT NOT NULL, analyzed_at REAL)'
+            )
+            # Janitor vybírá nejstarší soubory podle posledního nahrání
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_uploads_last_seen ON uploads(last_seen)')
+        finally:
+            conn.close()
+
+    @staticmethod
+    def filename_for(content_hash: str, mime_type: str) -> str:
+        return f"{content_hash}.{_EXTENSIONS.get(mime_type, 'bin')}"
+
+    def store(self, data: bytes, content_hash: str, image_info: Dict[str, Any],
+              original_name: str = None) -> Dict[str, Any]:
+        filename = self.filename_for(content_hash, image_info['mime_type'])
+        file_path = os.path.join(self.upload_folder, filename)
+        now = time.time()
+
+        conn = connect_wal(self.index_path)
+        try:
+            existing = conn.execute('SELECT analysis_status FROM uploads WHERE hash = ?', (content_hash,)).fetchone()
+            conn.execute(
+                'INSERT INTO uploads (hash, filename, mime_type, size, width, height, original_name, '
+                'first_seen, last_seen, upload_count, analysis_status) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1, ?) '
+                'ON CONFLICT(hash) DO UPDATE SET last_seen = excluded.last_seen, '
+                'upload_count = upload_count + 1',
+                (content_hash, filename, image_info['mime_type'], len(data), image_info.get('width'),
+                 image_info.get('height'), original_name, now, now, 'pending')
+            )
+        finally:
+            conn.close()
+
+        if self.persist and not os.path.exists(file_path):
+            persist_image_async(data, filename, self.upload_folder)
+
+        return {
+            'filename': filename,
+            'duplicate': existing is not None,
+            'analysis_status': existing[0] if existing else 'pending'
+        }
+
+    def mark_analysis(self, content_hash: str, status: str):
+        conn = connect_wal(self.index_path)
+        try:
+            conn.execute('UPDATE uploads SET analysis_status = ?, analyzed_at = ? WHERE hash = ?',
+                         (status, time.time(), content_hash))
+        finally:
+            conn.close()
+
+    def get(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        conn = connect_wal(self.index_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            row = conn.execute('SELECT * FROM uploads WHERE hash = ?', (content_hash,)).fetchone()
+        finally:
+            conn.close()
+        return dict(row) if row else None
+
+    def oldest(self, limit: int, seen_before: float = None) -> List[Tuple[str, int]]:
+        """
+        Nejdéle nenahrané soubory jako (filename, size), volitelně jen ty s last_seen před seen_before.
+        """
+        conn = connect_wal(self.index_path)
+        try:
+            if seen_before is None:
+                return conn.execute('SELECT filename, size FROM uploads ORDER BY last_seen LIMIT ?',
+                                    (limit,)).fetchall()
+            return conn.execute('SELECT filename, size FROM uploads WHERE last_seen < ? ORDER BY last_seen LIMIT ?',
+                                (seen_before, limit)).fetchall()
+        finally:
+            conn.close()
+
+    def stored_bytes(self) -> int:
+        conn = connect_wal(self.index_path)
+        try:
+            return conn.execute('SELECT COALESCE(SUM(size), 0) FROM uploads').fetchone()[0]
+        finally:
+            conn.close()
+
+    def forget(self, filenames):
+        conn = connect_wal(self.index_path)
+        try:
+            conn.executemany('DELETE FROM uploads WHERE filename = ?', [(name,) for name in filenames])
+        finally:
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        conn = connect_wal(self.index_path)
+        try:
+            files, total_bytes, uploads = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(upload_count), 0) FROM uploads'
+            ).fetchone()
+            by_status = dict(conn.execute(
+                'SELECT analysis_status, COUNT(*) FROM uploads GROUP BY analysis_status'
+            ).fetchall())
+        finally:
+            conn.close()
+        return {
+            'unique_files': files,
+            'stored_bytes': total_bytes,
+            'total_uploads': uploads,
+            'deduplicated_uploads': uploads - files,
+            'analysis_status': by_status
+        }
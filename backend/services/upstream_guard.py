@@ -0,0 +1,227 @@
+import os
+import time
+import threading
+from collections import deque
+from typing import Any, Dict
+from utils.metrics import get_metrics
+from utils.process_utils import process_registry
+
+
+class UpstreamUnavailable(Exception):
+    """
+    OpenAI je přetížené nebo nedostupné (otevřený jistič, plný limit) - volající má
+    použít lokální náhradu místo čekání.
+    """
+
+
+class AdaptiveLimiter:
+    """
+    Omezuje počet souběžných volání upstreamu v procesu. Limit roste o 1/limit po každém
+    rychlém úspěchu a násobně klesá při chybě nebo když latence výrazně přesáhne
+    dlouhodobé minimum (AIMD jako u TCP).
+    """
+    def __init__(self, initial_limit: float = None, min_limit: int = None, max_limit: int = None,
+                 queue_timeout: float = None, latency_tolerance: float = None):
+        self.min_limit = min_limit if min_limit is not None else int(os.getenv('OPENAI_MIN_CONCURRENCY', 2))
+        self.max_limit = max_limit if max_limit is not None else int(os.getenv('OPENAI_MAX_CONCURRENCY', 32))
+        initial = float(initial_limit if initial_limit is not None else os.getenv('OPENAI_INITIAL_CONCURRENCY', 8))
+        self.limit = min(max(initial, self.min_limit), self.max_limit)
+        self.queue_timeout = queue_timeout if queue_timeout is not None else float(os.getenv('OPENAI_QUEUE_TIMEOUT', 5))
+        self.latency_tolerance = latency_tolerance if latency_tolerance is not None else float(os.getenv('OPENAI_LATENCY_TOLERANCE', 2.5))
+        self.in_flight = 0
+        self.shed = 0
+        self._min_latency = None
+        self._latency_ewma = None
+        self._condition = threading.Condition()
+
+    def acquire(self) -> bool:
+        deadline = time.monotonic() + self.queue_timeout
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.shed += 1
+                    return False
+                self._condition.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    def release(self, latency: float, ok: bool):
+        with self._condition:
+            self.in_flight -= 1
+            if ok:
+                # Minimum pomalu "zapomíná", aby se limit přizpůsobil i trvale pomalejšímu API
+                self._min_latency = latency if self._min_latency is None else min(latency, self._min_latency * 1.01)
+                self._latency_ewma = latency if self._latency_ewma is None else 0.8 * self._latency_ewma + 0.2 * latency
+                if self._latency_ewma > self._min_latency * self.latency_tolerance:
+                    self.limit = max(self.min_limit, self.limit * 0.9)
+                else:
+                    self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            else:
+                self.limit = max(self.min_limit, self.limit * 0.7)
+            self._condition.notify()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                'limit': int(self.limit),
+                'in_flight': self.in_flight,
+                'shed': self.shed,
+                'min_latency': round(self._min_latency, 3) if self._min_latency is not None else None,
+                'latency_ewma': round(self._latency_ewma, 3) if self._latency_ewma is not None else None
+            }
+
+
+class CircuitBreaker:
+    """
+    Jistič: po sérii chyb (nebo vysokém podílu chyb v posledních voláních) se otevře
+    a volání okamžitě odmítá. Po cooldown pustí jedno zkušební volání (half-open).
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, window: int = None, failure_rate: float = None, min_calls: int = None,
+                 consecutive_failures: int = None, cooldown: float = None):
+        self.window = window if window is not None else int(os.getenv('OPENAI_BREAKER_WINDOW', 20))
+        self.failure_rate = failure_rate if failure_rate is not None else float(os.getenv('OPENAI_BREAKER_FAILURE_RATE', 0.5))
+        self.min_calls = min_calls if min_calls is not None else int(os.getenv('OPENAI_BREAKER_MIN_CALLS', 10))
+        self.consecutive_failures = consecutive_failures if consecutive_failures is not None else int(os.getenv('OPENAI_BREAKER_CONSECUTIVE', 5))
+        self.cooldown = cooldown if cooldown is not None else float(os.getenv('OPENAI_BREAKER_COOLDOWN', 30))
+        self.state = self.CLOSED
+        self.rejected = 0
+        self._outcomes = deque(maxlen=self.window)
+        self._failures_in_row = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                self._transition(self.HALF_OPEN)
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, ok: bool):
+        with self._lock:
+            self._outcomes.append(ok)
+            self._failures_in_row = 0 if ok else self._failures_in_row + 1
+
+            if self.state == self.HALF_OPEN:
+                self._probe_in_flight = False
+                self._transition(self.CLOSED if ok else self.OPEN)
+                return
+
+            failures = self._outcomes.count(False)
+            if self.state == self.CLOSED and (
+                    self._failures_in_row >= self.consecutive_failures or
+                    (len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_rate)):
+                self._transition(self.OPEN)
+
+    def cancel_probe(self):
+        # Zkušební volání se nedočkalo místa v limiteru - další volání může zkusit znovu
+        with self._lock:
+            self._probe_in_flight = False
+
+    def is_open(self) -> bool:
+        with self._lock:
+            return self.state == self.OPEN and time.monotonic() - self._opened_at < self.cooldown
+
+    def _transition(self, state: str):
+        if state == self.state:
+            if state == self.OPEN:
+                self._opened_at = time.monotonic()
+            return
+        print(f"⚡ Jistič OpenAI: {self.state} -> {state}")
+        self.state = state
+        if state == self.OPEN:
+            self._opened_at = time.monotonic()
+        elif state == self.CLOSED:
+            self._outcomes.clear()
+            self._failures_in_row = 0
+        get_metrics().inc('fridge_breaker_transitions_total', state=state)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'state': self.state,
+                'rejected': self.rejected,
+                'recent_calls': len(self._outcomes),
+                'recent_failures': self._outcomes.count(False),
+                'open_for': round(max(0.0, self.cooldown - (time.monotonic() - self._opened_at)), 1)
+                if self.state == self.OPEN else 0.0
+            }
+
+
+class UpstreamSlot:
+    """
+    Jedno volání upstreamu. Latence pro limiter se měří do mark_status() (u streamu
+    tedy do hlaviček odpovědi), ne do konce přenosu.
+    """
+    FAILURE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+    def __init__(self, guard: 'UpstreamGuard'):
+        self.guard = guard
+        self.started = time.monotonic()
+        self.latency = None
+        self.ok = True
+
+    def mark_status(self, status_code: int):
+        self.latency = time.monotonic() - self.started
+        self.ok = status_code not in self.FAILURE_STATUSES
+
+    def __enter__(self) -> 'UpstreamSlot':
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        # GeneratorExit (klient zavřel stream) není chyba upstreamu
+        if exc_type is not None and issubclass(exc_type, Exception):
+            self.ok = False
+        latency = self.latency if self.latency is not None else time.monotonic() - self.started
+        self.guard.release(latency, self.ok)
+        return False
+
+
+class UpstreamGuard:
+    def __init__(self, limiter: AdaptiveLimiter = None, breaker: CircuitBreaker = None):
+        self.limiter = limiter or AdaptiveLimiter()
+        self.breaker = breaker or CircuitBreaker()
+
+    def slot(self) -> UpstreamSlot:
+        """
+        Rezervuje místo pro volání; při otevřeném jističi nebo plném limitu
+        vyhodí UpstreamUnavailable.
+        """
+        if not self.breaker.allow():
+            get_metrics().inc('fridge_upstream_shed_total', reason='breaker_open')
+            raise UpstreamUnavailable("OpenAI je dočasně nedostupné (jistič otevřen)")
+        if not self.limiter.acquire():
+            self.breaker.cancel_probe()
+            get_metrics().inc('fridge_upstream_shed_total', reason='concurrency_limit')
+            raise UpstreamUnavailable("OpenAI je přetížené, překročen limit souběžných volání")
+        return UpstreamSlot(self)
+
+    def release(self, latency: float, ok: bool):
+        self.limiter.release(latency, ok)
+        self.breaker.record(ok)
+
+    def available(self) -> bool:
+        return not self.breaker.is_open()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'worker_pid': os.getpid(),
+            'breaker': self.breaker.stats(),
+            'limiter': self.limiter.stats()
+        }
+
+
+process_registry().register('upstream_guard', UpstreamGuard)
+
+
+def get_upstream_guard() -> UpstreamGuard:
+    return process_registry().get('upstream_guard')
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# Moduly backendu se importují jako balíčky nejvyšší úrovně (services, utils), jako v app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Čítače metrik se zapisují na disk - testy nesmí zakládat cache/ v pracovním adresáři
+os.environ.setdefault('METRICS_DIR', tempfile.mkdtemp(prefix='fridge-metrics-'))
@@ -0,0 +1,54 @@
+import sqlite3
+from services.analysis_cache import AnalysisCache
+
+
+def _cache(tmp_path, **kwargs):
+    options = dict(ttl_seconds=60, max_bytes=1024 * 1024, touch_interval=300)
+    options.update(kwargs)
+    return AnalysisCache(db_path=str(tmp_path / 'analysis_cache.sqlite3'), **options)
+
+
+def _accessed_at(cache, key):
+    conn = sqlite3.connect(cache.db_path)
+    try:
+        return conn.execute('SELECT accessed_at FROM entries WHERE key = ?', (key,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_make_key_depends_on_version():
+    assert AnalysisCache.make_key(b'obr', 'gpt-4o', 'v1') != AnalysisCache.make_key(b'obr', 'gpt-4o', 'v2')
+    assert AnalysisCache.make_key(b'obr', 'a', 'b') == AnalysisCache.make_key(b'obr', 'a', 'b')
+
+
+def test_round_trip_and_expiry(tmp_path):
+    cache = _cache(tmp_path)
+    cache.set('k', [{'name': 'mrkev'}])
+    assert cache.get('k') == [{'name': 'mrkev'}]
+    assert cache.get('jiny') is None
+
+    expired = _cache(tmp_path, ttl_seconds=-1)
+    assert expired.get('k') is None
+
+
+def test_hits_do_not_write_until_touch_interval(tmp_path):
+    cache = _cache(tmp_path)
+    cache.set('k', [1])
+    stored = _accessed_at(cache, 'k')
+    cache.get('k')
+    assert _accessed_at(cache, 'k') == stored
+
+    eager = _cache(tmp_path, touch_interval=0)
+    eager.get('k')
+    assert _accessed_at(eager, 'k') > stored
+
+
+def test_size_limit_evicts_least_recently_used(tmp_path):
+    cache = _cache(tmp_path, max_bytes=40, touch_interval=0)
+    cache.set('a', 'x' * 15)
+    cache.set('b', 'y' * 15)
+    cache.get('a')
+    cache.set('c', 'z' * 15)
+    assert cache.get('b') is None
+    assert cache.get('a') == 'x' * 15
+    assert cache.stats()['entries'] == 2
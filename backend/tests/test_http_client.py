@@ -0,0 +1,80 @@
+import requests
+import pytest
+from services import http_client
+from services.http_client import HttpClient
+
+
+class _FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(http_client.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(http_client.time, 'sleep', clock.sleep)
+    return clock
+
+
+def _client(responses, clock, duration=0.0, **kwargs):
+    options = dict(connect_timeout=5, read_timeout=25, max_retries=2, backoff_base=0.5, backoff_max=8,
+                   total_timeout=25, min_attempt=5)
+    options.update(kwargs)
+    client = HttpClient(**options)
+    calls = []
+
+    def post(url, **post_kwargs):
+        calls.append(post_kwargs['timeout'])
+        clock.now += duration
+        result = responses.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    client.session.post = post
+    return client, calls
+
+
+def test_retries_fast_failures_and_shrinks_timeouts(clock):
+    client, calls = _client([_FakeResponse(503, {'Retry-After': '2'}), _FakeResponse(200)], clock, duration=1)
+    assert client.post('http://upstream').status_code == 200
+    assert calls == [(5, 25), (5, 25 - 3)]
+
+
+def test_no_retry_when_budget_cannot_fit_another_attempt(clock):
+    client, calls = _client([_FakeResponse(502), _FakeResponse(200)], clock, duration=21)
+    assert client.post('http://upstream').status_code == 502
+    assert len(calls) == 1
+
+
+def test_connection_errors_respect_max_retries(clock):
+    error = requests.ConnectionError('odmítnuto')
+    client, calls = _client([error, error, error], clock, max_retries=2)
+    with pytest.raises(requests.ConnectionError):
+        client.post('http://upstream')
+    assert len(calls) == 3
+
+
+def test_total_time_stays_within_budget(clock):
+    client, calls = _client([_FakeResponse(429)] * 5, clock, duration=4, max_retries=4, backoff_base=4)
+    start = clock.now
+    client.post('http://upstream')
+    assert clock.now - start <= 25
+    assert len(calls) < 5
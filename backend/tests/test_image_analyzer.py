@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from services.image_analyzer import ImageAnalyzer
+
+
+@pytest.fixture
+def analyzer():
+    return ImageAnalyzer(use_openai=False)
+
+
+def _solid(height, width, rgb):
+    image = np.zeros((height, width, 3), dtype=np.float32)
+    image[...] = np.array(rgb, dtype=np.float32) / 255.0
+    return image
+
+
+@pytest.mark.parametrize('height, width', [(1, 1), (3, 2), (10, 200), (200, 10)])
+def test_images_smaller_than_grid_are_one_tile(analyzer, height, width):
+    detected = analyzer._detect_objects(_solid(height, width, (240, 120, 20)))
+    assert len(detected) <= 1
+    for obj in detected:
+        assert obj['region'] == {'x': 0, 'y': 0, 'w': width, 'h': height, 'confidence': obj['region']['confidence']}
+
+
+def test_large_image_is_tiled(analyzer):
+    detected = analyzer._detect_objects(_solid(256, 256, (240, 120, 20)))
+    assert len(detected) > 1
+    assert all(obj['region']['w'] == 64 and obj['region']['h'] == 64 for obj in detected)
+
+
+def test_empty_image(analyzer):
+    assert analyzer._detect_objects(np.zeros((0, 0, 3), dtype=np.float32)) == []
+
+
+def test_offline_analysis_skips_near_duplicate_lookup(analyzer, monkeypatch):
+    def unexpected(*args):
+        raise AssertionError('hash se bez OpenAI nemá počítat')
+
+    monkeypatch.setattr(analyzer, '_image_hash', unexpected)
+    monkeypatch.setattr(analyzer, '_near_duplicate_get', unexpected)
+    monkeypatch.setattr(analyzer, '_analyze_offline', lambda image_bytes: [{'name': 'mrkev'}])
+    assert analyzer.analyze_fridge_bytes(b'obrazek') == [{'name': 'mrkev'}]
@@ -0,0 +1,32 @@
+import io
+import pytest
+from PIL import Image
+from services.image_preprocessor import probe_image, sniff_mime_type
+
+
+def _encode(fmt, size=(40, 30)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 120, 30)).save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('fmt, mime_type', [('PNG', 'image/png'), ('JPEG', 'image/jpeg'), ('GIF', 'image/gif')])
+def test_probe_reads_type_and_size(fmt, mime_type):
+    assert probe_image(_encode(fmt)) == {'mime_type': mime_type, 'width': 40, 'height': 30}
+
+
+@pytest.mark.parametrize('fmt', ['PNG', 'JPEG'])
+def test_trailing_data_after_end_marker_is_accepted(fmt):
+    data = _encode(fmt) + b'\0' * 64 + b'XMP trailer from the editor'
+    assert probe_image(data)['width'] == 40
+
+
+@pytest.mark.parametrize('fmt', ['PNG', 'JPEG'])
+def test_truncated_images_are_rejected(fmt):
+    data = _encode(fmt)
+    assert probe_image(data[:len(data) // 2]) is None
+
+
+def test_unknown_data():
+    assert sniff_mime_type(b'%PDF-1.7') == 'application/octet-stream'
+    assert probe_image(b'%PDF-1.7') is None
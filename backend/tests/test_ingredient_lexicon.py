@@ -0,0 +1,68 @@
+import pytest
+from utils.ingredient_lexicon import (canonical_ingredient_name, detect_appliances, find_ingredients,
+                                      ingredient_category, recipe_tags, stem_key)
+
+
+def _tags(*ingredients, prep_time=30):
+    return recipe_tags({'ingredients': list(ingredients), 'prep_time': prep_time})
+
+
+def test_stem_key_folds_diacritics_and_endings():
+    assert stem_key('Rajčata') == stem_key('rajče') == stem_key('rajcata')
+    assert stem_key('kuřecích prsou') == stem_key('kuřecí prsa')
+    assert stem_key('hovězího masa') == stem_key('hovězí maso')
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('200 g kuřecích prsou', 'kuřecí prsa'),
+    ('200 g hovězího masa', 'hovězí maso'),
+    ('400 g vepřového masa', 'vepřové maso'),
+    ('filet z lososa', 'losos'),
+    ('2 lžíce olivového oleje', 'olivový olej'),
+    ('3 vejce', 'vajíčka'),
+])
+def test_find_ingredients_matches_inflected_forms(text, expected):
+    assert find_ingredients(text) == [expected]
+
+
+def test_find_ingredients_keeps_order_and_deduplicates():
+    assert find_ingredients('mrkev, cibule, mrkve a rajče') == ['mrkev', 'cibule', 'rajčata']
+
+
+@pytest.mark.parametrize('name, category', [
+    ('olivový olej', 'koření'),
+    ('celer', 'zelenina'),
+    ('paprikový prášek', 'koření'),
+    ('paprika', 'zelenina'),
+    ('kuřecí prsa', 'maso'),
+    ('čerstvá mrkev', 'zelenina'),
+    ('dračí ovoce', 'ostatní'),
+])
+def test_ingredient_category(name, category):
+    assert ingredient_category(name) == category
+
+
+def test_canonical_ingredient_name_unknown_is_none():
+    assert canonical_ingredient_name('vejce') == 'vajíčka'
+    assert canonical_ingredient_name('dračí ovoce') is None
+
+
+@pytest.mark.parametrize('ingredient', ['200 g hovězího masa', '400 g vepřového masa', '200 g kuřecích prsou',
+                                        'plátky šunky', 'tuňáka v konzervě'])
+def test_meat_recipes_are_not_vegetarian(ingredient):
+    assert 'vegetariánské' not in _tags(ingredient, 'rýže')
+
+
+def test_chicken_and_fish_tags_from_inflected_forms():
+    assert 'kuřecí' in _tags('200 g kuřecích prsou')
+    assert 'rybí' in _tags({'name': 'lososa', 'amount': '200', 'unit': 'g'})
+    assert 'rybí' not in _tags('rybízový džem')
+
+
+def test_vegetable_recipe_tags():
+    assert _tags('mrkev', 'celer', 'olivový olej', prep_time=15) == ['rychlé', 'vegetariánské', 'zdravé', 'zeleninové']
+
+
+def test_detect_appliances():
+    recipe = {'instructions': ['Rozmixujte polévku.', 'Pečte v troubě 20 minut.']}
+    assert detect_appliances(recipe) == ['elektrický sporák', 'mixér', 'trouba']
@@ -0,0 +1,38 @@
+import threading
+import pytest
+from services.job_queue import JobQueue, JobQueueFull
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(db_path=str(tmp_path / 'jobs.sqlite3'), max_workers=1, max_pending=2, result_ttl=60)
+
+
+def test_job_result(queue):
+    job_id = queue.submit('recipes', lambda count: [{'name': 'Omeleta'}] * count, 2)
+    job = queue.get(job_id, wait=5)
+    assert job['status'] == 'done'
+    assert job['result'] == [{'name': 'Omeleta'}] * 2
+    assert queue.get('neexistuje') is None
+
+
+def test_failed_job_releases_its_slot(queue):
+    def failing():
+        raise ValueError('chyba modelu')
+
+    for _ in range(3):
+        job = queue.get(queue.submit('analysis', failing), wait=5)
+        assert job['status'] == 'failed'
+        assert job['error'] == 'chyba modelu'
+    assert queue.stats()['queue_depth'] == 0
+    assert queue.stats()['running'] == 0
+
+
+def test_full_queue_is_rejected(queue):
+    release = threading.Event()
+    first = queue.submit('recipes', release.wait, 5)
+    queue.submit('recipes', lambda: 'ok')
+    with pytest.raises(JobQueueFull):
+        queue.submit('recipes', lambda: 'ok')
+    release.set()
+    assert queue.get(first, wait=5)['status'] == 'done'
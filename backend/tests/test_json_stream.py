@@ -0,0 +1,98 @@
+import json
+import pytest
+from services.json_stream import JsonArrayStreamParser, salvage_json_array
+from services.recipe_generator import OpenAIService
+
+RECIPES = [{'name': 'Omeleta', 'ingredients': ['vejce', 'sýr']},
+           {'name': 'Salát {s} "uvozovkami"', 'ingredients': []}]
+DOCUMENT = json.dumps({'recipes': RECIPES}, ensure_ascii=False)
+
+
+def _feed_in_chunks(parser, text, size):
+    items = []
+    for start in range(0, len(text), size):
+        items.extend(parser.feed(text[start:start + size]))
+    return items
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64])
+def test_chunked_input_yields_complete_objects(size):
+    parser = JsonArrayStreamParser('recipes')
+    assert _feed_in_chunks(parser, DOCUMENT, size) == RECIPES
+    assert parser.finished
+    assert parser.close() == []
+
+
+def test_utf8_bytes_split_inside_character():
+    data = DOCUMENT.encode('utf-8')
+    parser = JsonArrayStreamParser('recipes')
+    items = []
+    for start in range(len(data)):
+        items.extend(parser.feed(data[start:start + 1]))
+    assert items == RECIPES
+
+
+@pytest.mark.parametrize('size', [1, 5, 16])
+def test_long_whitespace_between_key_and_array(size):
+    text = '```json\n{"recipes"' + ' \n' * 40 + ':' + '\n' * 30 + ' [' + json.dumps(RECIPES[0]) + ']}'
+    parser = JsonArrayStreamParser('recipes')
+    assert _feed_in_chunks(parser, text, size) == [RECIPES[0]]
+    assert parser.close() == []
+
+
+def test_long_noise_before_key_is_discarded():
+    parser = JsonArrayStreamParser('recipes')
+    _feed_in_chunks(parser, 'x' * 5000 + '"other": 1, ', 100)
+    assert len(parser._buffer) < 20
+    assert _feed_in_chunks(parser, '"recipes": [{"a": 1}]', 3) == [{'a': 1}]
+
+
+def test_missing_key():
+    items, dropped = salvage_json_array('{"ingredients": []}', 'recipes')
+    assert items == []
+    assert [item['reason'] for item in dropped] == ['missing_key']
+
+
+def test_truncated_object_is_reported():
+    text = DOCUMENT[:DOCUMENT.index('Salát') + 3]
+    items, dropped = salvage_json_array(text, 'recipes')
+    assert items == [RECIPES[0]]
+    assert [item['reason'] for item in dropped] == ['truncated']
+    assert dropped[0]['preview'].startswith('{"name": "Sal')
+
+
+def test_trailing_comma_and_invalid_objects():
+    text = '{"recipes": [{"a": 1,}, {"b": oops}, {"c": [1, 2,]}]}'
+    items, dropped = salvage_json_array(text, 'recipes')
+    assert items == [{'a': 1}, {'c': [1, 2]}]
+    assert [item['reason'] for item in dropped] == ['invalid_json']
+    assert text[dropped[0]['offset']:].startswith('{"b": oops}')
+
+
+@pytest.mark.parametrize('size', [1, 2, 4, 100])
+def test_non_object_items_are_dropped(size):
+    text = '{"recipes": ["jen text", 42, {"a": 1}, [1, 2], true, -1.5e3 ]}'
+    parser = JsonArrayStreamParser('recipes')
+    assert _feed_in_chunks(parser, text, size) == [{'a': 1}]
+    dropped = parser.close()
+    assert [(item['reason'], item['preview']) for item in dropped] == [
+        ('not_object', '"jen text"'), ('not_object', '42'), ('not_object', '[1, 2]'),
+        ('not_object', 'true'), ('not_object', '-1.5e3')]
+    assert all(text[item['offset']:].startswith(item['preview']) for item in dropped)
+
+
+def test_text_after_array_is_ignored():
+    items, dropped = salvage_json_array(['{"recipes": [{"a": 1}]', '} ``` konec {"b": 2}'], 'recipes')
+    assert items == [{'a': 1}]
+    assert dropped == []
+
+
+def test_non_numeric_fields_do_not_drop_the_response(monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    response = json.dumps({'recipes': [{'name': 'Omeleta', 'prep_time': 'asi 10 minut', 'servings': 'dvě'},
+                                       {'name': 'Salát', 'prep_time': 5}]}, ensure_ascii=False)
+    recipes = OpenAIService()._parse_recipes_response(response)
+
+    assert [(recipe['name'], recipe['prep_time'], recipe['servings']) for recipe in recipes] == \
+        [('Omeleta', 15, 1), ('Salát', 5, 1)]
+    assert not any(recipe.get('fallback') for recipe in recipes)
@@ -0,0 +1,47 @@
+import random
+import numpy as np
+from services.near_duplicate_cache import MultiIndexHashTable, NearDuplicateCache, perceptual_hash
+
+
+def _flip(value, bits):
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+def test_multi_index_finds_hashes_within_distance():
+    rng = random.Random(7)
+    table = MultiIndexHashTable(max_distance=6)
+    values = [rng.getrandbits(64) for _ in range(500)]
+    for entry_id, value in enumerate(values, 1):
+        table.add(entry_id, value)
+
+    assert table.nearest(_flip(values[10], [0, 17, 33, 50, 63])) == (11, 5)
+    assert table.nearest(_flip(values[10], range(0, 64, 8))) is None
+
+    table.remove(11, values[10])
+    assert table.nearest(values[10]) is None
+    assert len(table) == 499
+
+
+def test_perceptual_hash_tolerates_brightness_changes():
+    rng = np.random.RandomState(3)
+    image = (rng.rand(64, 64) * 255).astype(np.uint8)
+    brighter = np.clip(image.astype(np.int16) + 20, 0, 255).astype(np.uint8)
+    other = (rng.rand(64, 64) * 255).astype(np.uint8)
+
+    assert (perceptual_hash(image) ^ perceptual_hash(brighter)).bit_count() <= 6
+    assert (perceptual_hash(image) ^ perceptual_hash(other)).bit_count() > 6
+
+
+def test_cache_round_trip_across_workers(tmp_path):
+    path = str(tmp_path / 'near_duplicates.sqlite3')
+    cache = NearDuplicateCache(db_path=path, max_distance=6, ttl_seconds=60, sync_interval=0)
+    value = (1 << 63) | 0x1234
+    cache.set(value, [{'name': 'mrkev'}])
+
+    assert cache.get(_flip(value, [1, 2])) == [{'name': 'mrkev'}]
+    assert cache.get(value ^ ((1 << 64) - 1)) is None
+
+    other_worker = NearDuplicateCache(db_path=path, max_distance=6, ttl_seconds=60, sync_interval=0)
+    assert other_worker.get(value) == [{'name': 'mrkev'}]
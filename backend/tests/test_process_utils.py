@@ -0,0 +1,50 @@
+import os
+import subprocess
+from utils.process_utils import ProcessRegistry, connect_wal, pid_alive
+
+
+def test_registry_creates_each_service_once():
+    created = []
+    registry = ProcessRegistry({'cache': lambda: created.append(1) or object()})
+    assert registry.get('cache') is registry.get('cache')
+    assert created == [1]
+
+
+def test_registry_recreates_services_after_fork():
+    registry = ProcessRegistry({'cache': object})
+    parent = registry.get('cache')
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        os.write(write_end, b'1' if registry.get('cache') is not parent else b'0')
+        os._exit(0)
+    os.close(write_end)
+    os.waitpid(pid, 0)
+    with os.fdopen(read_end, 'rb') as child:
+        assert child.read() == b'1'
+    assert registry.get('cache') is parent
+
+
+def test_registry_override_and_reset():
+    registry = ProcessRegistry()
+    registry.register('cache', lambda: 'vytvořeno')
+    registry.override('cache', 'náhrada')
+    assert registry.get('cache') == 'náhrada'
+    registry.reset()
+    assert registry.get('cache') == 'vytvořeno'
+
+
+def test_connect_wal_uses_wal_journal(tmp_path):
+    conn = connect_wal(str(tmp_path / 'store.sqlite3'))
+    try:
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    finally:
+        conn.close()
+
+
+def test_pid_alive():
+    process = subprocess.Popen(['true'])
+    process.wait()
+    assert pid_alive(os.getpid())
+    assert not pid_alive(process.pid)
@@ -0,0 +1,36 @@
+import time
+from services.recipe_cache import RecipeCache
+
+
+def test_key_ignores_order_case_and_diacritics():
+    assert (RecipeCache.make_key(['Mrkev', 'sýr'], 30, ['Bez lepku'])
+            == RecipeCache.make_key(['syr', 'mrkev', 'MRKEV'], '30', ['bez lepku']))
+    assert RecipeCache.make_key(['mrkev'], 30) != RecipeCache.make_key(['mrkev'], 60)
+
+
+def test_get_returns_copies():
+    cache = RecipeCache(max_entries=4, ttl_seconds=60)
+    cache.set('k', [{'name': 'Omeleta'}])
+    cache.get('k')[0]['name'] = 'změněno'
+    assert cache.get('k') == [{'name': 'Omeleta'}]
+    assert cache.stats()['hits'] == 2
+
+
+def test_lru_eviction():
+    cache = RecipeCache(max_entries=2, ttl_seconds=60)
+    cache.set('a', [1])
+    cache.set('b', [2])
+    cache.get('a')
+    cache.set('c', [3])
+    assert cache.get('b') is None
+    assert cache.get('a') == [1]
+    assert cache.stats()['evictions'] == 1
+
+
+def test_expired_entries_miss(monkeypatch):
+    cache = RecipeCache(max_entries=2, ttl_seconds=10)
+    cache.set('a', [1])
+    now = time.monotonic()
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 11)
+    assert cache.get('a') is None
+    assert cache.stats()['entries'] == 0
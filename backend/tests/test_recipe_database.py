@@ -0,0 +1,101 @@
+import json
+import os
+import threading
+from services.recipe_database import RecipeDatabase
+
+
+def _recipe(recipe_id, name, ingredients, prep_time=15, tags=()):
+    return {'id': recipe_id, 'name': name, 'prep_time': prep_time, 'servings': 2, 'tags': list(tags),
+            'ingredients': [{'name': ingredient} for ingredient in ingredients],
+            'instructions': [f'Uvařte {name.lower()}.']}
+
+
+def _write_catalogue(path, recipes):
+    # Stejně jako tools/import_recipes.py: zapsat vedle a vyměnit přes os.replace
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as catalogue:
+        for recipe in recipes:
+            catalogue.write(json.dumps(recipe, ensure_ascii=False) + '\n')
+    os.replace(tmp_path, path)
+
+
+CATALOGUE = [
+    _recipe('1', 'Mrkvový salát', ['mrkev', 'citron', 'olivový olej'], tags=['zelenina']),
+    _recipe('2', 'Omeleta', ['vejce', 'sýr', 'špenát'], prep_time=10),
+    _recipe('3', 'Pečený losos', ['losos', 'citron'], prep_time=40, tags=['ryba']),
+]
+
+
+def test_ranked_by_coverage_and_filtered_by_time(tmp_path):
+    path = str(tmp_path / 'recipes.jsonl')
+    _write_catalogue(path, CATALOGUE)
+    db = RecipeDatabase(path)
+
+    results = db.get_recipes_by_ingredients(['mrkev', 'citron'], max_time=20)
+    assert [recipe['id'] for recipe in results] == ['1']
+    assert results[0]['ingredient_availability'] == {'available_count': 2, 'total_count': 3, 'coverage': 0.667}
+
+    results = db.get_recipes_by_ingredients(['citron'], max_time=60)
+    assert [recipe['id'] for recipe in results] == ['3', '1']
+
+
+def test_canonical_and_prefix_lookup(tmp_path):
+    path = str(tmp_path / 'recipes.jsonl')
+    _write_catalogue(path, CATALOGUE)
+    db = RecipeDatabase(path)
+    assert [recipe['id'] for recipe in db.get_recipes_by_ingredients(['vajíčka'])] == ['2']
+    assert [recipe['id'] for recipe in db.get_recipes_by_ingredients(['špen'])] == ['2']
+
+
+def test_get_recipe_by_id_reads_full_recipe(tmp_path):
+    path = str(tmp_path / 'recipes.jsonl')
+    _write_catalogue(path, CATALOGUE)
+    db = RecipeDatabase(path)
+    assert db.get_recipe_by_id(2)['instructions'] == ['Uvařte omeleta.']
+    assert db.get_recipe_by_id('99') is None
+    assert sorted(db.get_recipe_categories()) == ['ryba', 'zelenina']
+
+
+def test_catalogue_swap_is_picked_up(tmp_path):
+    path = str(tmp_path / 'recipes.jsonl')
+    _write_catalogue(path, CATALOGUE)
+    db = RecipeDatabase(path)
+    old_snapshot = db._snapshot
+
+    _write_catalogue(path, [_recipe('7', 'Mrkvová polévka s dlouhým názvem', ['mrkev', 'cibule'])] + CATALOGUE[1:])
+    results = db.get_recipes_by_ingredients(['mrkev'])
+    assert [recipe['id'] for recipe in results] == ['7']
+    assert db.get_recipe_by_id('7')['name'] == 'Mrkvová polévka s dlouhým názvem'
+    assert db.get_recipe_by_id('1') is None
+    # Starý snímek zůstal netknutý pro dotazy, které ho ještě drží
+    assert [recipe.id for recipe in old_snapshot.recipes] == ['1', '2', '3']
+    assert db._snapshot is not old_snapshot
+
+
+def test_concurrent_queries_during_swaps(tmp_path):
+    path = str(tmp_path / 'recipes.jsonl')
+    small = CATALOGUE[:1]
+    large = [_recipe(str(i), f'Recept {i}', ['mrkev', 'cibule']) for i in range(100, 160)]
+    _write_catalogue(path, large)
+    db = RecipeDatabase(path)
+    errors = []
+    stop = threading.Event()
+
+    def query():
+        while not stop.is_set():
+            try:
+                for recipe in db.get_recipes_by_ingredients(['mrkev', 'cibule']):
+                    assert recipe['ingredient_availability']['total_count'] == (3 if recipe['id'] == '1' else 2)
+            except Exception as e:
+                errors.append(e)
+                return
+
+    threads = [threading.Thread(target=query) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for i in range(30):
+        _write_catalogue(path, small if i % 2 else large)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    assert errors == []
@@ -0,0 +1,84 @@
+from services.similar_recipe_cache import SimilarRecipeCache
+
+BEEF_RECIPE = {'name': 'Hovězí na zelenině', 'ingredients': [
+    {'name': 'hovězího masa', 'amount': '300', 'unit': 'g'}, 'mrkev', 'cibule', 'brambory']}
+CHICKEN_RECIPE = {'name': 'Kuře s bramborem', 'ingredients': ['200 g kuřecích prsou', 'brambory', 'mrkev']}
+VEGETABLE_RECIPES = [
+    {'name': 'Mrkvový salát', 'ingredients': ['mrkev', 'celer', 'olivový olej']},
+    {'name': 'Bramborová polévka', 'ingredients': ['brambory', 'mrkev', 'cibule']},
+    {'name': 'Pečená zelenina', 'ingredients': ['brambory', 'mrkev', 'celer', 'sůl']},
+]
+
+
+def _cache(**kwargs):
+    options = dict(threshold=0.5, num_perm=64, bands=32, min_recipes=1, max_entries=16, ttl_seconds=60)
+    options.update(kwargs)
+    return SimilarRecipeCache(**options)
+
+
+def test_inflected_meat_is_required():
+    fridge = frozenset({'mrkev', 'brambory'})
+    assert 'hovězí maso' in SimilarRecipeCache._required_ingredients(BEEF_RECIPE, fridge)
+    assert 'kuřecí prsa' in SimilarRecipeCache._required_ingredients(CHICKEN_RECIPE, fridge)
+
+
+def test_meat_from_pantry_staples_is_still_required():
+    recipe = {'name': 'Kuřecí rizoto', 'ingredients': ['kuřecím masem', 'rýže', 'cibule']}
+    assert SimilarRecipeCache._required_ingredients(recipe, frozenset({'cibule'})) == {'kuřecí maso'}
+
+
+def test_staples_are_not_required():
+    required = SimilarRecipeCache._required_ingredients(VEGETABLE_RECIPES[2], frozenset({'mrkev'}))
+    assert 'sůl' not in required
+    assert {'brambory', 'mrkev', 'celer'} <= required
+
+
+def test_beef_recipe_not_served_to_fridge_without_beef():
+    cache = _cache()
+    cache.set(['hovězí maso', 'mrkev', 'brambory', 'celer'], 30, [], [BEEF_RECIPE] + VEGETABLE_RECIPES)
+
+    served = cache.get(['mrkev', 'brambory', 'celer', 'cibule'], 30, [])
+    assert served is not None
+    names = [recipe['name'] for recipe in served]
+    assert 'Hovězí na zelenině' not in names
+    assert 'Mrkvový salát' in names
+    assert all(recipe['source'] == 'cache' for recipe in served)
+
+
+def test_exact_fridge_is_served_all_recipes():
+    cache = _cache()
+    fridge = ['hovězí maso', 'mrkev', 'brambory', 'celer', 'cibule', 'olivový olej']
+    cache.set(fridge, 30, [], [BEEF_RECIPE] + VEGETABLE_RECIPES)
+    served = cache.get(list(reversed(fridge)), 30, [])
+    assert [recipe['name'] for recipe in served] == [BEEF_RECIPE['name']] + [r['name'] for r in VEGETABLE_RECIPES]
+
+
+def test_miss_when_context_or_ingredients_differ():
+    cache = _cache()
+    cache.set(['mrkev', 'brambory', 'celer'], 30, [], VEGETABLE_RECIPES)
+    assert cache.get(['mrkev', 'brambory', 'celer'], 60, []) is None
+    assert cache.get(['mrkev', 'brambory', 'celer'], 30, ['vegan']) is None
+    assert cache.get(['losos', 'citrony', 'špenát'], 30, []) is None
+    assert cache.stats()['misses'] == 3
+
+
+def test_min_recipes_threshold():
+    cache = _cache(min_recipes=3)
+    cache.set(['hovězí maso', 'mrkev', 'brambory', 'celer'], 30, [], [BEEF_RECIPE] + VEGETABLE_RECIPES[:2])
+    # Bez hovězího zbývají jen dva recepty, což na zásah nestačí
+    assert cache.get(['mrkev', 'brambory', 'celer', 'cibule'], 30, []) is None
+
+
+def test_served_recipes_are_copies():
+    cache = _cache()
+    cache.set(['mrkev', 'brambory', 'celer', 'cibule'], 30, [], VEGETABLE_RECIPES)
+    cache.get(['mrkev', 'brambory', 'celer', 'cibule'], 30, [])[0]['ingredients'].append('zkaženo')
+    assert 'zkaženo' not in cache.get(['mrkev', 'brambory', 'celer', 'cibule'], 30, [])[0]['ingredients']
+
+
+def test_max_entries_evicts_oldest():
+    cache = _cache(max_entries=1)
+    cache.set(['mrkev', 'brambory', 'celer'], 30, [], VEGETABLE_RECIPES)
+    cache.set(['losos', 'citrony', 'špenát'], 30, [], [{'name': 'Losos', 'ingredients': ['losos', 'citron']}])
+    assert cache.stats()['entries'] == 1
+    assert cache.get(['mrkev', 'brambory', 'celer'], 30, []) is None
@@ -0,0 +1,140 @@
+import os
+import time
+import sqlite3
+import subprocess
+import threading
+import pytest
+from services.single_flight import SingleFlight
+from services.upstream_guard import UpstreamUnavailable
+
+
+def _single_flight(tmp_path, **kwargs):
+    options = dict(poll_interval=0.01, lease_seconds=10, result_ttl=5)
+    options.update(kwargs)
+    return SingleFlight(db_path=str(tmp_path / 'single_flight.sqlite3'), **options)
+
+
+def _hold_lease(single_flight, key, pid):
+    # Simuluje vedoucí volání běžící v jiném (živém) workeru
+    conn = sqlite3.connect(single_flight.db_path, isolation_level=None)
+    try:
+        conn.execute('INSERT INTO flights (key, pid, started_at) VALUES (?, ?, ?)', (key, pid, time.time()))
+    finally:
+        conn.close()
+
+
+def test_concurrent_calls_are_coalesced(tmp_path):
+    single_flight = _single_flight(tmp_path)
+    calls = []
+    started = threading.Event()
+
+    def slow(value):
+        calls.append(value)
+        started.set()
+        time.sleep(0.2)
+        return {'recipes': [value]}
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(single_flight.do('k', slow, 'a')))
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=lambda: results.append(single_flight.do('k', slow, 'a')))
+                 for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    for thread in [leader] + followers:
+        thread.join()
+
+    assert calls == ['a']
+    assert results == [{'recipes': ['a']}] * 4
+    results[0]['recipes'].append('upraveno')
+    assert results[1] == {'recipes': ['a']}
+
+
+def test_in_flight_result_is_shared_across_workers(tmp_path):
+    single_flight = _single_flight(tmp_path)
+    other_worker = _single_flight(tmp_path)
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        time.sleep(0.2)
+        return [1, 2]
+
+    leader = threading.Thread(target=single_flight.do, args=('k', slow))
+    leader.start()
+    started.wait()
+    assert other_worker.do('k', lambda: 'nemělo se volat') == [1, 2]
+    leader.join()
+
+
+def test_finished_result_is_not_served_to_later_calls(tmp_path):
+    single_flight = _single_flight(tmp_path)
+    assert single_flight.do('k', lambda: [1, 2]) == [1, 2]
+    assert single_flight.do('k', lambda: [3]) == [3]
+    other_worker = _single_flight(tmp_path)
+    assert other_worker.do('k', lambda: [4]) == [4]
+
+
+def test_unshareable_result_is_not_published(tmp_path):
+    single_flight = _single_flight(tmp_path)
+    other_worker = _single_flight(tmp_path)
+    started = threading.Event()
+
+    def fallback():
+        started.set()
+        time.sleep(0.2)
+        return [{'name': 'náhrada', 'fallback': True}]
+
+    leader = threading.Thread(target=single_flight.do, args=('k', fallback),
+                              kwargs={'shareable': lambda result: False})
+    leader.start()
+    started.wait()
+    assert other_worker.do('k', lambda: ['vlastní']) == ['vlastní']
+    leader.join()
+
+
+def test_errors_release_the_lease(tmp_path):
+    single_flight = _single_flight(tmp_path)
+
+    def failing():
+        raise RuntimeError('upstream')
+
+    try:
+        single_flight.do('k', failing)
+    except RuntimeError:
+        pass
+    assert single_flight.do('k', lambda: 'ok') == 'ok'
+
+
+def test_max_wait_is_capped_below_worker_timeout(tmp_path, monkeypatch):
+    monkeypatch.setenv('GUNICORN_TIMEOUT', '30')
+    monkeypatch.delenv('SINGLE_FLIGHT_LEASE', raising=False)
+    single_flight = SingleFlight(db_path=str(tmp_path / 'single_flight.sqlite3'))
+    assert single_flight.lease_seconds < 30
+    assert single_flight.max_wait < 30
+
+    monkeypatch.setenv('SINGLE_FLIGHT_LEASE', '120')
+    single_flight = SingleFlight(db_path=str(tmp_path / 'single_flight.sqlite3'))
+    assert single_flight.lease_seconds == 120
+    assert single_flight.max_wait < 30
+
+
+def test_follower_falls_back_when_wait_runs_out(tmp_path):
+    single_flight = _single_flight(tmp_path, max_wait=0.1)
+    _hold_lease(single_flight, 'k', os.getppid())
+    calls = []
+
+    started = time.monotonic()
+    with pytest.raises(UpstreamUnavailable):
+        single_flight.do('k', lambda: calls.append('volání'))
+    assert calls == []
+    assert time.monotonic() - started < 2
+
+
+def test_dead_leader_is_taken_over(tmp_path):
+    single_flight = _single_flight(tmp_path, max_wait=5)
+    process = subprocess.Popen(['true'])
+    process.wait()
+    _hold_lease(single_flight, 'k', process.pid)
+    assert single_flight.do('k', lambda: 'převzato') == 'převzato'
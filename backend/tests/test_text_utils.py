@@ -0,0 +1,12 @@
+from utils.text_utils import canonical_name_set, fold_text
+
+
+def test_fold_text():
+    assert fold_text('Kuřecí  Prsa') == 'kureci prsa'
+    assert fold_text('  ŠPENÁT\n') == 'spenat'
+    assert fold_text('') == ''
+    assert fold_text(None) == ''
+
+
+def test_canonical_name_set_sorts_and_deduplicates():
+    assert canonical_name_set(['Mrkev', 'mrkev ', 'Sýr', '', '  ']) == ['mrkev', 'syr']
@@ -0,0 +1,66 @@
+import os
+import time
+import sqlite3
+import pytest
+from services.upload_janitor import UploadJanitor
+from services.upload_store import UploadStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    upload_folder = tmp_path / 'uploads'
+    upload_folder.mkdir()
+    return UploadStore(str(upload_folder), index_path=str(tmp_path / 'uploads.sqlite3'), persist=False)
+
+
+def _add(store, content_hash, size, last_seen):
+    info = store.store(b'x' * size, content_hash, {'mime_type': 'image/png', 'width': 1, 'height': 1})
+    with open(os.path.join(store.upload_folder, info['filename']), 'wb') as image_file:
+        image_file.write(b'x' * size)
+    conn = sqlite3.connect(store.index_path)
+    try:
+        conn.execute('UPDATE uploads SET last_seen = ? WHERE hash = ?', (last_seen, content_hash))
+        conn.commit()
+    finally:
+        conn.close()
+    return info['filename']
+
+
+def _janitor(store, tmp_path, **kwargs):
+    options = dict(max_age_hours=1, max_total_mb=None, batch_size=2, max_batches=10, batch_pause=0,
+                   lock_path=str(tmp_path / 'janitor.lock'), stats_path=str(tmp_path / 'janitor_stats.json'))
+    options.update(kwargs)
+    return UploadJanitor(store, **options)
+
+
+def test_expired_uploads_are_deleted_in_batches(store, tmp_path):
+    now = time.time()
+    old = [_add(store, f'old{i}', 10, now - 7200 - i) for i in range(5)]
+    fresh = _add(store, 'fresh', 10, now)
+
+    result = _janitor(store, tmp_path).run_once()
+    assert result['deleted_files'] == 5
+    assert result['batches'] == 3
+    assert sorted(os.listdir(store.upload_folder)) == [fresh]
+    assert all(store.get(f'old{i}') is None for i in range(len(old)))
+
+
+def test_max_batches_bounds_one_run(store, tmp_path):
+    now = time.time()
+    for i in range(5):
+        _add(store, f'old{i}', 10, now - 7200 - i)
+    janitor = _janitor(store, tmp_path, max_batches=1)
+    assert janitor.run_once()['deleted_files'] == 2
+    assert janitor.run_once()['deleted_files'] == 2
+    assert janitor.stats()['runs'] == 2
+
+
+def test_size_limit_evicts_least_recently_uploaded(store, tmp_path):
+    now = time.time()
+    megabyte = 1024 * 1024
+    names = [_add(store, f'h{i}', megabyte, now - 100 + i) for i in range(4)]
+
+    result = _janitor(store, tmp_path, max_age_hours=None, max_total_mb=2.5).run_once()
+    assert result['deleted_files'] == 2
+    assert sorted(os.listdir(store.upload_folder)) == sorted(names[2:])
+    assert store.stored_bytes() == 2 * megabyte
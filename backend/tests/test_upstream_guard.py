@@ -0,0 +1,122 @@
+import time
+import threading
+import pytest
+from services.upstream_guard import AdaptiveLimiter, CircuitBreaker, UpstreamGuard, UpstreamUnavailable
+
+
+def _breaker(**kwargs):
+    options = dict(window=10, failure_rate=0.5, min_calls=4, consecutive_failures=3, cooldown=60)
+    options.update(kwargs)
+    return CircuitBreaker(**options)
+
+
+def test_limiter_grows_on_fast_success_and_shrinks_on_failure():
+    limiter = AdaptiveLimiter(initial_limit=4, min_limit=2, max_limit=8, queue_timeout=0, latency_tolerance=2.5)
+    for _ in range(20):
+        assert limiter.acquire()
+        limiter.release(0.1, ok=True)
+    assert limiter.stats()['limit'] > 4
+
+    for _ in range(10):
+        assert limiter.acquire()
+        limiter.release(0.1, ok=False)
+    assert limiter.stats()['limit'] == 2
+
+
+def test_limiter_initial_limit_is_clamped_to_bounds(monkeypatch):
+    monkeypatch.setenv('OPENAI_INITIAL_CONCURRENCY', '100')
+    assert AdaptiveLimiter(min_limit=2, max_limit=50).stats()['limit'] == 50
+    assert AdaptiveLimiter(initial_limit=1, min_limit=2, max_limit=50).stats()['limit'] == 2
+
+
+def test_limiter_shrinks_when_latency_degrades():
+    limiter = AdaptiveLimiter(initial_limit=8, min_limit=2, max_limit=8, queue_timeout=0, latency_tolerance=2.5)
+    limiter.acquire()
+    limiter.release(0.1, ok=True)
+    for _ in range(10):
+        limiter.acquire()
+        limiter.release(2.0, ok=True)
+    assert limiter.stats()['limit'] < 8
+
+
+def test_limiter_sheds_when_full():
+    limiter = AdaptiveLimiter(initial_limit=2, min_limit=1, max_limit=2, queue_timeout=0.05)
+    assert limiter.acquire() and limiter.acquire()
+    assert not limiter.acquire()
+    assert limiter.stats()['shed'] == 1
+
+    threading.Timer(0.02, limiter.release, args=(0.1, True)).start()
+    limiter.queue_timeout = 1
+    assert limiter.acquire()
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = _breaker()
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.is_open()
+
+
+def test_breaker_opens_on_failure_rate():
+    breaker = _breaker(consecutive_failures=100)
+    for ok in (True, False, True, False):
+        breaker.record(ok)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_breaker_half_open_allows_single_probe(monkeypatch):
+    breaker = _breaker(cooldown=10)
+    for _ in range(3):
+        breaker.record(False)
+    now = time.monotonic()
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 11)
+
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens(monkeypatch):
+    breaker = _breaker(cooldown=10)
+    for _ in range(3):
+        breaker.record(False)
+    now = time.monotonic()
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 11)
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.is_open()
+
+
+def test_guard_slot_records_status_and_exceptions():
+    guard = UpstreamGuard(AdaptiveLimiter(initial_limit=4, min_limit=1, max_limit=4, queue_timeout=0),
+                          _breaker(consecutive_failures=2))
+    with guard.slot() as slot:
+        slot.mark_status(200)
+    with guard.slot() as slot:
+        slot.mark_status(503)
+    with pytest.raises(RuntimeError):
+        with guard.slot():
+            raise RuntimeError('spojení spadlo')
+
+    assert not guard.available()
+    assert guard.limiter.stats()['in_flight'] == 0
+    with pytest.raises(UpstreamUnavailable):
+        guard.slot()
+
+
+def test_guard_sheds_when_limit_full():
+    guard = UpstreamGuard(AdaptiveLimiter(initial_limit=1, min_limit=1, max_limit=1, queue_timeout=0), _breaker())
+    slot = guard.slot()
+    with pytest.raises(UpstreamUnavailable):
+        guard.slot()
+    with slot:
+        slot.mark_status(200)
+    with guard.slot():
+        pass
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Import receptů do katalogu (JSONL), ze kterého je načítá RecipeDatabase.
+
+Použití (ze složky backend):
+    python tools/import_recipes.py nove_recepty.json
+    python tools/import_recipes.py export.jsonl --replace
+"""
+import os
+import sys
+import json
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.recipe_database import DEFAULT_CATALOGUE_PATH
+
+REQUIRED_FIELDS = ('name', 'prep_time', 'ingredients', 'instructions')
+
+def read_recipes(path):
+    with open(path, 'r', encoding='utf-8') as source:
+        content = source.read()
+    
+    stripped = content.lstrip()
+    if stripped.startswith('['):
+        return json.loads(stripped)
+    if stripped.startswith('{') and '"recipes"' in stripped[:200]:
+        return json.loads(stripped)['recipes']
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+def normalize_recipe(recipe):
+    missing = [field for field in REQUIRED_FIELDS if not recipe.get(field)]
+    if missing:
+        raise ValueError(f"chybí pole {', '.join(missing)}")
+    
+    ingredients = []
+    for ingredient in recipe['ingredients']:
+        if isinstance(ingredient, str):
+            ingredient = {'name': ingredient}
+        if not isinstance(ingredient, dict) or not ingredient.get('name'):
+            raise ValueError(f"nevalidní ingredience {ingredient!r}")
+        ingredients.append(ingredient)
+    
+    normalized = dict(recipe)
+    normalized['prep_time'] = int(recipe['prep_time'])
+    normalized['servings'] = int(recipe.get('servings', 1))
+    normalized['ingredients'] = ingredients
+    normalized.setdefault('tags', [])
+    normalized.setdefault('appliances', [])
+    return normalized
+
+def main():
+    parser = argparse.ArgumentParser(description='Import receptů do katalogu RecipeDatabase')
+    parser.add_argument('source', help='JSON pole, objekt {"recipes": [...]} nebo JSONL')
+    parser.add_argument('--catalogue', default=DEFAULT_CATALOGUE_PATH, help='cílový katalog (JSONL)')
+    parser.add_argument('--replace', action='store_true', help='nahradit celý katalog místo sloučení')
+    args = parser.parse_args()
+    
+    catalogue = {}
+    if not args.replace and os.path.exists(args.catalogue):
+        for recipe in read_recipes(args.catalogue):
+            catalogue[str(recipe['id'])] = recipe
+    
+    next_id = max((int(recipe_id) for recipe_id in catalogue if recipe_id.isdigit()), default=0) + 1
+    imported = skipped = 0
+    
+    for index, recipe in enumerate(read_recipes(args.source)):
+        try:
+            recipe = normalize_recipe(recipe)
+        except (ValueError, TypeError) as e:
+            print(f"⚠️  Přeskakuji recept #{index}: {e}")
+            skipped += 1
+            continue
+        
+        if recipe.get('id') is None:
+            recipe['id'] = str(next_id)
+            next_id += 1
+        recipe['id'] = str(recipe['id'])
+        catalogue[recipe['id']] = recipe
+        imported += 1
+    
+    os.makedirs(os.path.dirname(os.path.abspath(args.catalogue)), exist_ok=True)
+    temp_path = f"{args.catalogue}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as target:
+        for recipe in catalogue.values():
+            target.write(json.dumps(recipe, ensure_ascii=False) + '\n')
+    os.replace(temp_path, args.catalogue)
+    
+    print(f"✅ Importováno {imported} receptů, přeskočeno {skipped}, katalog obsahuje {len(catalogue)} receptů")
+
+if __name__ == '__main__':
+    main()
@@ -1,36 +1,89 @@
 import os
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from werkzeug.utils import secure_filename
+from utils.metrics import timed
 
-def allowed_file(filename, allowed_extensions):
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in allowed_extensions
+UPLOAD_CHUNK_SIZE = 64 * 1024
 
-def save_image(file, filename, upload_folder):
+_persist_executor = None
+
+def read_upload(file, chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    Načte upload po blocích do jediného bufferu a zároveň spočítá SHA-256,
+    takže obsah se čte jen jednou a v paměti je jedna kopie.
+    """
+    digest = hashlib.sha256()
+    buffer = bytearray()
+    
+    with timed('upload_read'):
+        while True:
+            chunk = file.stream.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            buffer.extend(chunk)
+    
+    return buffer, digest.hexdigest()
+
+def write_image_bytes(data, filename, upload_folder):
     os.makedirs(upload_folder, exist_ok=True)
     file_path = os.path.join(upload_folder, filename)
-    file.save(file_path)
+    temp_path = f"{file_path}.part"
+    
+    with timed('file_save'):
+        with open(temp_path, 'wb') as image_file:
+            image_file.write(data)
+        os.replace(temp_path, file_path)
     return file_path
 
-def cleanup_old_files(upload_folder, max_age_hours=24):
-    import time
-    from datetime import datetime, timedelta
+def persist_image_async(data, filename, upload_folder):
+    """
+    Uloží obrázek na disk mimo obsluhu požadavku. Zápis přes dočasný soubor,
+    aby /analyze/<filename> nikdy neviděl neúplný soubor.
+    """
+    global _persist_executor
+    if _persist_executor is None:
+        _persist_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='persist')
     
-    current_time = datetime.now()
-    cutoff_time = current_time - timedelta(hours=max_age_hours)
-    
-    if not os.path.exists(upload_folder):
-        return
+    future = _persist_executor.submit(write_image_bytes, data, filename, upload_folder)
+    future.add_done_callback(_report_persist_error)
+    return os.path.join(upload_folder, filename)
+
+def _report_persist_error(future):
+    error = future.exception()
+    if error:
+        print(f"Chyba při ukládání obrázku: {error}")
+
+def cleanup_old_files(upload_folder, max_age_hours=24):
+    """
+    Jednorázové smazání souborů starších než max_age_hours. Průběžný úklid
+    dělá UploadJanitor podle indexu uploadů.
+    """
+    deleted_files = deleted_bytes = 0
+    if not os.path.isdir(upload_folder):
+        return {'deleted_files': 0, 'deleted_bytes': 0}
     
-    for filename in os.listdir(upload_folder):
-        file_path = os.path.join(upload_folder, filename)
-        file_time = datetime.fromtimestamp(os.path.getctime(file_path))
-        
-        if file_time < cutoff_time:
+    cutoff = time.time() - max_age_hours * 3600
+    with os.scandir(upload_folder) as entries:
+        for entry in entries:
+            if entry.name.startswith('.') or not entry.is_file(follow_symlinks=False):
+                continue
             try:
-                os.remove(file_path)
-                print(f"Smazán starý soubor: {filename}")
+                stat = entry.stat(follow_symlinks=False)
+                if stat.st_mtime < cutoff:
+                    os.remove(entry.path)
+                    deleted_files += 1
+                    deleted_bytes += stat.st_size
+            except FileNotFoundError:
+                continue
             except OSError as e:
-                print(f"Chyba při mazání souboru {filename}: {e}")
+                print(f"Chyba při mazání souboru {entry.name}: {e}")
+    
+    if deleted_files:
+        print(f"Smazáno {deleted_files} starých souborů ({deleted_bytes} B)")
+    return {'deleted_files': deleted_files, 'deleted_bytes': deleted_bytes}
 
 def get_file_size_mb(file_path):
     if not os.path.exists(file_path):
@@ -0,0 +1,216 @@
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional
+from utils.text_utils import fold_text
+
+# Kanonický název -> kategorie a varianty (synonyma, jednotné/množné číslo)
+INGREDIENT_LEXICON = {
+    'zelenina': {
+        'mrkev': ['mrkve', 'karotka'],
+        'cibule': ['cibulka', 'šalotka'],
+        'česnek': ['stroužek česneku'],
+        'paprika': [],
+        'rajčata': ['rajče', 'rajčátka'],
+        'okurka': [],
+        'salát': ['ledový salát'],
+        'špenát': [],
+        'brokolice': [],
+        'květák': [],
+        'zelí': [],
+        'brambory': ['brambor'],
+        'cuketa': [],
+        'pórek': [],
+        'celer': ['řapíkatý celer', 'celerová nať'],
+        'zelenina': []
+    },
+    'ovoce': {
+        'jablka': ['jablko'],
+        'banány': ['banán'],
+        'pomeranče': ['pomeranč'],
+        'citrony': ['citron', 'citronová šťáva'],
+        'limetky': ['limetka'],
+        'hrušky': ['hruška']
+    },
+    'maso': {
+        'kuřecí prsa': ['kuřecí prso', 'kuřecí řízek'],
+        'kuřecí maso': ['kuře', 'kuřecí', 'kuřecí stehna'],
+        'vepřové maso': ['vepřové', 'vepřová kotleta'],
+        'hovězí maso': ['hovězí', 'hovězí steak'],
+        'mleté maso': [],
+        'slanina': [],
+        'šunka': [],
+        'ryby': ['ryba'],
+        'losos': ['lososový filet'],
+        'treska': [],
+        'tuňák': []
+    },
+    'mléčné': {
+        'mléko': [],
+        'jogurt': ['bílý jogurt'],
+        'sýr': ['eidam', 'parmazán', 'mozzarella'],
+        'tvaroh': [],
+        'smetana': ['šlehačka', 'zakysaná smetana'],
+        'máslo': []
+    },
+    'vejce': {
+        'vajíčka': ['vajíčko', 'vejce']
+    },
+    'těstoviny': {
+        'špagety': [],
+        'penne': [],
+        'fusilli': [],
+        'tagliatelle': [],
+        'těstoviny': []
+    },
+    'rýže': {
+        'rýže': [],
+        'basmati': ['basmati rýže'],
+        'jasmínová rýže': []
+    },
+    'luštěniny': {
+        'čočka': [],
+        'fazole': [],
+        'cizrna': [],
+        'hrách': []
+    },
+    'koření': {
+        'sůl': ['soli'],
+        'pepř': [],
+        'oregano': [],
+        'bazalka': [],
+        'tymián': [],
+        'rozmarýn': [],
+        'paprikový prášek': ['mletá paprika', 'sladká paprika', 'uzená paprika'],
+        # Oleje a dochucovadla frontend nemá jako vlastní kategorii
+        'olivový olej': ['extra panenský olivový olej'],
+        'rostlinný olej': ['olej', 'slunečnicový olej', 'řepkový olej', 'avokádový olej']
+    }
+}
+
+CHICKEN_INGREDIENTS = {'kuřecí prsa', 'kuřecí maso'}
+FISH_INGREDIENTS = {'ryby', 'losos', 'treska', 'tuňák'}
+
+# Začátky slov (bez diakritiky), podle kterých se maso pozná i v tvaru, který slovník nezná
+CHICKEN_STEMS = ['kure', 'kurat']
+FISH_STEMS = ['ryb(?!iz)', 'losos', 'tunak', 'tresk']
+MEAT_STEMS = CHICKEN_STEMS + FISH_STEMS + ['hovez', 'vepr', 'slanin', 'sunk', r'mlet\w* mas']
+
+# Spotřebič -> začátky slov v postupu, které ho prozrazují
+APPLIANCE_KEYWORDS = {
+    'trouba': ['troub', 'pecem', 'peceni', 'pecte', 'upect', 'upecte', 'zapec'],
+    'mikrovlnná trouba': ['mikrovln'],
+    'mixér': ['mixer', 'mixuj', 'rozmix'],
+    'elektrický kontaktní gril': ['gril']
+}
+
+# Koncovky, které se u českých názvů střídají mezi tvary (rajče/rajčata, citron/citrony,
+# kuřecí/kuřecích, hovězí/hovězího), bez diakritiky a delší před kratšími
+_CZECH_ENDINGS = ('aty', 'ata', 'ete', 'ami', 'ach', 'ech', 'emi', 'ich', 'ych', 'iho', 'eho', 'imu', 'emu',
+                  'imi', 'ymi', 'ou', 'im', 'ym', 'a', 'e', 'i', 'o', 'u', 'y')
+_ENDINGS_PATTERN = '(?:' + '|'.join(_CZECH_ENDINGS) + ')?'
+_MIN_STEM = 3
+
+
+def _stem_word(word: str) -> str:
+    for ending in _CZECH_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= _MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def stem_key(text: str) -> str:
+    """
+    Klíč pro vyhledání: bez diakritiky, malými písmeny a s odříznutou koncovkou
+    každého slova, takže 'Rajčata', 'rajče' i 'rajcata' dají 'rajc'.
+    """
+    return ' '.join(_stem_word(word) for word in fold_text(text).split())
+
+
+def _build_tables():
+    canonical_by_key = {}
+    category_by_name = {}
+    for category, names in INGREDIENT_LEXICON.items():
+        for name, variants in names.items():
+            category_by_name[name] = category
+            for variant in [name] + variants:
+                canonical_by_key.setdefault(stem_key(variant), name)
+
+    # Delší klíče dřív, aby 'kuřecí prsa' vyhrálo nad 'kuřecí'
+    alternatives = [
+        r'\s+'.join(re.escape(word) + _ENDINGS_PATTERN for word in key.split())
+        for key in sorted(canonical_by_key, key=len, reverse=True)
+    ]
+    pattern = re.compile(r'\b(?:' + '|'.join(alternatives) + r')\b')
+    return canonical_by_key, category_by_name, pattern
+
+
+_CANONICAL_BY_KEY, _CATEGORY_BY_NAME, _INGREDIENT_RE = _build_tables()
+_CHICKEN_STEM_RE = re.compile(r'\b(?:' + '|'.join(CHICKEN_STEMS) + ')')
+_FISH_STEM_RE = re.compile(r'\b(?:' + '|'.join(FISH_STEMS) + ')')
+_MEAT_STEM_RE = re.compile(r'\b(?:' + '|'.join(MEAT_STEMS) + ')')
+_APPLIANCE_RE = re.compile(r'\b(' + '|'.join(
+    re.escape(keyword) for keywords in APPLIANCE_KEYWORDS.values() for keyword in keywords) + r')')
+_APPLIANCE_BY_KEYWORD = {keyword: appliance for appliance, keywords in APPLIANCE_KEYWORDS.items()
+                         for keyword in keywords}
+
+
+def find_ingredients(text: str) -> List[str]:
+    """
+    Vrací kanonické názvy známých ingrediencí zmíněných v textu, v pořadí výskytu.
+    """
+    found = []
+    for match in _INGREDIENT_RE.finditer(fold_text(text)):
+        name = _CANONICAL_BY_KEY.get(stem_key(match.group()))
+        if name and name not in found:
+            found.append(name)
+    return found
+
+
+@lru_cache(maxsize=4096)
+def canonical_ingredient_name(name: str) -> Optional[str]:
+    """
+    Kanonický název ingredience ('vejce' -> 'vajíčka'), nebo None pro neznámou ingredienci.
+    """
+    canonical = _CANONICAL_BY_KEY.get(stem_key(name))
+    if canonical is None:
+        # Název s přívlastkem nebo množstvím, např. 'čerstvá mrkev' nebo '3 rajčata'
+        found = find_ingredients(name)
+        canonical = found[0] if found else None
+    return canonical
+
+
+def ingredient_category(name: str) -> str:
+    canonical = canonical_ingredient_name(name)
+    return _CATEGORY_BY_NAME[canonical] if canonical else 'ostatní'
+
+
+def _ingredient_text(ingredients: Iterable[Any]) -> str:
+    return ' , '.join(str(item.get('name', '')) if isinstance(item, dict) else str(item) for item in ingredients)
+
+
+def recipe_tags(recipe: Dict[str, Any]) -> List[str]:
+    tags = {'zdravé'}
+    if recipe.get('prep_time', 99) <= 20:
+        tags.add('rychlé')
+
+    text = _ingredient_text(recipe.get('ingredients', []))
+    folded = fold_text(text)
+    names = set(find_ingredients(text))
+    categories = {_CATEGORY_BY_NAME[name] for name in names}
+    if names & CHICKEN_INGREDIENTS or _CHICKEN_STEM_RE.search(folded):
+        tags.add('kuřecí')
+    if names & FISH_INGREDIENTS or _FISH_STEM_RE.search(folded):
+        tags.add('rybí')
+    if 'zelenina' in categories:
+        tags.add('zeleninové')
+    if 'maso' not in categories and not _MEAT_STEM_RE.search(folded):
+        tags.add('vegetariánské')
+    return sorted(tags)
+
+
+def detect_appliances(recipe: Dict[str, Any]) -> List[str]:
+    appliances = {'elektrický sporák'}
+    instructions = fold_text(' '.join(str(step) for step in recipe.get('instructions', [])))
+    for match in _APPLIANCE_RE.finditer(instructions):
+        appliances.add(_APPLIANCE_BY_KEYWORD[match.group(1)])
+    return sorted(appliances)
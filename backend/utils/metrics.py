@@ -0,0 +1,292 @@
+import os
+import json
+import atexit
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from utils.process_utils import pid_alive, process_registry
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+METRIC_DESCRIPTIONS = {
+    'fridge_stage_duration_seconds': ('histogram', 'Doba trvání fází zpracování obrázků a receptů'),
+    'fridge_http_request_duration_seconds': ('histogram', 'Doba obsluhy HTTP požadavků'),
+    'fridge_http_requests_total': ('counter', 'Počet HTTP požadavků podle endpointu a stavu'),
+    'fridge_fallback_total': ('counter', 'Počet použití záložních cest'),
+    'fridge_openai_requests_total': ('counter', 'Počet volání OpenAI API podle modelu a výsledku'),
+    'fridge_openai_tokens_total': ('counter', 'Spotřebované OpenAI tokeny podle modelu a typu'),
+    'fridge_request_openai_tokens': ('histogram', 'OpenAI tokeny spotřebované jedním HTTP požadavkem'),
+    'fridge_single_flight_total': ('counter', 'Sloučená LLM volání podle role (vedoucí/čekající)'),
+    'fridge_upstream_shed_total': ('counter', 'Volání OpenAI odmítnutá jističem nebo limitem souběhu'),
+    'fridge_breaker_transitions_total': ('counter', 'Přechody jističe OpenAI podle cílového stavu'),
+    'fridge_analysis_cache_total': ('counter', 'Vyhledání v cache analýz obrázků podle výsledku (hit/miss)'),
+    'fridge_analysis_cache_evictions_total': ('counter', 'Záznamy odstraněné z cache analýz (TTL nebo velikost)'),
+    'fridge_near_duplicate_total': ('counter', 'Vyhledání téměř shodných fotek podle výsledku (hit/miss)'),
+    'fridge_similar_recipe_cache_total': ('counter', 'Vyhledání receptů pro podobnou sadu ingrediencí (hit/miss)'),
+    'fridge_prompt_tokens': ('histogram', 'Lokálně spočítané tokeny promptu před odesláním'),
+    'fridge_prompt_dropped_ingredients_total': ('counter', 'Ingredience vynechané z promptu kvůli rozpočtu tokenů'),
+    'fridge_json_dropped_total': ('counter', 'Zahozené části JSON odpovědi modelu podle klíče a důvodu')
+}
+
+_ARCHIVE_NAME = 'archive.json'
+
+# Tokeny spotřebované v rámci aktuálního HTTP požadavku (per vlákno/greenlet)
+_request_usage: ContextVar[Optional[Dict[str, int]]] = ContextVar('request_usage', default=None)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class MetricsRegistry:
+    """
+    Metriky jednoho procesu. Nejvýš jednou za flush_interval se zapíší do <pid>.json
+    ve sdílené složce a collect() sečte soubory všech workerů gunicornu. Soubory
+    ukončených workerů se přičtou do archive.json, aby čítače neklesaly.
+    """
+    def __init__(self, directory: str = None, flush_interval: float = None):
+        self.directory = directory or os.getenv('METRICS_DIR', os.path.join('cache', 'metrics'))
+        self.flush_interval = flush_interval if flush_interval is not None else float(os.getenv('METRICS_FLUSH_INTERVAL', 1.0))
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+        self._dirty = False
+        self._claimed = False
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+            self._dirty = True
+        self._maybe_flush()
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...] = DURATION_BUCKETS, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {
+                    'buckets': list(buckets), 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0
+                }
+            index = bisect_left(histogram['buckets'], value)
+            if index < len(histogram['counts']):
+                histogram['counts'][index] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+            self._dirty = True
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def _snapshot(self) -> Dict[str, Any]:
+        return {
+            'counters': [[name, dict(labels), value] for (name, labels), value in self._counters.items()],
+            'histograms': [[name, dict(labels), dict(histogram, counts=list(histogram['counts']))]
+                           for (name, labels), histogram in self._histograms.items()]
+        }
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            snapshot = self._snapshot()
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            if not self._claimed:
+                # Soubor se stejným pid může patřit dřívějšímu procesu - nejdřív ho archivujeme
+                self._compact(include_own=True)
+                self._claimed = True
+            path = os.path.join(self.directory, f'{os.getpid()}.json')
+            temp_path = f'{path}.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as metrics_file:
+                json.dump(snapshot, metrics_file)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Chyba při ukládání metrik: {e}")
+
+    def collect(self) -> Dict[str, Any]:
+        """
+        Vrací součet metrik všech workerů (včetně archivu ukončených).
+        """
+        self.flush()
+        merged = {'counters': {}, 'histograms': {}}
+        if not os.path.isdir(self.directory):
+            _merge(merged, self._snapshot())
+            return merged
+
+        self._compact()
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                _merge(merged, _read_snapshot(os.path.join(self.directory, name)))
+        return merged
+
+    def _compact(self, include_own: bool = False):
+        lock_file = open(os.path.join(self.directory, '.lock'), 'a')
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            archive_path = os.path.join(self.directory, _ARCHIVE_NAME)
+            archive = {'counters': {}, 'histograms': {}}
+            _merge(archive, _read_snapshot(archive_path))
+
+            stale = []
+            for name in os.listdir(self.directory):
+                pid = name[:-len('.json')]
+                if not name.endswith('.json') or not pid.isdigit():
+                    continue
+                if int(pid) == os.getpid() and not include_own:
+                    continue
+                if int(pid) != os.getpid() and pid_alive(int(pid)):
+                    continue
+                _merge(archive, _read_snapshot(os.path.join(self.directory, name)))
+                stale.append(name)
+
+            if stale:
+                temp_path = f'{archive_path}.tmp'
+                with open(temp_path, 'w', encoding='utf-8') as archive_file:
+                    json.dump(_to_snapshot(archive), archive_file)
+                os.replace(temp_path, archive_path)
+                for name in stale:
+                    os.remove(os.path.join(self.directory, name))
+        finally:
+            lock_file.close()
+
+
+def _label_key(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _read_snapshot(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, 'r', encoding='utf-8') as metrics_file:
+            return json.load(metrics_file)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _merge(target: Dict[str, Any], snapshot: Dict[str, Any]):
+    for name, labels, value in snapshot.get('counters', []):
+        key = (name, _label_key(labels))
+        target['counters'][key] = target['counters'].get(key, 0.0) + value
+    for name, labels, histogram in snapshot.get('histograms', []):
+        key = (name, _label_key(labels))
+        existing = target['histograms'].get(key)
+        if existing is None or existing['buckets'] != histogram['buckets']:
+            target['histograms'][key] = dict(histogram, counts=list(histogram['counts']))
+            continue
+        existing['counts'] = [a + b for a, b in zip(existing['counts'], histogram['counts'])]
+        existing['sum'] += histogram['sum']
+        existing['count'] += histogram['count']
+
+
+def _to_snapshot(merged: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'counters': [[name, dict(labels), value] for (name, labels), value in merged['counters'].items()],
+        'histograms': [[name, dict(labels), histogram] for (name, labels), histogram in merged['histograms'].items()]
+    }
+
+
+def _format_labels(labels: Labels, extra: Tuple[str, str] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ''
+    escaped = (key + '="' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+               for key, value in items)
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render_prometheus(merged: Dict[str, Any]) -> str:
+    """
+    Textový formát Prometheus exposition 0.0.4.
+    """
+    lines: List[str] = []
+    names = sorted({name for name, _ in merged['counters']} | {name for name, _ in merged['histograms']})
+    for name in names:
+        metric_type, description = METRIC_DESCRIPTIONS.get(name, ('untyped', name))
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        for (metric, labels), value in sorted(merged['counters'].items()):
+            if metric == name:
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        for (metric, labels), histogram in sorted(merged['histograms'].items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(histogram['buckets'], histogram['counts']):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels, ("le", _format_value(bound)))} {cumulative}')
+            lines.append(f'{name}_bucket{_format_labels(labels, ("le", "+Inf"))} {histogram["count"]}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(histogram["sum"])}')
+            lines.append(f'{name}_count{_format_labels(labels)} {histogram["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def _create_metrics() -> MetricsRegistry:
+    metrics = MetricsRegistry()
+    atexit.register(metrics.flush)
+    return metrics
+
+
+process_registry().register('metrics', _create_metrics)
+
+
+def get_metrics() -> MetricsRegistry:
+    """
+    Registr metrik pro aktuální proces; po forku workeru se vytvoří nový.
+    """
+    return process_registry().get('metrics')
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        get_metrics().observe('fridge_stage_duration_seconds', time.perf_counter() - started, stage=stage)
+
+
+def count_fallback(kind: str):
+    get_metrics().inc('fridge_fallback_total', kind=kind)
+
+
+def record_openai_response(model: str, status: Any, usage: Optional[Dict[str, Any]] = None):
+    metrics = get_metrics()
+    metrics.inc('fridge_openai_requests_total', model=model, status=status)
+    if not usage:
+        return
+
+    prompt_tokens = int(usage.get('prompt_tokens') or 0)
+    completion_tokens = int(usage.get('completion_tokens') or 0)
+    metrics.inc('fridge_openai_tokens_total', prompt_tokens, model=model, type='prompt')
+    metrics.inc('fridge_openai_tokens_total', completion_tokens, model=model, type='completion')
+
+    request_usage = _request_usage.get()
+    if request_usage is not None:
+        request_usage['prompt_tokens'] += prompt_tokens
+        request_usage['completion_tokens'] += completion_tokens
+
+
+def begin_request_usage():
+    _request_usage.set({'prompt_tokens': 0, 'completion_tokens': 0})
+
+
+def current_request_usage() -> Optional[Dict[str, int]]:
+    return _request_usage.get()
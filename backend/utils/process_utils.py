@@ -0,0 +1,83 @@
+import os
+import sqlite3
+import threading
+from typing import Any, Callable, Dict
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def connect_wal(db_path: str, timeout: float = 5) -> sqlite3.Connection:
+    """
+    Otevře spojení na SQLite soubor sdílený workery v režimu WAL (čtení neblokuje zápis).
+    Spojení se otevírá pro každou operaci, aby nepřežilo fork workeru (preload_app).
+    """
+    conn = sqlite3.connect(db_path, timeout=timeout, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+class ProcessRegistry:
+    """
+    Instance sdílené vlákny jednoho procesu. Vytvoří se líně přes zaregistrovanou
+    továrnu a po forku workeru (preload_app) znovu, aby workery nesdílely sockety,
+    vlákna ani zámky. V testech lze instance nahradit přes override().
+    """
+    def __init__(self, factories: Dict[str, Callable[[], Any]] = None):
+        self._factories: Dict[str, Callable[[], Any]] = dict(factories or {})
+        self._overrides: Dict[str, Any] = {}
+        self._instances: Dict[str, Any] = {}
+        self._pid = None
+        self._lock = threading.RLock()
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        with self._lock:
+            self._factories[name] = factory
+
+    def get(self, name: str) -> Any:
+        if name in self._overrides:
+            return self._overrides[name]
+        # Rychlá cesta bez zámku - metriky se čtou při každém volání OpenAI i požadavku
+        instances = self._instances
+        if self._pid == os.getpid() and name in instances:
+            return instances[name]
+
+        with self._lock:
+            if self._pid != os.getpid():
+                self._instances = {}
+                self._pid = os.getpid()
+            if name not in self._instances:
+                self._instances[name] = self._factories[name]()
+            return self._instances[name]
+
+    def override(self, name: str, instance: Any):
+        with self._lock:
+            self._overrides[name] = instance
+
+    def reset(self):
+        with self._lock:
+            self._overrides = {}
+            self._instances = {}
+
+
+_process_registry = ProcessRegistry()
+
+
+def process_registry() -> ProcessRegistry:
+    """
+    Registr služeb sdílených celým procesem (cache, jistič, fronta úloh, metriky);
+    jejich moduly v něm při importu zaregistrují továrny.
+    """
+    return _process_registry
+
+
+def env_disabled(name: str) -> bool:
+    return os.getenv(name, 'true').lower() in ('0', 'false', 'no')
@@ -0,0 +1,21 @@
+import re
+import unicodedata
+from typing import Iterable, List
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def fold_text(text: str) -> str:
+    """
+    Převede text na kanonický tvar: malá písmena, bez diakritiky, jednotné mezery.
+    'Kuřecí  Prsa' i 'kureci prsa' dají 'kureci prsa'.
+    """
+    if not text:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', str(text).casefold())
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _WHITESPACE_RE.sub(' ', stripped).strip()
+
+
+def canonical_name_set(names: Iterable[str]) -> List[str]:
+    return sorted({folded for folded in (fold_text(name) for name in names) if folded})